@@ -1,21 +1,49 @@
-import random
-from flask import Flask, jsonify, request
+from cachetools import TTLCache
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 from flask_cors import CORS, cross_origin
-from flask_jwt_extended import JWTManager, create_access_token, get_jwt_identity, jwt_required
+from flask_jwt_extended import JWTManager, create_access_token, get_jwt, get_jwt_identity, jwt_required, verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
+from werkzeug.middleware.proxy_fix import ProxyFix
 import database
+import datetime
+import encoding
+import hashlib
 # import dotenv
 import gemini
-import asyncio
+import ingredients as ingredient_names
+import jobs
+import limiter
+import logs
+import metrics
+import passwords
+import json
+import math
 import os
 import re
+import threading
+import time
+import uuid
+import warmer
+
+logs.configure()
 
 app = Flask(__name__)
+app.json = encoding.OrjsonProvider(app)
 cors = CORS(app)
 
+# Reverse proxies in front of the app whose X-Forwarded-For is trusted, so
+# remote_addr (and the guest rate limit) is the client's own address. Only
+# set it where a proxy really is in front: docker-compose publishes gunicorn
+# directly, and there any client could claim any address.
+PROXY_HOPS = int(os.getenv("PROXY_FIX_HOPS", 0))
+if PROXY_HOPS > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_HOPS, x_proto=PROXY_HOPS)
+
 # app.config['JWT_SECRET_KEY'] = dotenv.get_key(".env", "JWT_SECRET_KEY")
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "default")
 if JWT_SECRET_KEY is None:
-    print("WARNING: JWT_SECRET_KEY environment variable is not set, using default (not secure)") 
+    app.logger.warning("JWT_SECRET_KEY environment variable is not set, using default (not secure)")
 
 app.config['JWT_SECRET_KEY'] = JWT_SECRET_KEY
 app.config['CORS_HEADERS'] = 'Content-Type'
@@ -23,6 +51,91 @@ app.config['CORS_HEADERS'] = 'Content-Type'
 
 jwt = JWTManager(app)
 
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+def record_latency(response):
+    if "started" in g:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.REQUEST_LATENCY.labels(request.method, route, response.status_code).observe(time.perf_counter() - g.started)
+    metrics.refresh_stats()
+    return response
+
+app.after_request(encoding.compress)
+
+@app.route("/metrics", methods=['GET'])
+def metrics_endpoint():
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+@app.errorhandler(passwords.PasswordPoolBusy)
+def password_pool_busy(e):
+    # Shed login/register storms instead of queueing behind bcrypt
+    response = jsonify({"message": "Server is busy, please try again shortly"})
+    response.headers["Retry-After"] = "1"
+    return response, 429
+
+@app.errorhandler(gemini.GeminiUnavailable)
+def gemini_unavailable(e):
+    # Gemini is failing or saturated; fail fast rather than tie up a worker
+    response = jsonify({"message": str(e)})
+    response.headers["Retry-After"] = str(math.ceil(e.retry_after))
+    return response, 503
+
+@app.errorhandler(jobs.QueueFull)
+def job_queue_full(e):
+    response = jsonify({"message": str(e)})
+    response.headers["Retry-After"] = "5"
+    return response, 503
+
+# Guests are rate limited by address. Tokens from /guest carry a guest
+# claim; guest accounts created before that are users rows with this email
+GUEST_EMAIL = re.compile(r"guest\d+@devweeny\.ca")
+
+def rate_limited():
+    """Spend one of the caller's generations; returns a 429 response when they are out."""
+    if current_guest_id() or GUEST_EMAIL.fullmatch(get_jwt_identity() or ""):
+        wait = limiter.check(f"ip:{request.remote_addr}", guest=True)
+    else:
+        wait = limiter.check(f"user:{current_user_id()}")
+    if not wait:
+        return None
+    response = jsonify({"message": "Too many recipe requests, please try again shortly"})
+    response.headers["Retry-After"] = str(math.ceil(wait))
+    return response, 429
+
+# mode=auto answers from saved recipes when at least this many cover enough
+# of their ingredient list; otherwise it falls through to Gemini
+MATCH_MIN_RESULTS = int(os.getenv("MATCH_MIN_RESULTS", 3))
+MATCH_MIN_COVERAGE = float(os.getenv("MATCH_MIN_COVERAGE", 0.6))
+MATCH_LIMIT = int(os.getenv("MATCH_LIMIT", 10))
+
+def current_user_id():
+    # Tokens from /login and /profile carry the user_id claim; older tokens
+    # fall back to a (cached) lookup by email. Resolved once per request.
+    if "user_id" not in g:
+        claims = get_jwt()
+        g.user_id = None if claims.get("guest") else claims.get("user_id") or database.get_user_id(get_jwt_identity())
+    return g.user_id
+
+def current_guest_id():
+    # Set for guest tokens from /guest, which have no users row
+    return get_jwt().get("guest")
+
+def current_owner():
+    """Who a job belongs to: the user_id, or "guest:<id>" for guests."""
+    guest_id = current_guest_id()
+    return f"guest:{guest_id}" if guest_id else current_user_id()
+
+def caller_preferences():
+    # Guests have no profile, so no dietary preferences
+    return [] if current_guest_id() else database.get_dietary_preferences(current_user_id())
+
+def guest_forbidden():
+    return jsonify({"message": "Guests cannot do this; register to keep your recipes"}), 403
+
 @app.route("/")
 def hello():
     return jsonify({"message": "Hello, World!"})
@@ -36,7 +149,7 @@ def login():
     password = request.form['password']
     user = database.login(email, password)
     if user:
-        token = create_access_token(identity=user[1])
+        token = create_access_token(identity=user[1], additional_claims={"user_id": user[0]})
         if user[5]:
             dietary_preferences = user[5].split("@")
         else:
@@ -66,6 +179,15 @@ def is_valid_email(email):
 def is_valid_password(password):
     return len(password) >= 6
 
+def registering_guest():
+    # Registering with a guest token keeps what the guest saved; an expired
+    # or foreign token just means there is nothing to keep
+    try:
+        verify_jwt_in_request(optional=True)
+    except (JWTExtendedException, PyJWTError):
+        return None
+    return current_guest_id()
+
 @cross_origin()
 @app.route("/register", methods=['POST'])
 def register():
@@ -79,7 +201,16 @@ def register():
     if not is_valid_password(password):
         return jsonify({"message": "Password must be at least 6 characters long"}), 400
 
-    if database.register(email, name, password):
+    guest_id = registering_guest()
+    user_id = database.register(email, name, password)
+    if user_id:
+        if guest_id:
+            # Best effort: the account is already committed, and failing here
+            # would make the client retry into "Email already in use"
+            try:
+                database.promote_guest(guest_id, user_id)
+            except Exception:
+                app.logger.exception("Error moving guest data to new account", extra={"user_id": user_id})
         response = jsonify({"message": "You are registered"})
         response.headers.add('Access-Control-Allow-Origin', '*')
         return response, 200
@@ -88,19 +219,28 @@ def register():
     response.headers.add('Access-Control-Allow-Origin', '*')
     return response, 400
 
+# Guest tokens outlive ordinary ones: a guest cannot log back in, so their
+# session ends when the token does
+GUEST_TOKEN_TTL = int(os.getenv("GUEST_TOKEN_TTL", database.GUEST_TTL))
+
 @app.route("/guest", methods=['GET'])
 def guest():
-    id = random.randint(0, 1000000)
-    email = f"guest{id}@devweeny.ca"
-    name = "Guest User"
-    token = create_access_token(identity=email)
+    # Nothing is written: the token itself is the guest's identity
+    guest_id = uuid.uuid4().hex
+    email = f"guest-{guest_id}@devweeny.ca"
+    token = create_access_token(
+        identity=email,
+        additional_claims={"guest": guest_id},
+        expires_delta=datetime.timedelta(seconds=GUEST_TOKEN_TTL),
+    )
     user_json = {
-        "id": id,
+        "id": guest_id,
         "email": email,
         "name": "Guest User",
+        # No "guest" flag: the shipped frontend shows mock recipes instead
+        # of calling /generate when it sees one
         "token": token
     }
-    database.register(email, name, email)
     response = jsonify(user_json)
     return response, 200
 
@@ -131,34 +271,153 @@ Response format:
 @cross_origin()
 @jwt_required()
 def generate():
-    print(request.headers)
-
     ingredients = request.form.get('ingredients').strip().split(",")
     email = get_jwt_identity()
-    user_id = database.get_user_id(email)
-    dietary_preferences = database.get_dietary_preferences(user_id)
+    user_id = current_owner()
     if not user_id or not email:
         response = jsonify({"message": "Invalid user"})
         return response, 401
+    dietary_preferences = caller_preferences()
+
+    # mode: "generate" (default) always asks Gemini, "match" only searches
+    # saved recipes, "auto" tries saved recipes first
+    mode = request.form.get('mode', 'generate')
+    if mode not in ("generate", "match", "auto"):
+        return jsonify({"message": "mode must be generate, match or auto"}), 400
+    if mode != "generate":
+        matches = database.match_recipes(ingredient_names.normalize_all(ingredients), MATCH_LIMIT)
+        for match in matches:
+            match["origin"] = "saved"
+        good = [match for match in matches if match["coverage"] >= MATCH_MIN_COVERAGE]
+        if mode == "match" or len(good) >= MATCH_MIN_RESULTS:
+            return encoding.payload(app, {"recipe": matches if mode == "match" else good})
+
+    limited = rate_limited()
+    if limited:
+        return limited
 
     try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        recipe = loop.run_until_complete(gemini.generate(ingredients, dietary_preferences))
-        response = jsonify({"recipe": recipe})
-        return response, 200
+        # "Cache-Control: no-cache" forces a fresh generation
+        use_cache = "no-cache" not in request.headers.get("Cache-Control", "")
+        warmer.record(ingredients, dietary_preferences)
+        recipe = gemini.run(gemini.generate(ingredients, dietary_preferences, use_cache))
+        return encoding.payload(app, {"recipe": recipe})
+    except gemini.GeminiUnavailable:
+        raise
     except Exception as e:
-        print(f"Error generating recipe: {e}")
+        app.logger.exception("Error generating recipe", extra={"user_id": user_id})
         return jsonify({"message": f"An error occurred while generating the recipe: {e}"}), 500
 
+
+"""
+Same request as /generate, but the response is newline-delimited JSON:
+one {"recipe": {...}} line per recipe as soon as Gemini has finished
+writing it, then a final {"done": true, "count": n} line, or an
+{"error": "..."} line if generation fails part way through.
+"""
+@app.route("/generate_stream", methods=['POST', 'OPTIONS'])
+@cross_origin()
+@jwt_required()
+def generate_stream():
+    ingredients = request.form.get('ingredients').strip().split(",")
+    email = get_jwt_identity()
+    user_id = current_owner()
+    if not user_id or not email:
+        response = jsonify({"message": "Invalid user"})
+        return response, 401
+    dietary_preferences = caller_preferences()
+    use_cache = "no-cache" not in request.headers.get("Cache-Control", "")
+    limited = rate_limited()
+    if limited:
+        return limited
+    warmer.record(ingredients, dietary_preferences)
+
+    def stream():
+        started = time.perf_counter()
+        count = 0
+        try:
+            for recipe in gemini.iterate(gemini.generate_stream(ingredients, dietary_preferences, use_cache)):
+                if count == 0:
+                    app.logger.info("First recipe streamed", extra={"elapsed_ms": round((time.perf_counter() - started) * 1000)})
+                count += 1
+                yield app.json.dumps({"recipe": recipe}) + "\n"
+        except Exception as e:
+            app.logger.exception("Error streaming recipes", extra={"user_id": user_id, "count": count})
+            yield json.dumps({"error": f"An error occurred while generating the recipe: {e}"}) + "\n"
+            return
+        app.logger.info("Streamed recipes", extra={"count": count, "elapsed_ms": round((time.perf_counter() - started) * 1000)})
+        yield json.dumps({"done": True, "count": count}) + "\n"
+
+    response = Response(stream_with_context(stream()), mimetype="application/x-ndjson")
+    # Stop reverse proxies from buffering the stream into one response
+    response.headers["X-Accel-Buffering"] = "no"
+    return response, 200
+
+
+"""
+Same request as /generate, but answered at once with 202 and a job:
+{"job_id": "...", "status": "queued"}. The recipes are fetched from
+GET /jobs/<job_id>, optionally with ?wait=<seconds> to long-poll until
+the job is "done" (with "recipe") or "failed" (with "error").
+"""
+@app.route("/jobs", methods=['POST', 'OPTIONS'])
+@cross_origin()
+@jwt_required()
+def create_job():
+    ingredients = request.form.get('ingredients').strip().split(",")
+    email = get_jwt_identity()
+    user_id = current_owner()
+    if not user_id or not email:
+        response = jsonify({"message": "Invalid user"})
+        return response, 401
+    limited = rate_limited()
+    if limited:
+        return limited
+
+    dietary_preferences = caller_preferences()
+    use_cache = "no-cache" not in request.headers.get("Cache-Control", "")
+    warmer.record(ingredients, dietary_preferences)
+    job_id = jobs.submit(user_id, ingredients, dietary_preferences, use_cache)
+    response = jsonify({"job_id": job_id, "status": jobs.QUEUED})
+    response.headers["Location"] = f"/jobs/{job_id}"
+    return response, 202
+
+@app.route("/jobs/<job_id>", methods=['GET'])
+@cross_origin()
+@jwt_required()
+def get_job(job_id):
+    try:
+        wait = float(request.args.get('wait', 0))
+    except ValueError:
+        return jsonify({"message": "wait must be a number of seconds"}), 400
+
+    job = jobs.wait(job_id, wait) if wait > 0 else jobs.get(job_id)
+    # Someone else's job is reported the same as a missing one
+    if job is None or job["user_id"] != current_owner():
+        return jsonify({"message": "Job not found"}), 404
+
+    body = {"job_id": job["id"], "status": job["status"]}
+    if job["status"] == jobs.DONE:
+        body["recipe"] = job["result"]
+    elif job["status"] == jobs.FAILED:
+        body["error"] = job["error"]
+    return jsonify(body), 200
+
     
 @app.route("/add_recipe", methods=['POST'])
 @cross_origin()
 @jwt_required()
 def add_recipe():
-    email = get_jwt_identity()
-    user_id = database.get_user_id(email)
     data = request.get_json()
+    guest_id = current_guest_id()
+    if guest_id:
+        recipe, error = validate_recipe(data)
+        if error:
+            return jsonify({"message": error}), 400
+        database.add_guest_recipes(guest_id, [recipe])
+        return jsonify({"message": "Recipe added successfully"}), 200
+
+    user_id = current_user_id()
 
     name = data.get('title')
     source = data.get('source')
@@ -168,41 +427,184 @@ def add_recipe():
     cookTime = data.get('cookTime')
     difficulty = data.get('difficulty')
 
-    app.logger.info(f"Adding recipe: '{name}', '{source}', '{ingredients}', '{instructions}', '{prepTime}', '{cookTime}', '{difficulty}")
+    app.logger.debug("Adding recipe", extra={"user_id": user_id, "title": name})
 
     database.add_recipe(user_id, name, ingredients, instructions, source, prepTime, cookTime, difficulty)
     response = jsonify({"message": "Recipe added successfully"})
     return response, 200
 
+MAX_BATCH_RECIPES = int(os.getenv("MAX_BATCH_RECIPES", 500))
+
+def _is_string_list(value):
+    return isinstance(value, list) and len(value) > 0 and all(isinstance(item, str) for item in value)
+
+def validate_recipe(data):
+    """Return (recipe, None) with defaults filled in, or (None, error message)."""
+    if not isinstance(data, dict):
+        return None, "Recipe must be an object"
+    title = data.get('title')
+    if not isinstance(title, str) or not title.strip() or len(title) > 255:
+        return None, "title must be a non-empty string of at most 255 characters"
+    if not _is_string_list(data.get('ingredients')):
+        return None, "ingredients must be a non-empty list of strings"
+    if not _is_string_list(data.get('instructions')):
+        return None, "instructions must be a non-empty list of strings"
+    recipe = {
+        "title": title,
+        "source": data.get('source'),
+        "ingredients": data['ingredients'],
+        "instructions": data['instructions'],
+    }
+    for field in ('prepTime', 'cookTime', 'difficulty'):
+        value = data.get(field) or "N/A"
+        if not isinstance(value, str):
+            return None, f"{field} must be a string"
+        recipe[field] = value
+    if len(recipe['difficulty']) > 20:
+        return None, "difficulty must be at most 20 characters"
+    return recipe, None
+
+"""
+Request format: a JSON array of recipes shaped like /add_recipe bodies.
+
+Response format:
+{
+    "ids": [12, 13],
+    "errors": [
+        {"index": 2, "message": "title must be a non-empty string of at most 255 characters"}
+    ]
+}
+Valid recipes are saved in one transaction even if others fail validation.
+"""
+@app.route("/add_recipes", methods=['POST'])
+@cross_origin()
+@jwt_required()
+def add_recipes():
+    user_id = current_user_id()
+    data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        return jsonify({"message": "Request body must be a JSON array of recipes"}), 400
+    if len(data) > MAX_BATCH_RECIPES:
+        return jsonify({"message": f"At most {MAX_BATCH_RECIPES} recipes per request"}), 413
+
+    valid = []
+    errors = []
+    for index, item in enumerate(data):
+        recipe, error = validate_recipe(item)
+        if error:
+            errors.append({"index": index, "message": error})
+        else:
+            valid.append(recipe)
+
+    if not valid and data:
+        return jsonify({"ids": [], "errors": errors}), 400
+
+    guest_id = current_guest_id()
+    if guest_id:
+        # Guest recipes get ids once they are promoted to an account
+        database.add_guest_recipes(guest_id, valid)
+        return jsonify({"ids": [None] * len(valid), "errors": errors}), 200
+    ids = database.add_recipes(user_id, valid)
+    return jsonify({"ids": ids, "errors": errors}), 200
+
+"""
+Optional query parameters:
+    limit   page size (capped at RECIPES_MAX_PAGE_SIZE); enables paging
+    after   cursor from the previous page's "next" value
+    fields  comma-separated projection, e.g. "recipe_id,name,prepTime,cookTime"
+
+Without limit every recipe is returned as {"recipes": [...]}. With limit
+the response is {"recipes": [...], "next": "<cursor>" or null}.
+"""
+# Serialized /get_recipes bodies keyed by (user, recipes_version, format, query)
+RECIPES_RESPONSE_CACHE_SIZE = int(os.getenv("RECIPES_RESPONSE_CACHE_SIZE", 1024))
+RECIPES_RESPONSE_CACHE_TTL = int(os.getenv("RECIPES_RESPONSE_CACHE_TTL", 600))
+_recipes_responses = TTLCache(maxsize=RECIPES_RESPONSE_CACHE_SIZE, ttl=RECIPES_RESPONSE_CACHE_TTL)
+_recipes_responses_lock = threading.Lock()
+
 @app.route("/get_recipes", methods=['GET'])
 @cross_origin()
 @jwt_required()
 def get_recipes():
-    email = get_jwt_identity() #maybe not needed?
-    user_id = database.get_user_id(email)
-    recipes = database.get_recipes(user_id)
-    return jsonify({"recipes": recipes}), 200
+    guest_id = current_guest_id()
+    if guest_id:
+        fields = request.args.get('fields')
+        fields = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+        try:
+            recipes = database.get_guest_recipes(guest_id, fields=fields)
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+        # A guest keeps a handful of recipes at most, so they come in one page
+        payload = {"recipes": recipes} if request.args.get('limit') is None else {"recipes": recipes, "next": None}
+        return encoding.payload(app, payload)
+
+    user_id = current_user_id()
+
+    # The ETag names the user's recipes_version and the query, so an
+    # unchanged list costs one primary-key read and an empty 304
+    version = database.get_recipes_version(user_id)
+    fmt = encoding.negotiate()
+    query = "&".join(f"{key}={value}" for key, value in sorted(request.args.items(multi=True)))
+    etag = f"{version}-{hashlib.sha1(f'{fmt}?{query}'.encode('utf-8')).hexdigest()[:12]}"
+    if version is not None and request.if_none_match.contains_weak(etag):
+        return _recipes_response(Response(status=304), etag)
+
+    key = (user_id, version, fmt, query)
+    with _recipes_responses_lock:
+        body = _recipes_responses.get(key)
+    if body is None:
+        fields = request.args.get('fields')
+        fields = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+        limit = request.args.get('limit')
+        if limit is not None and not limit.isdigit():
+            return jsonify({"message": "limit must be a positive integer"}), 400
+        try:
+            if limit is None:
+                payload = {"recipes": database.get_recipes(user_id, fields=fields)}
+            else:
+                recipes, next_cursor = database.get_recipes_page(
+                    user_id, int(limit), after=request.args.get('after'), fields=fields
+                )
+                payload = {"recipes": recipes, "next": next_cursor}
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+        body = encoding.dumps(payload, fmt)
+        if version is not None:
+            # A write bumps the version, so stale entries are never looked up again
+            with _recipes_responses_lock:
+                _recipes_responses[key] = body
+    return _recipes_response(Response(body, mimetype=encoding.mimetype(fmt)), etag)
+
+def _recipes_response(response, etag):
+    # Weak: encoding.compress may gzip the body afterwards, and a strong
+    # ETag would then claim two different byte sequences are identical
+    response.set_etag(etag, weak=True)
+    # Per-user data: browsers may keep it but must revalidate every time
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.vary.add("Accept")
+    return response
 
 @app.route("/profile", methods=['PUT'])
 @cross_origin()
 @jwt_required()
 def update_profile():
+    if current_guest_id():
+        return guest_forbidden()
     try:
-        email = get_jwt_identity()
-        print(f"Authenticated user email: {email}")
-        user_id = database.get_user_id(email)
-        print(f"User ID: {user_id}")
+        user_id = current_user_id()
         data = request.get_json()
-        print(f"Request data: {data}")
-        
+
         name = data.get('name')
         email = data.get('email')
-        dietary_preferences = "@".join(data.get('dietaryPreferences'))
+        # Left unchanged when not sent; a bare string is a single preference
+        dietary_preferences = data.get('dietaryPreferences')
+        if isinstance(dietary_preferences, str):
+            dietary_preferences = [dietary_preferences]
+        if dietary_preferences is not None:
+            dietary_preferences = "@".join(dietary_preferences)
         password = data.get('password')
 
-        print(f"Updating user with name: {name}, email: {email}, dietary_preferences: {dietary_preferences}, password: {password}")
         updated_user = database.update_user(user_id, name, email, dietary_preferences, password)
-        print(f"Updated user: {updated_user}")
 
         if updated_user[5]:
             dietary_preferences = updated_user[5].split("@")
@@ -210,7 +612,7 @@ def update_profile():
             dietary_preferences = []
 
         if updated_user:
-            token = create_access_token(identity=updated_user[1])
+            token = create_access_token(identity=updated_user[1], additional_claims={"user_id": updated_user[0]})
             user_json = {
                 "id": updated_user[0],
                 "email": updated_user[1],
@@ -224,15 +626,17 @@ def update_profile():
         
         response = jsonify({"message": "Failed to update profile"})
         return response, 400
+    except passwords.PasswordPoolBusy:
+        raise
     except Exception as e:
-        print(f"Error updating profile: {e}")
+        app.logger.exception("Error updating profile", extra={"user_id": g.get("user_id")})
         response = jsonify({"message": "An error occurred while updating the profile"})
         return response, 500
 
 @app.route('/remove_recipe', methods=['POST'])
 @jwt_required()
 def remove_favorite():
-    user_id = database.get_user_id(get_jwt_identity())
+    user_id = current_user_id()
     
     data = request.get_json()
     recipe_name = data.get('recipe_name')
@@ -240,7 +644,11 @@ def remove_favorite():
     if not recipe_name:
         return jsonify({"msg": "Missing recipe_name"}), 400
 
-    database.remove_recipe(user_id, recipe_name)
+    guest_id = current_guest_id()
+    if guest_id:
+        database.remove_guest_recipe(guest_id, recipe_name)
+    else:
+        database.remove_recipe(user_id, recipe_name)
 
     return jsonify({"msg": "Recipe removed from favorites"}), 200
 
@@ -256,35 +664,57 @@ def add_ingredients():
 @jwt_required()
 def submit_rating():
     try:
-        email = get_jwt_identity()
-        print(f"Authenticated user email: {email}")
-        user_id = database.get_user_id(email)
-        print(f"User ID: {user_id}")
+        user_id = current_user_id()
         data = request.get_json()
-        print(f"Request data: {data}")
-        
+
         recipe_id = data.get('recipe_id')
         rating = data.get('rating')
 
         if not recipe_id or not rating:
-            print("Missing recipe_id or rating")
             return jsonify({"message": "Missing recipe_id or rating"}), 400
 
+        # JSON true is a Python bool, which is also an int
+        if not isinstance(rating, int) or isinstance(rating, bool):
+            return jsonify({"message": "Rating must be a whole number"}), 400
+
         if not (1 <= rating <= 5):
-            print("Invalid rating value")
             return jsonify({"message": "Rating must be between 1 and 5"}), 400
 
-        print(f"Submitting rating for recipe_id: {recipe_id} with rating: {rating}")
-        success = database.submit_rating(user_id, recipe_id, rating)
+        guest_id = current_guest_id()
+        if guest_id:
+            success = database.submit_guest_rating(guest_id, recipe_id, rating)
+        else:
+            success = database.submit_rating(user_id, recipe_id, rating)
         if success:
             return jsonify({"message": "Rating submitted successfully"}), 200
         else:
-            print("Failed to submit rating")
             return jsonify({"message": "Failed to submit rating"}), 500
     except Exception as e:
-        print(f"Error submitting rating: {e}")
+        app.logger.exception("Error submitting rating", extra={"user_id": g.get("user_id")})
         return jsonify({"message": f"An error occurred while submitting the rating: {e}"}), 500
 
 
+@app.route("/rating/<int:recipe_id>", methods=['GET'])
+@cross_origin()
+@jwt_required()
+def rating_stats(recipe_id):
+    return jsonify(database.get_rating_stats(recipe_id)), 200
+
+# Most results GET /similar/<recipe_id>?limit=n will return
+MAX_SIMILAR = int(os.getenv("MAX_SIMILAR", 50))
+
+@app.route("/similar/<int:recipe_id>", methods=['GET'])
+@cross_origin()
+@jwt_required()
+def similar(recipe_id):
+    limit = request.args.get('limit', '10')
+    if not limit.isdigit() or not 1 <= int(limit) <= MAX_SIMILAR:
+        return jsonify({"message": f"limit must be between 1 and {MAX_SIMILAR}"}), 400
+    recipes = database.similar_recipes(recipe_id, int(limit))
+    if recipes is None:
+        return jsonify({"message": "Recipe not found"}), 404
+    return jsonify({"recipes": recipes}), 200
+
+
 if __name__ == "__main__":
     app.run(port=5000, debug=True, host='0.0.0.0')
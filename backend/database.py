@@ -1,8 +1,31 @@
-import bcrypt
+import base64
+import datetime
+import json
 import mysql.connector
+from cachetools import TTLCache
+from mysql.connector import errors
+from contextlib import contextmanager
+from collections import deque
+import threading
+import time
 import os
+import embeddings
+import ingredients as ingredient_names
+import logs
+import metrics
+import passwords
+import sqlite_backend
 
-conn = None
+# Guests (see /guest) have no users row. What they save lives in the guests
+# tables for GUEST_TTL seconds after their last write; purge_guests() deletes
+# expired guests GUEST_PURGE_BATCH at a time.
+GUEST_TTL = int(os.getenv("GUEST_TTL", 24 * 60 * 60))
+GUEST_PURGE_BATCH = int(os.getenv("GUEST_PURGE_BATCH", 1000))
+
+# "mysql", or "sqlite" for an embedded database at DB_SQLITE_PATH (":memory:"
+# keeps it in memory) for single-node deployments and tests
+ENGINE = os.getenv("DB_ENGINE", "mysql")
+SQLITE_PATH = os.getenv("DB_SQLITE_PATH", "mealmatcher.db")
 
 host = os.getenv("DB_HOST", "127.0.0.1")
 user = os.getenv("DB_USER", "mealmatcher")
@@ -10,125 +33,910 @@ database = os.getenv("DB_DATABASE", "mealmatcher")
 password = os.getenv("DB_PASSWORD", "password")
 port = os.getenv("DB_PORT", 3306)
 
-def get_connection():
-    global conn
-    if conn is None or not conn.is_connected():
-        conn = mysql.connector.connect(
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+# Seconds a request waits for a free connection before giving up
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))
+# Idle connections older than this are pinged before being handed out
+POOL_PING_INTERVAL = float(os.getenv("DB_POOL_PING_INTERVAL", 30))
+CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", 5))
+
+log = logs.get_logger(__name__)
+
+# email -> user_id, shared by all requests. Dietary preferences are not
+# cached: /profile only invalidates its own worker, and a stale allergy or
+# diet filter on /generate is a correctness bug, not a slow read
+IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", 10000))
+IDENTITY_CACHE_TTL = int(os.getenv("IDENTITY_CACHE_TTL", 300))
+
+
+class ConnectionPool:
+    """Bounded pool of database connections shared by all request threads.
+
+    Connections are opened lazily up to `size`. When every connection is
+    checked out, callers wait up to `timeout` seconds for one to be returned
+    and then get a PoolError.
+    """
+
+    def __init__(self, size=POOL_SIZE, timeout=POOL_TIMEOUT, ping_interval=POOL_PING_INTERVAL):
+        self.size = size
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self._idle = deque()
+        self._cond = threading.Condition()
+        self._created = 0
+        self._in_use = 0
+        self._waiting = 0
+
+    def _connect(self):
+        if ENGINE == "sqlite":
+            return sqlite_backend.connect(SQLITE_PATH)
+        return mysql.connector.connect(
             host=host,
             port=port,
             user=user,
             password=password,
-            database=database
+            database=database,
+            connection_timeout=CONNECT_TIMEOUT,
         )
-    return conn
 
+    def _healthy(self, conn, idle_since):
+        if time.monotonic() - idle_since < self.ping_interval:
+            return True
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except errors.Error:
+            return False
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            self._waiting += 1
+            try:
+                while not self._idle and self._created >= self.size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise errors.PoolError(f"No database connection available within {self.timeout}s")
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+            if self._idle:
+                conn, idle_since = self._idle.pop()
+            else:
+                conn, idle_since = None, None
+                self._created += 1
+            self._in_use += 1
+
+        try:
+            if conn is not None and not self._healthy(conn, idle_since):
+                self._close_quietly(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+            return PooledConnection(self, conn)
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn):
+        healthy = True
+        try:
+            # End any transaction left open by a read so the next user of
+            # this connection does not see a stale snapshot.
+            conn.rollback()
+        except errors.Error:
+            healthy = False
+        with self._cond:
+            self._in_use -= 1
+            if healthy:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._created -= 1
+            self._cond.notify()
+        if not healthy:
+            self._close_quietly(conn)
+
+    def close_all(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._created -= len(idle)
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except errors.Error:
+            pass
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "created": self._created,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+            }
+
+
+class PooledConnection:
+    """Checked-out connection; close() hands it back to the pool."""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                size = sqlite_backend.max_connections(SQLITE_PATH) if ENGINE == "sqlite" else None
+                _pool = ConnectionPool(size=size or POOL_SIZE)
+    return _pool
+
+def reset_pool():
+    # Drop (without closing) connections inherited across fork(); closing
+    # them here would end the parent's sessions too
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close_all()
+
+def get_connection():
+    return get_pool().acquire()
+
+@contextmanager
+def connection():
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+def _pool_metrics():
+    stats = pool_stats()
+    for state in ("in_use", "idle", "waiting"):
+        metrics.DB_POOL.labels(state).set(stats[state])
+
+metrics.add_stats_source(_pool_metrics)
+
+def pool_stats():
+    return get_pool().stats()
+
+# login and register time only their queries: bcrypt is deliberately slow
+# and would drown out the database in db_call_duration_seconds
 def login(email, password):
-    cursor = get_connection().cursor()
-    cursor.execute("SELECT * FROM users WHERE email = %s", (email,))
-    user = cursor.fetchone()
-    conn.close()
+    user = _find_user(email)
     if user is None:
         return False
-    if bcrypt.checkpw(password.encode("utf-8"), user[3].encode("utf-8")):
+    # Hashing runs in the password pool, after the connection is returned
+    if passwords.check_password(password, user[3]):
+        if passwords.needs_rehash(user[3]):
+            _set_password(user[0], passwords.hash_password(password))
         return user
 
+@metrics.timed(metrics.DB_LATENCY, "login")
+def _find_user(email):
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM users WHERE email = %s", (email,))
+        user = cursor.fetchone()
+        cursor.close()
+    return user
+
+@metrics.timed(metrics.DB_LATENCY, "login")
+def _set_password(user_id, hashedpw):
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE users SET password = %s WHERE user_id = %s", (hashedpw, user_id))
+        conn.commit()
+        cursor.close()
+
 def register(email, name, password):
-    cursor = get_connection().cursor()
-    cursor.execute("SELECT * FROM users WHERE email = %s", (email,))
-    if cursor.fetchone() is not None:
+    """Create an account; returns the new user_id, or False if the email is taken."""
+    if _email_taken(email):
         return False
-    hashedpw = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
-    cursor.execute("INSERT INTO users (email, name, password) VALUES (%s, %s, %s)", (email, name, hashedpw))
-    conn.commit()
-    conn.close()
-    return True
+    return _insert_user(email, name, passwords.hash_password(password))
+
+@metrics.timed(metrics.DB_LATENCY, "register")
+def _email_taken(email):
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT user_id FROM users WHERE email = %s", (email,))
+        taken = cursor.fetchone() is not None
+        cursor.close()
+    return taken
+
+@metrics.timed(metrics.DB_LATENCY, "register")
+def _insert_user(email, name, hashedpw):
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("INSERT INTO users (email, name, password) VALUES (%s, %s, %s)", (email, name, hashedpw))
+        except errors.IntegrityError:
+            # Lost a race with another registration for the same email
+            cursor.close()
+            return False
+        user_id = cursor.lastrowid
+        conn.commit()
+        cursor.close()
+    return user_id
 
+@metrics.timed_query
 def add_recipe(user_id, name, ingredients, instructions, source, prep_time, cook_time, difficulty):
-    cursor = get_connection().cursor()
+    with connection() as conn:
+        cursor = conn.cursor()
+        recipe_id = _insert_recipe(cursor, user_id, name, prep_time, cook_time, difficulty)
+        _insert_children(cursor, [(recipe_id, name, ingredients, instructions)])
+        _bump_recipes_version(cursor, user_id)
+        conn.commit()
+        cursor.close()
+    return recipe_id
+
+@metrics.timed_query
+def add_recipes(user_id, recipes):
+    """Save many recipes (dicts shaped like /add_recipe bodies) in one transaction.
+
+    Returns the new recipe_ids in input order. Nothing is saved if any insert fails.
+    """
+    if not recipes:
+        return []
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            recipe_ids = _insert_recipes(cursor, user_id, recipes)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+    return recipe_ids
+
+def _insert_recipes(cursor, user_id, recipes):
+    # Parents go one by one so each lastrowid is exact; the children
+    # of every recipe are then written with one executemany per table
+    recipe_ids = [
+        _insert_recipe(cursor, user_id, recipe["title"], recipe["prepTime"], recipe["cookTime"], recipe["difficulty"])
+        for recipe in recipes
+    ]
+    _insert_children(cursor, [
+        (recipe_id, recipe["title"], recipe["ingredients"], recipe["instructions"])
+        for recipe_id, recipe in zip(recipe_ids, recipes)
+    ])
+    _bump_recipes_version(cursor, user_id)
+    return recipe_ids
+
+def _bump_recipes_version(cursor, user_id):
+    # Part of the caller's transaction, so the version never runs ahead of the data
+    cursor.execute("UPDATE users SET recipes_version = recipes_version + 1 WHERE user_id = %s", (user_id,))
+
+@metrics.timed_query
+def get_recipes_version(user_id):
+    """Counter that changes whenever the user's saved recipes (or their ratings) do."""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT recipes_version FROM users WHERE user_id = %s", (user_id,))
+        row = cursor.fetchone()
+        cursor.close()
+    return row[0] if row else None
+
+def _insert_recipe(cursor, user_id, name, prep_time, cook_time, difficulty):
     cursor.execute(
-        "INSERT INTO recipes (user_id, name, ingredients, instructions, prep_time, cook_time, difficulty) VALUES (%s, %s, %s, %s, %s, %s, %s)",
-        (user_id, name, "@".join(ingredients), "@".join(instructions), prep_time, cook_time, difficulty),
+        "INSERT INTO recipes (user_id, name, prep_time, cook_time, difficulty) VALUES (%s, %s, %s, %s, %s)",
+        (user_id, name, prep_time, cook_time, difficulty),
     )
-    conn.commit()
-    recipe_id = cursor.lastrowid
-    cursor.close()
-    return recipe_id
+    return cursor.lastrowid
 
+def _insert_children(cursor, recipes):
+    ingredient_rows = []
+    step_rows = []
+    embedding_rows = []
+    for recipe_id, name, ingredients, instructions in recipes:
+        ingredient_rows += [
+            (recipe_id, position, ingredient, ingredient_names.normalize(ingredient))
+            for position, ingredient in enumerate(ingredients or [])
+        ]
+        step_rows += [(recipe_id, position, instruction) for position, instruction in enumerate(instructions or [])]
+        embedding_rows.append((recipe_id, embeddings.to_bytes(embeddings.embed(name, ingredients))))
+    if ingredient_rows:
+        cursor.executemany(
+            "INSERT INTO recipe_ingredients (recipe_id, position, ingredient, normalized) VALUES (%s, %s, %s, %s)",
+            ingredient_rows,
+        )
+    if step_rows:
+        cursor.executemany(
+            "INSERT INTO recipe_steps (recipe_id, position, instruction) VALUES (%s, %s, %s)",
+            step_rows,
+        )
+    cursor.executemany(
+        "INSERT INTO recipe_embeddings (recipe_id, vector) VALUES (%s, %s)",
+        embedding_rows,
+    )
+
+@metrics.timed_query
 def remove_recipe(user_id, recipe_name):
-    cursor = get_connection().cursor()
-    cursor.execute("DELETE FROM recipes WHERE name = %s AND user_id = %s", (recipe_name, user_id))
-    conn.commit()
-    cursor.close()
+    with connection() as conn:
+        cursor = conn.cursor()
+        # Served by idx_recipes_user_name; child rows go with ON DELETE CASCADE
+        cursor.execute("DELETE FROM recipes WHERE name = %s AND user_id = %s", (recipe_name, user_id))
+        if cursor.rowcount:
+            _bump_recipes_version(cursor, user_id)
+        conn.commit()
+        cursor.close()
+
+# Fields a client may ask for in a recipe projection, mapped to their columns
+RECIPE_FIELDS = {
+    "recipe_id": "recipe_id",
+    "user_id": "user_id",
+    "name": "name",
+    "prepTime": "prep_time",
+    "cookTime": "cook_time",
+    "difficulty": "difficulty",
+    "created_at": "created_at",
+}
+CHILD_FIELDS = ("ingredients", "instructions")
+MAX_PAGE_SIZE = int(os.getenv("RECIPES_MAX_PAGE_SIZE", 100))
 
 #This will retrieve all recipes for a specific user
-def get_recipes(user_id):
-    cursor = get_connection().cursor(dictionary=True)
-    cursor.execute("SELECT * FROM recipes WHERE user_id = %s", (user_id,))
-    recipes = cursor.fetchall()
+@metrics.timed_query
+def get_recipes(user_id, fields=None):
+    recipes, _ = _query_recipes(user_id, fields=fields)
+    return recipes
+
+@metrics.timed_query
+def get_recipes_page(user_id, limit, after=None, fields=None):
+    """One page of a user's recipes in (created_at, recipe_id) order.
+
+    `after` is the opaque cursor returned with the previous page. Returns
+    (recipes, next_cursor); next_cursor is None on the last page.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    recipes, last = _query_recipes(user_id, fields=fields, limit=limit, after=decode_cursor(after) if after else None)
+    return recipes, encode_cursor(*last) if last else None
+
+def encode_cursor(created_at, recipe_id):
+    return base64.urlsafe_b64encode(f"{created_at}|{recipe_id}".encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor):
+    try:
+        created_at, recipe_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").rsplit("|", 1)
+        return created_at, int(recipe_id)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def _query_recipes(user_id, fields=None, limit=None, after=None):
+    wanted = list(RECIPE_FIELDS) + list(CHILD_FIELDS) if fields is None else fields
+    unknown = [field for field in wanted if field not in RECIPE_FIELDS and field not in CHILD_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown recipe fields: {', '.join(unknown)}")
+    # The keyset columns are always read so the next cursor can be built
+    columns = ["recipe_id", "created_at"] + [RECIPE_FIELDS[field] for field in wanted if field in RECIPE_FIELDS]
+    columns = list(dict.fromkeys(columns))
+
+    query = f"SELECT {', '.join(columns)} FROM recipes WHERE user_id = %s"
+    params = [user_id]
+    if after is not None:
+        query += " AND (created_at > %s OR (created_at = %s AND recipe_id > %s))"
+        params += [after[0], after[0], after[1]]
+    query += " ORDER BY created_at, recipe_id"
+    if limit is not None:
+        # One extra row tells us whether another page exists
+        query += " LIMIT %s"
+        params.append(limit + 1)
+
+    with connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(query, params)
+        rows = cursor.fetchall() if limit is None else cursor.fetchmany(limit + 1)
+        last = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            last = (rows[-1]["created_at"], rows[-1]["recipe_id"])
+        ingredients, instructions = _fetch_children(
+            cursor,
+            [row["recipe_id"] for row in rows],
+            with_ingredients="ingredients" in wanted,
+            with_instructions="instructions" in wanted,
+        )
+        cursor.close()
+
+    if fields is None:
+        for row in rows:
+            row["ingredients"] = ingredients.get(row["recipe_id"], [])
+            row["instructions"] = instructions.get(row["recipe_id"], [])
+            row["prepTime"] = row["prep_time"]
+            row["cookTime"] = row["cook_time"]
+        return rows, last
+
+    recipes = []
+    for row in rows:
+        recipe = {}
+        for field in wanted:
+            if field == "ingredients":
+                recipe[field] = ingredients.get(row["recipe_id"], [])
+            elif field == "instructions":
+                recipe[field] = instructions.get(row["recipe_id"], [])
+            else:
+                recipe[field] = row[RECIPE_FIELDS[field]]
+        recipes.append(recipe)
+    return recipes, last
+
+def _fetch_children(cursor, recipe_ids, with_ingredients=True, with_instructions=True):
+    ingredients = {}
+    instructions = {}
+    if not recipe_ids:
+        return ingredients, instructions
+    placeholders = ", ".join(["%s"] * len(recipe_ids))
+    if with_ingredients:
+        cursor.execute(
+            f"SELECT recipe_id, ingredient FROM recipe_ingredients WHERE recipe_id IN ({placeholders}) ORDER BY recipe_id, position",
+            recipe_ids,
+        )
+        for row in cursor.fetchall():
+            ingredients.setdefault(row["recipe_id"], []).append(row["ingredient"])
+    if with_instructions:
+        cursor.execute(
+            f"SELECT recipe_id, instruction FROM recipe_steps WHERE recipe_id IN ({placeholders}) ORDER BY recipe_id, position",
+            recipe_ids,
+        )
+        for row in cursor.fetchall():
+            instructions.setdefault(row["recipe_id"], []).append(row["instruction"])
+    return ingredients, instructions
+
+@metrics.timed_query
+def match_recipes(pantry, limit=10):
+    """Rank saved recipes by how much of their ingredient list `pantry` covers.
+
+    `pantry` holds normalized ingredient names (see ingredients.normalize).
+    Candidates come from the (normalized, recipe_id) index, so only recipes
+    sharing at least one ingredient are read. Staples count as available.
+    Returns recipe dicts with a "coverage" fraction, best first, one per
+    distinct title.
+    """
+    have = set(pantry) | ingredient_names.STAPLES
+    wanted = sorted(set(pantry))
+    if not wanted:
+        return []
+    placeholders = ", ".join(["%s"] * len(have))
+    with connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(
+            "SELECT ri.recipe_id, COUNT(*) AS total, "
+            f"SUM(CASE WHEN ri.normalized IN ({placeholders}) THEN 1 ELSE 0 END) AS matched "
+            "FROM recipe_ingredients ri "
+            f"WHERE ri.recipe_id IN (SELECT recipe_id FROM recipe_ingredients WHERE normalized IN ({', '.join(['%s'] * len(wanted))})) "
+            "GROUP BY ri.recipe_id",
+            sorted(have) + wanted,
+        )
+        candidates = cursor.fetchall()
+        candidates.sort(key=lambda row: (row["matched"] / row["total"], row["matched"]), reverse=True)
+        coverage = {row["recipe_id"]: row["matched"] / row["total"] for row in candidates}
+
+        recipes = _distinct_recipes(cursor, [row["recipe_id"] for row in candidates[:limit * 3]], limit)
+        cursor.close()
+
     for recipe in recipes:
-        recipe["ingredients"] = recipe["ingredients"].split("@")
-        recipe["instructions"] = recipe["instructions"].split("@")
-        recipe["difficulty"] = recipe["difficulty"].split("@")
-        recipe["prepTime"] = recipe["prep_time"]
-        recipe["cookTime"] = recipe["cook_time"]
-    cursor.close()
+        recipe["coverage"] = round(coverage[recipe["recipe_id"]], 2)
     return recipes
 
-def update_user(user_id, name, email, dietary_preferences, password):
-    print(f"Updating user id='{user_id}' name='{name}' email='{email}' dietary_preferences='{dietary_preferences}' password='{password}'")
-    cursor = get_connection().cursor()
+def _distinct_recipes(cursor, recipe_ids, limit):
+    """Recipes for `recipe_ids` in that order, skipping ids that no longer
+    exist and repeated titles (several users often save the same generated
+    recipe). Expects a dictionary cursor."""
+    if not recipe_ids:
+        return []
+    cursor.execute(
+        f"SELECT recipe_id, name, prep_time, cook_time, difficulty FROM recipes WHERE recipe_id IN ({', '.join(['%s'] * len(recipe_ids))})",
+        recipe_ids,
+    )
+    rows = {row["recipe_id"]: row for row in cursor.fetchall()}
+    recipes = []
+    seen = set()
+    for recipe_id in recipe_ids:
+        row = rows.get(recipe_id)
+        if row is None or row["name"].lower() in seen:
+            continue
+        seen.add(row["name"].lower())
+        recipes.append(row)
+        if len(recipes) == limit:
+            break
+    ingredients, instructions = _fetch_children(cursor, [row["recipe_id"] for row in recipes])
+    return [
+        {
+            "recipe_id": row["recipe_id"],
+            "title": row["name"],
+            "ingredients": ingredients.get(row["recipe_id"], []),
+            "instructions": instructions.get(row["recipe_id"], []),
+            "source": "",
+            "prepTime": row["prep_time"],
+            "cookTime": row["cook_time"],
+            "difficulty": row["difficulty"],
+        }
+        for row in recipes
+    ]
 
+EMBEDDING_BATCH = 5000
+
+def _load_embeddings(after_id):
+    rows = []
+    with connection() as conn:
+        cursor = conn.cursor()
+        while True:
+            cursor.execute(
+                "SELECT recipe_id, vector FROM recipe_embeddings WHERE recipe_id > %s ORDER BY recipe_id LIMIT %s",
+                (after_id, EMBEDDING_BATCH),
+            )
+            batch = cursor.fetchall()
+            rows += [(recipe_id, bytes(vector)) for recipe_id, vector in batch]
+            if len(batch) < EMBEDDING_BATCH:
+                break
+            after_id = batch[-1][0]
+        cursor.close()
+    return rows
+
+_similarity = embeddings.SimilarityIndex(_load_embeddings)
+
+@metrics.timed_query
+def similar_recipes(recipe_id, limit=10):
+    """Saved recipes closest to `recipe_id` by embedding, each with a cosine
+    "score". Returns None if the recipe has no embedding."""
+    vector = _similarity.vector(recipe_id)
+    if vector is None:
+        with connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT vector FROM recipe_embeddings WHERE recipe_id = %s", (recipe_id,))
+            row = cursor.fetchone()
+            cursor.close()
+        if row is None:
+            return None
+        vector = embeddings.from_bytes(bytes(row[0]))
+
+    # Extra candidates make up for duplicates of the recipe itself and for
+    # recipes deleted since the index was loaded
+    scored = _similarity.top_k(vector, limit * 3, exclude={recipe_id})
+    scores = dict(scored)
+    with connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT name FROM recipes WHERE recipe_id = %s", (recipe_id,))
+        own = cursor.fetchone()
+        recipes = _distinct_recipes(cursor, [candidate for candidate, _ in scored], limit + 1)
+        cursor.close()
+
+    own_name = own["name"].lower() if own else None
+    recipes = [recipe for recipe in recipes if recipe["title"].lower() != own_name][:limit]
+    for recipe in recipes:
+        recipe["score"] = round(scores[recipe["recipe_id"]], 4)
+    return recipes
+
+@metrics.timed_query
+def update_user(user_id, name, email, dietary_preferences, password):
     if name is not None and len(name) == 0:
         name = None
     if email is not None and len(email) == 0:
         email = None
     if password is not None and len(password) == 0:
         password = None
+    hashedpw = passwords.hash_password(password) if password is not None else None
 
-    if name is not None:
-        cursor.execute("UPDATE users SET name = %s WHERE user_id = %s", (name, user_id))
-    if email is not None:
-        cursor.execute("UPDATE users SET email = %s WHERE user_id = %s", (email, user_id))
-    cursor.execute("UPDATE users SET dietary_preferences = %s WHERE user_id = %s", (dietary_preferences, user_id))
-    if password is not None:
-        hashedpw = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
-        cursor.execute("UPDATE users SET password = %s WHERE user_id = %s", (hashedpw, user_id))
-    
-    conn.commit()
-    cursor.execute("SELECT * FROM users WHERE user_id = %s", (user_id,))
-    user = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    print(f"Updated user details: {user}")
+    with connection() as conn:
+        cursor = conn.cursor()
+        if name is not None:
+            cursor.execute("UPDATE users SET name = %s WHERE user_id = %s", (name, user_id))
+        if email is not None:
+            cursor.execute("UPDATE users SET email = %s WHERE user_id = %s", (email, user_id))
+        if dietary_preferences is not None:
+            cursor.execute("UPDATE users SET dietary_preferences = %s WHERE user_id = %s", (dietary_preferences, user_id))
+        if hashedpw is not None:
+            cursor.execute("UPDATE users SET password = %s WHERE user_id = %s", (hashedpw, user_id))
+
+        conn.commit()
+        invalidate_user(user_id)
+        cursor.execute("SELECT * FROM users WHERE user_id = %s", (user_id,))
+        user = cursor.fetchone()
+        cursor.close()
+    log.info("Updated user", extra={"user_id": user_id})
     return user
 
+_identity_cache = TTLCache(maxsize=IDENTITY_CACHE_SIZE, ttl=IDENTITY_CACHE_TTL)
+_identity_lock = threading.Lock()
+
+def _cached(key):
+    with _identity_lock:
+        return _identity_cache.get(key)
+
+def _cache(key, value):
+    with _identity_lock:
+        _identity_cache[key] = value
+
+def invalidate_user(user_id):
+    with _identity_lock:
+        # The user's email may have just changed, so drop every mapping to them
+        for key in [key for key, value in _identity_cache.items() if key[0] == "user_id" and value == user_id]:
+            _identity_cache.pop(key, None)
+
+def clear_identity_cache():
+    with _identity_lock:
+        _identity_cache.clear()
+
+@metrics.timed_query
 def get_user_id(email):
-    cursor = get_connection().cursor()
-    cursor.execute("SELECT user_id FROM users WHERE email = %s", (email,))
-    user_id = cursor.fetchone()[0]
-    cursor.close()
-    return user_id
+    user_id = _cached(("user_id", email))
+    if user_id is not None:
+        return user_id
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT user_id FROM users WHERE email = %s", (email,))
+        row = cursor.fetchone()
+        cursor.close()
+    if row is None:
+        return None
+    _cache(("user_id", email), row[0])
+    return row[0]
 
+@metrics.timed_query
 def get_dietary_preferences(user_id):
-    cursor = get_connection().cursor()
-    cursor.execute("SELECT dietary_preferences FROM users WHERE user_id = %s", (user_id,))
-    dietary_preferences = cursor.fetchone()[0]
-    cursor.close()
-    dietary_preferences = dietary_preferences.split("@") if dietary_preferences is not None else []
-    return dietary_preferences
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT dietary_preferences FROM users WHERE user_id = %s", (user_id,))
+        row = cursor.fetchone()
+        cursor.close()
+    dietary_preferences = row[0] if row else None
+    return dietary_preferences.split("@") if dietary_preferences is not None else []
 
 
+@metrics.timed_query
 def submit_rating(user_id, recipe_id, rating):
+    """Insert or change a user's rating and adjust the recipe's stats in the same transaction."""
+    if rating not in (1, 2, 3, 4, 5):
+        return False
+    rating = int(rating)
     try:
-        cursor = get_connection().cursor()
+        with connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(
+                    "SELECT rating FROM ratings WHERE user_id = %s AND recipe_id = %s FOR UPDATE",
+                    (user_id, recipe_id),
+                )
+                row = cursor.fetchone()
+                if row is None:
+                    cursor.execute(
+                        "INSERT INTO ratings (user_id, recipe_id, rating) VALUES (%s, %s, %s)",
+                        (user_id, recipe_id, rating)
+                    )
+                    cursor.execute(
+                        f"INSERT INTO recipe_rating_stats (recipe_id, rating_count, rating_sum, count_{rating}) VALUES (%s, 1, %s, 1) "
+                        f"ON DUPLICATE KEY UPDATE rating_count = rating_count + 1, rating_sum = rating_sum + %s, count_{rating} = count_{rating} + 1",
+                        (recipe_id, rating, rating),
+                    )
+                elif row[0] != rating:
+                    old = row[0]
+                    cursor.execute(
+                        "UPDATE ratings SET rating = %s WHERE user_id = %s AND recipe_id = %s",
+                        (rating, user_id, recipe_id),
+                    )
+                    cursor.execute(
+                        f"UPDATE recipe_rating_stats SET rating_sum = rating_sum + %s, "
+                        f"count_{old} = count_{old} - 1, count_{rating} = count_{rating} + 1 WHERE recipe_id = %s",
+                        (rating - old, recipe_id),
+                    )
+                if row is None or row[0] != rating:
+                    # The owner's saved list shows the recipe, so it is their version that moves
+                    cursor.execute(
+                        "UPDATE users SET recipes_version = recipes_version + 1 "
+                        "WHERE user_id = (SELECT user_id FROM recipes WHERE recipe_id = %s)",
+                        (recipe_id,),
+                    )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+        log.debug("Rating submitted", extra={"user_id": user_id, "recipe_id": recipe_id, "rating": rating})
+        return True
+    except Exception:
+        log.exception("Error submitting rating", extra={"user_id": user_id, "recipe_id": recipe_id})
+        return False
+
+@metrics.timed_query
+def get_rating_stats(recipe_id):
+    with connection() as conn:
+        cursor = conn.cursor(dictionary=True)
         cursor.execute(
-            "INSERT INTO ratings (user_id, recipe_id, rating) VALUES (%s, %s, %s)",
-            (user_id, recipe_id, rating)
+            "SELECT rating_count, rating_sum, count_1, count_2, count_3, count_4, count_5 "
+            "FROM recipe_rating_stats WHERE recipe_id = %s",
+            (recipe_id,),
         )
+        row = cursor.fetchone()
+        cursor.close()
+    if row is None:
+        row = {"rating_count": 0, "rating_sum": 0, "count_1": 0, "count_2": 0, "count_3": 0, "count_4": 0, "count_5": 0}
+    count = row["rating_count"]
+    return {
+        "recipe_id": recipe_id,
+        "count": count,
+        "average": round(row["rating_sum"] / count, 2) if count else None,
+        "histogram": {str(stars): row[f"count_{stars}"] for stars in range(1, 6)},
+    }
+
+
+def _now():
+    return datetime.datetime.utcnow().replace(microsecond=0)
+
+def _touch_guest(cursor, guest_id):
+    expires_at = _now() + datetime.timedelta(seconds=GUEST_TTL)
+    cursor.execute(
+        "INSERT INTO guests (guest_id, expires_at) VALUES (%s, %s) ON DUPLICATE KEY UPDATE expires_at = %s",
+        (guest_id, expires_at, expires_at),
+    )
+
+@metrics.timed_query
+def add_guest_recipes(guest_id, recipes):
+    """Save validated recipes (see app.validate_recipe) for a guest, extending their expiry."""
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            _touch_guest(cursor, guest_id)
+            cursor.executemany(
+                "INSERT INTO guest_recipes (guest_id, name, recipe) VALUES (%s, %s, %s)",
+                [(guest_id, recipe["title"], json.dumps(recipe)) for recipe in recipes],
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+@metrics.timed_query
+def get_guest_recipes(guest_id, fields=None):
+    """A guest's saved recipes in the same shape as get_recipes(); recipe_id is None."""
+    wanted = list(RECIPE_FIELDS) + list(CHILD_FIELDS) if fields is None else fields
+    unknown = [field for field in wanted if field not in RECIPE_FIELDS and field not in CHILD_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown recipe fields: {', '.join(unknown)}")
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT gr.recipe FROM guest_recipes gr JOIN guests g ON g.guest_id = gr.guest_id "
+            "WHERE gr.guest_id = %s AND g.expires_at > %s ORDER BY gr.guest_recipe_id",
+            (guest_id, _now()),
+        )
+        rows = cursor.fetchall()
+        cursor.close()
+
+    recipes = []
+    for (data,) in rows:
+        saved = json.loads(data)
+        row = {
+            "recipe_id": None, "user_id": None, "name": saved["title"], "created_at": None,
+            "prepTime": saved["prepTime"], "cookTime": saved["cookTime"], "difficulty": saved["difficulty"],
+            "ingredients": saved["ingredients"], "instructions": saved["instructions"],
+        }
+        if fields is None:
+            row["prep_time"] = row["prepTime"]
+            row["cook_time"] = row["cookTime"]
+            recipes.append(row)
+        else:
+            recipes.append({field: row[field] for field in wanted})
+    return recipes
+
+@metrics.timed_query
+def remove_guest_recipe(guest_id, recipe_name):
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM guest_recipes WHERE guest_id = %s AND name = %s", (guest_id, recipe_name))
         conn.commit()
         cursor.close()
-        print(f"Rating submitted: user_id={user_id}, recipe_id={recipe_id}, rating={rating}")
+
+@metrics.timed_query
+def submit_guest_rating(guest_id, recipe_id, rating):
+    """Remember a guest's rating; it only counts towards the stats once they register."""
+    if rating not in (1, 2, 3, 4, 5):
+        return False
+    try:
+        with connection() as conn:
+            cursor = conn.cursor()
+            try:
+                _touch_guest(cursor, guest_id)
+                cursor.execute(
+                    "INSERT INTO guest_ratings (guest_id, recipe_id, rating) VALUES (%s, %s, %s) "
+                    "ON DUPLICATE KEY UPDATE rating = %s",
+                    (guest_id, recipe_id, int(rating), int(rating)),
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
         return True
-    except Exception as e:
-        print(f"Error submitting rating to database: {e}")
-        return False
\ No newline at end of file
+    except Exception:
+        log.exception("Error submitting guest rating", extra={"recipe_id": recipe_id})
+        return False
+
+@metrics.timed_query
+def promote_guest(guest_id, user_id):
+    """Move an unexpired guest's recipes and ratings to a newly registered user."""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM guests WHERE guest_id = %s AND expires_at > %s", (guest_id, _now()))
+        live = cursor.fetchone() is not None
+        recipes, ratings = [], []
+        if live:
+            cursor.execute(
+                "SELECT recipe FROM guest_recipes WHERE guest_id = %s ORDER BY guest_recipe_id", (guest_id,)
+            )
+            recipes = [json.loads(row[0]) for row in cursor.fetchall()]
+            cursor.execute("SELECT recipe_id, rating FROM guest_ratings WHERE guest_id = %s", (guest_id,))
+            ratings = cursor.fetchall()
+        cursor.close()
+    if not live:
+        return 0, 0
+
+    # Ratings are upserts, so repeating them after a failure part way is harmless
+    promoted_ratings = sum(1 for recipe_id, rating in ratings if submit_rating(user_id, recipe_id, rating))
+    # The recipes and the guest's removal share a transaction, so they are copied once
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            if recipes:
+                _insert_recipes(cursor, user_id, recipes)
+            cursor.execute("DELETE FROM guests WHERE guest_id = %s", (guest_id,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+    log.info("Promoted guest", extra={"user_id": user_id, "recipes": len(recipes), "ratings": promoted_ratings})
+    return len(recipes), promoted_ratings
+
+@metrics.timed_query
+def purge_guests(batch=None):
+    """Delete expired guests (and, by cascade, what they saved). Returns how many went."""
+    batch = batch or GUEST_PURGE_BATCH
+    purged = 0
+    while True:
+        # Small batches keep each transaction's locks short on a busy table
+        with connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT guest_id FROM guests WHERE expires_at <= %s ORDER BY expires_at LIMIT %s",
+                (_now(), batch),
+            )
+            guest_ids = [row[0] for row in cursor.fetchall()]
+            if guest_ids:
+                placeholders = ", ".join(["%s"] * len(guest_ids))
+                cursor.execute(f"DELETE FROM guests WHERE guest_id IN ({placeholders})", guest_ids)
+                conn.commit()
+            cursor.close()
+        purged += len(guest_ids)
+        if len(guest_ids) < batch:
+            return purged
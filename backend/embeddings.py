@@ -0,0 +1,119 @@
+"""Local recipe embeddings and an in-memory cosine similarity index.
+
+A recipe's vector is a signed feature hash of its normalized ingredients
+(plus, more weakly, their single words and the title words), L2-normalized
+and stored as DIM little-endian float32s. No model or network is involved,
+so vectors are computed inline when a recipe is saved.
+"""
+import hashlib
+import os
+import threading
+import time
+import numpy as np
+import ingredients as ingredient_names
+
+DIM = int(os.getenv("EMBEDDING_DIM", 256))
+# Seconds between checks for newly saved recipes, and between full reloads
+# (which also drop deleted recipes from the index)
+REFRESH_INTERVAL = float(os.getenv("EMBEDDING_REFRESH_INTERVAL", 30))
+RELOAD_INTERVAL = float(os.getenv("EMBEDDING_RELOAD_INTERVAL", 60 * 60))
+
+INGREDIENT_WEIGHT = 1.0
+WORD_WEIGHT = 0.5
+TITLE_WEIGHT = 0.25
+
+_DTYPE = np.dtype("<f4")
+
+
+def _bucket(feature):
+    # Python's hash() differs per process, so use a stable digest
+    digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+    return digest % DIM, 1.0 if digest >> 63 else -1.0
+
+def embed(title, ingredients):
+    """Vector for a recipe from its title and raw ingredient lines."""
+    vector = np.zeros(DIM, dtype=np.float32)
+    features = []
+    for name in ingredient_names.normalize_all(ingredients):
+        features.append(("i:" + name, INGREDIENT_WEIGHT))
+        words = name.split()
+        if len(words) > 1:
+            features += [("w:" + word, WORD_WEIGHT) for word in words]
+    features += [("t:" + word, TITLE_WEIGHT) for word in ingredient_names.normalize(title or "").split()]
+    for feature, weight in features:
+        index, sign = _bucket(feature)
+        vector[index] += sign * weight
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def to_bytes(vector):
+    return np.asarray(vector, dtype=_DTYPE).tobytes()
+
+def from_bytes(data):
+    return np.frombuffer(data, dtype=_DTYPE)
+
+
+class SimilarityIndex:
+    """All stored vectors as one (n, DIM) matrix; a query is one mat-vec.
+
+    `loader(after_id)` returns (recipe_id, vector bytes) rows with
+    recipe_id > after_id in id order. New recipes are appended every
+    REFRESH_INTERVAL seconds; the whole index is rebuilt every
+    RELOAD_INTERVAL. Queries read an immutable snapshot, so they never wait
+    on a refresh.
+    """
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._matrix = np.zeros((0, DIM), dtype=np.float32)
+        self._refreshed = None
+        self._reloaded = None
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._refreshed is not None and now - self._refreshed < REFRESH_INTERVAL:
+            return
+        # One thread refreshes; the others keep using the current snapshot
+        if not self._lock.acquire(blocking=self._refreshed is None):
+            return
+        try:
+            reload = self._reloaded is None or now - self._reloaded >= RELOAD_INTERVAL
+            after = 0 if reload or not len(self._ids) else int(self._ids[-1])
+            rows = [(recipe_id, data) for recipe_id, data in self._loader(after) if len(data) == DIM * 4]
+            ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+            matrix = np.vstack([from_bytes(row[1]) for row in rows]) if rows else np.zeros((0, DIM), dtype=np.float32)
+            if reload:
+                self._ids, self._matrix = ids, matrix
+                self._reloaded = now
+            elif rows:
+                self._ids, self._matrix = np.concatenate([self._ids, ids]), np.vstack([self._matrix, matrix])
+            self._refreshed = now
+        finally:
+            self._lock.release()
+
+    def vector(self, recipe_id):
+        self._refresh()
+        ids = self._ids
+        position = np.searchsorted(ids, recipe_id)
+        if position < len(ids) and ids[position] == recipe_id:
+            return self._matrix[position]
+        return None
+
+    def top_k(self, vector, k, exclude=()):
+        """The k (recipe_id, score) pairs most similar to `vector`, best first."""
+        self._refresh()
+        ids, matrix = self._ids, self._matrix
+        if not len(ids) or k <= 0:
+            return []
+        scores = matrix @ np.asarray(vector, dtype=np.float32)
+        wanted = min(len(ids), k + len(exclude))
+        # argpartition finds the top block in O(n); only that block is sorted
+        top = np.argpartition(-scores, wanted - 1)[:wanted]
+        top = top[np.argsort(-scores[top])]
+        results = [(int(ids[i]), float(scores[i])) for i in top if int(ids[i]) not in exclude]
+        return results[:k]
+
+    def __len__(self):
+        return len(self._ids)
@@ -0,0 +1,120 @@
+"""Response encoding: orjson for JSON, optional MessagePack, gzip/brotli.
+
+OrjsonProvider replaces Flask's JSON provider, so jsonify() and
+app.json.dumps() go through orjson with the same output types (sorted keys,
+HTTP dates). payload() additionally answers in MessagePack when the client
+asks for it, and compress() is an after_request hook that gzips or
+brotli-compresses large JSON/MessagePack bodies for clients that accept it.
+Brotli and MessagePack are used only when their packages are installed.
+"""
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+import gzip
+import os
+import orjson
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Bodies smaller than this many bytes are sent uncompressed
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+# Dynamic responses favour speed over ratio: gzip 1-9, brotli 0-11
+GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", 4))
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+# Older clients still send the unregistered x- type
+MSGPACK_ALIASES = (MSGPACK, "application/x-msgpack")
+COMPRESSIBLE = (JSON, MSGPACK, "application/x-ndjson")
+
+_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask's default provider with orjson doing the work.
+
+    Datetimes, Decimals and the rest are passed to the default provider's
+    `default`, so responses look exactly as they did with the json module.
+    Calls with json.dumps keyword arguments fall back to the json module.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=_OPTIONS).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if self._app.debug:
+            # Indented output for debugging
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def negotiate():
+    """"msgpack" if the client prefers MessagePack (and it is installed), else "json"."""
+    if msgpack is None:
+        return "json"
+    # On a tie (e.g. */*) the first offer, JSON, wins
+    best = request.accept_mimetypes.best_match((JSON,) + MSGPACK_ALIASES, default=JSON)
+    return "msgpack" if best in MSGPACK_ALIASES else "json"
+
+def dumps(obj, fmt):
+    """Serialize `obj` as bytes in `fmt` ("json" or "msgpack")."""
+    if fmt == "msgpack":
+        return msgpack.packb(obj, default=DefaultJSONProvider.default, use_bin_type=True)
+    return orjson.dumps(obj, default=DefaultJSONProvider.default, option=_OPTIONS)
+
+def mimetype(fmt):
+    return MSGPACK if fmt == "msgpack" else JSON
+
+def payload(app, obj, status=200, fmt=None):
+    """Response for `obj` in the format the client asked for."""
+    fmt = fmt or negotiate()
+    response = app.response_class(dumps(obj, fmt), status=status, mimetype=mimetype(fmt))
+    response.vary.add("Accept")
+    return response
+
+
+def _choose_encoding():
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    return request.accept_encodings.best_match(offered)
+
+def compress(response):
+    """after_request hook: compress large buffered JSON/MessagePack bodies."""
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE
+    ):
+        return response
+    # Whether it ends up compressed or not, the body depends on Accept-Encoding
+    response.vary.add("Accept-Encoding")
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+    encoding = _choose_encoding()
+    if encoding == "br":
+        response.set_data(brotli.compress(body, quality=BROTLI_QUALITY))
+    elif encoding == "gzip":
+        response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0))
+    else:
+        return response
+    response.headers["Content-Encoding"] = encoding
+    return response
@@ -1,9 +1,23 @@
 from google import genai
-from google.genai import types
+from google.genai import errors
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+from typing import List, Optional
 import json
 import re
 import asyncio
+import concurrent.futures
 import os
+import threading
+import time
+import weakref
+import httpx
+import limiter
+import logs
+import metrics
+import providers
+import recipe_cache
 
 API_KEY = os.getenv("GEMINI_KEY", "asd")
 # import dotenv
@@ -12,12 +26,200 @@ API_KEY = os.getenv("GEMINI_KEY", "asd")
 if API_KEY is None:
     raise ValueError("GEMINI_KEY environment variable is not set")
 
-async def generate(ingredients: list, dietary_preferences: list):
-    client = genai.Client(api_key=API_KEY)
-    loop = asyncio.get_event_loop()
-    response = await loop.run_in_executor(None, lambda: client.models.generate_content(
-    model='gemini-2.0-flash',
-    contents=(
+# Seconds a request thread waits for a generation before giving up
+TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", 60))
+# Seconds a coalesced caller waits on another request's in-flight generation
+COALESCE_TIMEOUT = float(os.getenv("GEMINI_COALESCE_TIMEOUT", TIMEOUT))
+
+log = logs.get_logger(__name__)
+
+# Upstream protection: at most GEMINI_MAX_CONCURRENCY calls in flight across
+# the server, so each process gets its share of the slots; callers wait up
+# to QUEUE_TIMEOUT seconds for a slot before being shed
+MAX_CONCURRENCY = int(limiter.share(int(os.getenv("GEMINI_MAX_CONCURRENCY", 8))))
+QUEUE_TIMEOUT = float(os.getenv("GEMINI_QUEUE_TIMEOUT", 10))
+# Attempts per call on 429/5xx, with jittered exponential backoff between them
+RETRY_ATTEMPTS = int(os.getenv("GEMINI_RETRY_ATTEMPTS", 3))
+RETRY_BASE = float(os.getenv("GEMINI_RETRY_BASE", 0.5))
+RETRY_CAP = float(os.getenv("GEMINI_RETRY_CAP", 8))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Consecutive failed calls that open the breaker, and seconds it stays open
+BREAKER_THRESHOLD = int(os.getenv("GEMINI_BREAKER_THRESHOLD", 5))
+BREAKER_COOLDOWN = float(os.getenv("GEMINI_BREAKER_COOLDOWN", 30))
+
+# Model routing: MODEL answers first; FALLBACK_MODEL (empty to disable) gets
+# one try when MODEL still fails with an overload/5xx/network error
+PROVIDER = os.getenv("GEMINI_PROVIDER", "gemini")
+MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+FALLBACK_MODEL = os.getenv("GEMINI_FALLBACK_MODEL", "gemini-2.0-flash-lite")
+MAX_OUTPUT_TOKENS = int(os.getenv("GEMINI_MAX_OUTPUT_TOKENS", 2000))
+# Hedging: a generation still running after the HEDGE_QUANTILE of recent
+# latencies gets a duplicate request; the first to finish wins. Nothing is
+# hedged until HEDGE_MIN_SAMPLES calls have been timed, and at most
+# HEDGE_MAX_RATIO of calls are ever hedged, which bounds the extra cost.
+HEDGE_QUANTILE = float(os.getenv("GEMINI_HEDGE_QUANTILE", 0.95))
+HEDGE_MIN_SAMPLES = int(os.getenv("GEMINI_HEDGE_MIN_SAMPLES", 20))
+HEDGE_MAX_RATIO = float(os.getenv("GEMINI_HEDGE_MAX_RATIO", 0.05))
+HEDGE_WINDOW = 200
+
+
+class GeminiUnavailable(Exception):
+    """Raised when a call is shed: the breaker is open or no slot freed up in time."""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# One client and one event loop per process. Request threads hand their
+# coroutines to the loop with run() instead of spinning up a loop each.
+_client = None
+_loop = None
+_owner_pid = None
+_lock = threading.Lock()
+# Loop-bound, so created on the loop itself; only touched from the loop
+_semaphore = None
+_breaker = limiter.CircuitBreaker(BREAKER_THRESHOLD, BREAKER_COOLDOWN)
+# Resolved through get_client() on each call, so it follows the per-process client
+_provider = providers.create(PROVIDER, lambda: get_client())
+
+def _ensure_started():
+    global _client, _loop, _owner_pid, _semaphore, _breaker
+    # Threads do not survive fork(), so a forked worker starts its own loop
+    if _owner_pid == os.getpid():
+        return
+    with _lock:
+        if _owner_pid == os.getpid():
+            return
+        _client = genai.Client(api_key=API_KEY)
+        _loop = asyncio.new_event_loop()
+        _semaphore = None
+        _breaker = limiter.CircuitBreaker(BREAKER_THRESHOLD, BREAKER_COOLDOWN)
+        threading.Thread(target=_loop.run_forever, name="gemini-loop", daemon=True).start()
+        _owner_pid = os.getpid()
+
+def get_client():
+    _ensure_started()
+    return _client
+
+def get_loop():
+    _ensure_started()
+    return _loop
+
+def run(coro, timeout=TIMEOUT):
+    future = asyncio.run_coroutine_threadsafe(coro, get_loop())
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise
+
+async def generate(ingredients: list, dietary_preferences: list, use_cache: bool = True):
+    key = recipe_cache.make_key(ingredients, dietary_preferences)
+    if use_cache:
+        cached = await recipe_cache.get_async(key)
+        if cached is not None:
+            return cached
+
+    return await _coalesce(key, lambda: _generate_and_cache(key, ingredients, dietary_preferences))
+
+async def _generate_and_cache(key, ingredients, dietary_preferences):
+    recipes = await _generate(ingredients, dietary_preferences)
+    # Only successful generations are cached; error dicts should be retried
+    if isinstance(recipes, list):
+        await recipe_cache.put_async(key, recipes)
+    return recipes
+
+# Single-flight: concurrent requests for the same key share one upstream
+# call. Only touched from the shared loop, so no lock is needed.
+_inflight = {}
+
+async def _coalesce(key, start, timeout=None):
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(start())
+        _inflight[key] = task
+        task.add_done_callback(lambda done: _forget(key, done))
+    # shield() keeps one caller timing out from cancelling everyone else's call
+    return await asyncio.wait_for(asyncio.shield(task), timeout or COALESCE_TIMEOUT)
+
+def _forget(key, task):
+    if _inflight.get(key) is task:
+        del _inflight[key]
+    if not task.cancelled():
+        # Waiters re-raise the error themselves; this just marks it retrieved
+        task.exception()
+
+def inflight_count():
+    return len(_inflight)
+
+def _retryable(error):
+    if isinstance(error, errors.APIError):
+        return error.code in RETRY_STATUSES
+    return isinstance(error, httpx.TransportError)
+
+@asynccontextmanager
+async def _upstream(call):
+    """Guard one upstream call (or stream) with the breaker and a concurrency slot."""
+    global _semaphore
+    try:
+        _breaker.before_call()
+    except limiter.CircuitOpen as e:
+        raise GeminiUnavailable("Recipe generation is temporarily unavailable", e.retry_after) from None
+
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    try:
+        await asyncio.wait_for(_semaphore.acquire(), QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        _breaker.abandon()
+        raise GeminiUnavailable("Too many recipe generations in progress") from None
+
+    started = time.perf_counter()
+    outcome = "error"
+    metrics.GEMINI_INFLIGHT.inc()
+    try:
+        yield
+        outcome = "ok"
+    except errors.APIError as e:
+        # A 4xx means Gemini is up and answering; only overload/5xx count against it
+        if _retryable(e):
+            _breaker.failure()
+        else:
+            _breaker.success()
+        raise
+    except asyncio.CancelledError:
+        # A hedge that lost the race says nothing about upstream health; any
+        # other cancellation means the request thread gave up on a slow call
+        if asyncio.current_task() in _hedge_losers:
+            _breaker.abandon()
+        else:
+            _breaker.failure()
+        raise
+    except (httpx.TransportError, asyncio.TimeoutError):
+        _breaker.failure()
+        raise
+    except BaseException:
+        _breaker.abandon()
+        raise
+    else:
+        _breaker.success()
+    finally:
+        _semaphore.release()
+        metrics.GEMINI_INFLIGHT.dec()
+        metrics.GEMINI_LATENCY.labels(call, outcome).observe(time.perf_counter() - started)
+
+def _count_tokens(completion):
+    if completion is None:
+        return
+    metrics.GEMINI_TOKENS.labels("prompt").inc(completion.prompt_tokens)
+    metrics.GEMINI_TOKENS.labels("output").inc(completion.output_tokens)
+
+def breaker_state():
+    return _breaker.state
+
+def build_prompt(ingredients: list, dietary_preferences: list):
+    return (
         "Generate exactly 3 recipes using some of the following ingredients: " + ", ".join(ingredients) + ". "
         "Each recipe must include a source. Return the response as a JSON array containing three objects, "
         "each with the following fields: title, instructions, ingredients, source, prepTime, cookTime, and difficulty. "
@@ -27,40 +229,336 @@ async def generate(ingredients: list, dietary_preferences: list):
         "The ingredients field must be a list strings (e.g., [\"1 cup flour\", \"1/2 cup sugar\"]). "
         "Ensure the recipes follow these dietary preferences: " + ", ".join(dietary_preferences) + ". "
         "Do not add extra formatting or explanations—only return valid JSON."
-    ),
-    config=types.GenerateContentConfig(
-        max_output_tokens=2000,
-    ),
-))
+    )
 
-    # {\"title\": \"Recipe Title\", \"instructions\": \"Recipe Instructions\", \"ingredients\": [\"ingredient1\", \"ingredient2\", \"ingredient3\"], \"source\": \"Recipe Source\"}"
-    print(response.text)
-    return clean_json(response.text)
+# Recent successful call latencies per model, for the hedging deadline.
+# Like the rest of the routing state, only touched from the shared loop.
+_latencies = {}
+_calls = 0
+_hedges = 0
+_hedge_losers = weakref.WeakSet()
 
-def clean_json(text):
-    # Try to find the full JSON structure
-    match = re.search(r'\[.*\]', text, re.DOTALL)
-    if match:
-        cleaned_text = match.group(0)
-    else:
-        return {"error": "No valid JSON array found", "raw_response": text}
+def _hedge_delay(model):
+    """Seconds to wait before hedging a call to `model`, or None to not hedge."""
+    samples = _latencies.get(model)
+    if samples is None or len(samples) < HEDGE_MIN_SAMPLES:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(HEDGE_QUANTILE * len(ordered)))]
+
+def _may_hedge():
+    # Never when upstream is struggling or every slot is taken: a duplicate
+    # would only add load or queue behind the call it is meant to overtake
+    if _breaker.state != "closed" or (_semaphore is not None and _semaphore.locked()):
+        return False
+    return _hedges < HEDGE_MAX_RATIO * _calls
+
+def _record_latency(model, started):
+    _latencies.setdefault(model, deque(maxlen=HEDGE_WINDOW)).append(time.perf_counter() - started)
+
+async def _call(model, prompt):
+    started = time.perf_counter()
+    try:
+        async with _upstream("generate"):
+            completion = await limiter.retry(
+                lambda: _provider.generate(model, prompt, MAX_OUTPUT_TOKENS),
+                _retryable, RETRY_ATTEMPTS, RETRY_BASE, RETRY_CAP,
+            )
+    except asyncio.CancelledError:
+        # A hedge loser took at least this long; leaving the slow calls out
+        # would pull the quantile, and so the hedge delay, down
+        if asyncio.current_task() in _hedge_losers:
+            _record_latency(model, started)
+        raise
+    _record_latency(model, started)
+    _count_tokens(completion)
+    return completion
+
+async def _hedged(model, prompt):
+    """_call(), plus a duplicate if the first is slower than usual; first success wins."""
+    global _calls, _hedges
+    _calls += 1
+    delay = _hedge_delay(model)
+    if delay is None:
+        return await _call(model, prompt)
+
+    first = asyncio.ensure_future(_call(model, prompt))
+    tasks = [first]
+    try:
+        await asyncio.wait(tasks, timeout=delay)
+        if first.done() or not _may_hedge():
+            return await first
+
+        _hedges += 1
+        metrics.GEMINI_HEDGES.labels("sent").inc()
+        tasks.append(asyncio.ensure_future(_call(model, prompt)))
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    metrics.GEMINI_HEDGES.labels("lost" if task is first else "won").inc()
+                    _hedge_losers.update(pending)
+                    return task.result()
+        # Both failed; report the original call's error
+        return first.result()
+    finally:
+        # Losers are cancelled here, as is everything if our caller gave up
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+async def _generate(ingredients: list, dietary_preferences: list):
+    prompt = build_prompt(ingredients, dietary_preferences)
+    try:
+        completion = await _hedged(MODEL, prompt)
+    except Exception as e:
+        if not FALLBACK_MODEL or not _retryable(e):
+            raise
+        metrics.GEMINI_FALLBACKS.inc()
+        log.warning("Falling back to another model", extra={"model": FALLBACK_MODEL, "error": str(e)})
+        try:
+            completion = await _call(FALLBACK_MODEL, prompt)
+        except GeminiUnavailable:
+            # Shed because MODEL's failures opened the breaker; theirs is the real error
+            raise e from None
+
+    log.debug("Gemini response", extra={"text": completion.text})
+    return clean_json(completion.text)
+
+async def generate_stream(ingredients: list, dietary_preferences: list, use_cache: bool = True):
+    """Yield recipes one at a time as soon as each object has streamed in."""
+    key = recipe_cache.make_key(ingredients, dietary_preferences)
+    if use_cache:
+        cached = await recipe_cache.get_async(key)
+        if cached is not None:
+            for recipe in cached:
+                yield recipe
+            return
+
+    parser = RecipeStreamParser()
+    recipes = []
+    # The slot is held until the stream ends; only opening it is retried,
+    # since recipes may already have gone out to the client after that
+    # Streams are not hedged, since a duplicate would have to be discarded
+    # once either had sent a recipe; FALLBACK_MODEL is tried if MODEL cannot
+    # be opened at all
+    usage = None
+    prompt = build_prompt(ingredients, dietary_preferences)
+    async with _upstream("stream"):
+        try:
+            stream = await limiter.retry(
+                lambda: _provider.open_stream(MODEL, prompt, MAX_OUTPUT_TOKENS),
+                _retryable, RETRY_ATTEMPTS, RETRY_BASE, RETRY_CAP,
+            )
+        except Exception as e:
+            if not FALLBACK_MODEL or not _retryable(e):
+                raise
+            metrics.GEMINI_FALLBACKS.inc()
+            stream = await _provider.open_stream(FALLBACK_MODEL, prompt, MAX_OUTPUT_TOKENS)
+        async for chunk in stream:
+            # Each chunk reports the running totals; the last one is complete
+            if chunk.prompt_tokens or chunk.output_tokens:
+                usage = chunk
+            for recipe in parser.feed(chunk.text):
+                recipes.append(recipe)
+                yield recipe
+    _count_tokens(usage)
+
+    if parser.finished and recipes:
+        await recipe_cache.put_async(key, recipes)
+
+def iterate(agen, timeout=TIMEOUT):
+    """Drive an async generator on the shared loop from a request thread."""
+    done = object()
+
+    async def next_item():
+        try:
+            return await agen.__anext__()
+        except StopAsyncIteration:
+            return done
 
-    # Attempt to parse JSON
     try:
-        loaded = json.loads(cleaned_text)
-        
-        # Ensure we have a list
-        if not isinstance(loaded, list):
-            return {"error": "Extracted JSON is not a list", "raw_response": cleaned_text}
-        
-        # Convert instructions to a list
-        for recipe in loaded:
-            if "instructions" in recipe and isinstance(recipe["instructions"], str):
-                recipe["instructions"] = recipe["instructions"].split("\n")
-        
-        return loaded
-    except json.JSONDecodeError as e:
-        return {"error": "Failed to parse response as JSON", "raw_response": cleaned_text, "message": str(e)}
+        while True:
+            item = run(next_item(), timeout)
+            if item is done:
+                return
+            yield item
+    finally:
+        # Also runs when the client disconnects mid-stream
+        run(agen.aclose(), timeout)
+
+
+DIFFICULTIES = {"easy": "Easy", "medium": "Medium", "hard": "Hard"}
+
+@dataclass
+class Recipe:
+    """The recipe shape the app hands to clients, checked while parsing."""
+
+    title: str
+    ingredients: List[str]
+    instructions: List[str]
+    source: str = ""
+    prepTime: str = ""
+    cookTime: str = ""
+    difficulty: str = ""
+
+    @classmethod
+    def from_json(cls, obj) -> Optional["Recipe"]:
+        """Coerce a decoded object into a Recipe, or None if it cannot be salvaged."""
+        if not isinstance(obj, dict):
+            return None
+        title = obj.get("title")
+        if not isinstance(title, str) or not title.strip():
+            return None
+        ingredients = _text_list(obj.get("ingredients"))
+        instructions = _text_list(obj.get("instructions"))
+        if not ingredients or not instructions:
+            return None
+        difficulty = _text(obj.get("difficulty"))
+        return cls(
+            title=title.strip(),
+            ingredients=ingredients,
+            instructions=instructions,
+            source=_text(obj.get("source")),
+            prepTime=_minutes(obj.get("prepTime")),
+            cookTime=_minutes(obj.get("cookTime")),
+            difficulty=DIFFICULTIES.get(difficulty.lower(), difficulty),
+        )
+
+def _text(value):
+    if value is None:
+        return ""
+    return value.strip() if isinstance(value, str) else str(value)
+
+def _minutes(value):
+    # The prompt asks for "X minutes" but bare numbers come back too
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"{value:g} minutes"
+    return _text(value)
+
+def _text_list(value):
+    if isinstance(value, str):
+        value = value.split("\n")
+    if not isinstance(value, list):
+        return []
+    items = []
+    for item in value:
+        if isinstance(item, dict):
+            # e.g. {"name": "Olive Oil", "quantity": "2 tablespoons"}
+            item = " ".join(_text(item.get(key)) for key in ("quantity", "name") if item.get(key))
+        item = _text(item)
+        if item:
+            items.append(item)
+    return items
+
+
+_STRUCTURAL = re.compile(r'[\[\]{}"]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+class RecipeStreamParser:
+    """Single-pass parser for a (possibly streamed or truncated) JSON array of recipes.
+
+    feed() takes text chunks of any size and returns the Recipes completed
+    by that chunk. Text around the array (code fences, prose) is skipped, a
+    bracket that does not open an array of objects (e.g. "[3]") is ignored,
+    and objects that fail validation are dropped, so a response cut off at
+    max_output_tokens still yields every recipe that finished.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.finished = False
+        self.count = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._pending = []
+
+    def feed(self, chunk):
+        recipes = []
+        pos = 0
+        start = 0
+        end = len(chunk)
+        while pos < end and not self.finished:
+            if not self.started:
+                pos = chunk.find("[", pos)
+                if pos < 0:
+                    break
+                self.started = True
+                pos += 1
+            elif self._depth == 0:
+                char = chunk[pos]
+                if char == "{":
+                    self._depth = 1
+                    start = pos
+                elif char == "]":
+                    if self.count:
+                        self.finished = True
+                    else:
+                        self.started = False
+                elif not (char.isspace() or char == ","):
+                    # Not an array of objects; keep looking for one
+                    self.started = False
+                pos += 1
+            elif self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                    pos += 1
+                    continue
+                match = _STRING_SPECIAL.search(chunk, pos)
+                if match is None:
+                    pos = end
+                    break
+                pos = match.start()
+                if chunk[pos] == "\\":
+                    self._escaped = True
+                else:
+                    self._in_string = False
+                pos += 1
+            else:
+                match = _STRUCTURAL.search(chunk, pos)
+                if match is None:
+                    pos = end
+                    break
+                pos = match.start()
+                char = chunk[pos]
+                if char == '"':
+                    self._in_string = True
+                elif char in "{[":
+                    self._depth += 1
+                else:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self._pending.append(chunk[start:pos + 1])
+                        recipe = self._decode("".join(self._pending))
+                        self._pending = []
+                        if recipe is not None:
+                            self.count += 1
+                            recipes.append(recipe)
+                pos += 1
+
+        if self._depth > 0:
+            # Object continues in the next chunk
+            self._pending.append(chunk[start:])
+        return recipes
+
+    def _decode(self, text):
+        try:
+            recipe = Recipe.from_json(json.loads(text))
+        except json.JSONDecodeError:
+            return None
+        return asdict(recipe) if recipe is not None else None
+
+
+def clean_json(text):
+    parser = RecipeStreamParser()
+    recipes = parser.feed(text)
+    if recipes:
+        return recipes
+    if "[" not in text:
+        return {"error": "No valid JSON array found", "raw_response": text}
+    return {"error": "No valid recipes found in response", "raw_response": text}
     
 
 if __name__ == "__main__":
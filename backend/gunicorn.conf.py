@@ -0,0 +1,73 @@
+# Production server settings: gunicorn -c gunicorn.conf.py app:app
+import multiprocessing
+import os
+import shutil
+
+# Workers write metrics here so /metrics can sum them. Must be set before the
+# app (and prometheus_client) is preloaded, and emptied on every start.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/mealmatcher-metrics")
+shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+
+# One process per core, each with a pool of threads. Requests spend most of
+# their time waiting on MySQL or Gemini, so threads are cheaper than more
+# processes. Keep DB_POOL_SIZE >= WEB_THREADS.
+workers = int(os.getenv("WEB_WORKERS", multiprocessing.cpu_count()))
+# The app divides server-wide limits (generation quotas, Gemini
+# concurrency) between the workers; see limiter.share
+os.environ["WEB_WORKERS"] = str(workers)
+# Each worker has its own bcrypt pool; between them they get one process per core
+os.environ.setdefault("BCRYPT_WORKERS", str(max(1, multiprocessing.cpu_count() // workers)))
+
+# A job is created by one worker and usually polled through another, so with
+# more than one worker job state must be in a shared SQLite file. The default
+# file is emptied on every start: its unfinished jobs died with the old workers.
+if "JOBS_PATH" not in os.environ and workers > 1:
+    os.environ["JOBS_PATH"] = "/tmp/mealmatcher-jobs.db"
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(os.environ["JOBS_PATH"] + suffix):
+            os.remove(os.environ["JOBS_PATH"] + suffix)
+if workers > 1 and not os.environ["JOBS_PATH"]:
+    raise SystemExit("JOBS_PATH must name a shared SQLite file when WEB_WORKERS > 1")
+threads = int(os.getenv("WEB_THREADS", 8))
+worker_class = "gthread"
+
+# Import the app once in the master so workers fork with it already loaded.
+# Anything holding sockets or threads (DB pool, Gemini loop, bcrypt pool) is
+# created lazily per worker.
+preload_app = True
+
+keepalive = int(os.getenv("WEB_KEEPALIVE", 5))
+# A worker silent for this long is killed; must exceed GEMINI_TIMEOUT
+timeout = int(os.getenv("WEB_TIMEOUT", 120))
+# On SIGTERM workers stop accepting and get this long to finish in-flight
+# requests such as /generate before being killed
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", 90))
+
+# Recycle workers now and then to cap slow leaks; jitter avoids restarting all at once
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", 5000))
+max_requests_jitter = int(os.getenv("WEB_MAX_REQUESTS_JITTER", 500))
+
+accesslog = os.getenv("WEB_ACCESS_LOG", "-")
+errorlog = "-"
+loglevel = os.getenv("WEB_LOG_LEVEL", "info")
+
+
+def post_fork(server, worker):
+    import database
+    # Never share connections the master may have opened with a worker
+    database.reset_pool()
+
+
+def worker_exit(server, worker):
+    import database
+    import passwords
+    database.close_pool()
+    passwords.shutdown()
+
+
+def child_exit(server, worker):
+    import metrics
+    metrics.mark_process_dead(worker.pid)
@@ -0,0 +1,62 @@
+import re
+
+# Words that describe an amount or preparation rather than the ingredient
+UNITS = {
+    "cup", "cups", "c", "tablespoon", "tablespoons", "tbsp", "tbs", "tbsps", "teaspoon", "teaspoons", "tsp", "tsps",
+    "g", "gram", "grams", "kg", "kilogram", "kilograms", "mg", "ml", "milliliter", "milliliters", "millilitre",
+    "millilitres", "l", "liter", "liters", "litre", "litres", "lb", "lbs", "pound", "pounds", "oz", "ounce", "ounces",
+    "clove", "cloves", "can", "cans", "jar", "jars", "package", "packages", "pkg", "bunch", "bunches", "pinch",
+    "pinches", "dash", "dashes", "slice", "slices", "piece", "pieces", "stick", "sticks", "sprig", "sprigs", "head",
+    "heads", "handful", "handfuls", "quart", "quarts", "pint", "pints", "inch", "inches", "cm",
+}
+DESCRIPTORS = {
+    "a", "an", "of", "the", "and", "or", "to", "for", "about", "taste", "optional", "fresh", "freshly", "large",
+    "small", "medium", "chopped", "finely", "roughly", "coarsely", "thinly", "minced", "diced", "sliced", "grated",
+    "shredded", "crushed", "peeled", "cubed", "cooked", "uncooked", "raw", "boneless", "skinless", "softened",
+    "melted", "beaten", "divided", "packed", "heaping", "level", "whole", "halved", "quartered", "drained",
+    "rinsed", "trimmed", "room", "temperature", "frozen", "thawed", "plus", "more", "extra",
+}
+# Words that end in "s" but are not plurals
+SINGULAR_S = {"asparagus", "hummus", "couscous", "swiss", "molasses", "grits", "citrus", "octopus", "bass", "brussels"}
+# Assumed to be in every kitchen, so they never count against a recipe's coverage
+# (normalized forms)
+STAPLES = {"salt", "pepper", "black pepper", "salt pepper", "water", "oil", "olive oil", "vegetable oil", "sugar"}
+
+_PARENTHESES = re.compile(r"\([^)]*\)")
+_TOKENS = re.compile(r"[a-z]+")
+
+
+def singularize(word):
+    if word in SINGULAR_S or len(word) <= 3 or not word.endswith("s") or word.endswith("ss"):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith("oes") or word.endswith(("ches", "shes", "xes")):
+        return word[:-2]
+    if word.endswith("ves") and word not in ("olives", "chives", "cloves"):
+        return word[:-3] + "f"
+    if word.endswith("us") or word.endswith("is"):
+        return word
+    return word[:-1]
+
+
+def normalize(text):
+    """Reduce an ingredient line to the ingredient itself.
+
+    "1 cup all-purpose Flour" -> "all purpose flour", "2 Tomatoes, diced" ->
+    "tomato", "Garlic (3 cloves, minced)" -> "garlic". Returns "" when
+    nothing is left.
+    """
+    if not isinstance(text, str):
+        return ""
+    text = _PARENTHESES.sub(" ", text.lower())
+    # Anything after the first comma is preparation ("onion, chopped")
+    text = text.split(",", 1)[0]
+    words = [word for word in _TOKENS.findall(text) if word not in UNITS and word not in DESCRIPTORS]
+    return " ".join(singularize(word) for word in words)[:100]
+
+
+def normalize_all(items):
+    normalized = {normalize(item) for item in items or []}
+    normalized.discard("")
+    return sorted(normalized)
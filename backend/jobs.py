@@ -0,0 +1,207 @@
+"""Background recipe generation.
+
+submit() records a job and schedules it on gemini's event loop, where at
+most WORKERS jobs run at once; the request thread returns straight away.
+Jobs live in memory, or in a SQLite file when JOBS_PATH is set so that
+every gunicorn worker on the host can answer status polls; gunicorn.conf.py
+sets it whenever there is more than one worker.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import gemini
+import logs
+import metrics
+from cachetools import TTLCache
+
+# Generations running at once per process, independent of HTTP threads
+WORKERS = int(os.getenv("JOB_WORKERS", 4))
+# Queued + running jobs per process before submit() refuses more
+MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", 100))
+# Seconds a job may run, and how long finished jobs can still be fetched
+TIMEOUT = float(os.getenv("JOB_TIMEOUT", gemini.TIMEOUT))
+TTL = int(os.getenv("JOB_TTL", 60 * 60))
+# Longest long-poll a client may ask for
+MAX_WAIT = float(os.getenv("JOB_MAX_WAIT", 30))
+PERSIST_PATH = os.getenv("JOBS_PATH")
+# How often a long-poll re-reads a job it was not notified about (SQLite mode)
+POLL_INTERVAL = 0.25
+# Seconds between sweeps of expired jobs from the SQLite store
+PURGE_INTERVAL = 60
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+FINISHED = (DONE, FAILED)
+
+log = logs.get_logger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised by submit() when MAX_PENDING jobs are already waiting or running."""
+
+
+# Queued and running jobs are never evicted; at most MAX_PENDING of them
+# exist. Finished ones move to the TTL cache until they expire.
+_active = {}
+_jobs = TTLCache(maxsize=max(MAX_PENDING * 10, 1000), ttl=TTL)
+_cond = threading.Condition()
+_pending = 0
+
+_db = None
+_db_lock = threading.Lock()
+_purged_at = 0.0
+
+# Loop-bound, so created on the loop itself (once per process)
+_slots = None
+_slots_pid = None
+
+
+def _get_db():
+    global _db
+    if _db is None:
+        _db = sqlite3.connect(PERSIST_PATH, check_same_thread=False, timeout=5)
+        _db.execute("PRAGMA journal_mode=WAL")
+        _db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, user_id INTEGER, status TEXT NOT NULL, "
+            "result TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        _db.commit()
+    return _db
+
+def _save(job):
+    global _purged_at
+    if PERSIST_PATH:
+        with _db_lock:
+            db = _get_db()
+            db.execute(
+                "INSERT OR REPLACE INTO jobs (id, user_id, status, result, error, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job["id"], job["user_id"], job["status"], json.dumps(job["result"]), job["error"],
+                 job["created_at"], job["updated_at"]),
+            )
+            if job["updated_at"] - _purged_at >= PURGE_INTERVAL:
+                db.execute(
+                    "DELETE FROM jobs WHERE updated_at < ? AND status IN (?, ?)",
+                    (time.time() - TTL,) + FINISHED,
+                )
+                _purged_at = job["updated_at"]
+            db.commit()
+    else:
+        with _cond:
+            if job["status"] in FINISHED:
+                _active.pop(job["id"], None)
+                _jobs[job["id"]] = job
+            else:
+                _active[job["id"]] = job
+    with _cond:
+        _cond.notify_all()
+
+def _load(job_id):
+    if not PERSIST_PATH:
+        with _cond:
+            job = _active.get(job_id) or _jobs.get(job_id)
+        return dict(job) if job else None
+    with _db_lock:
+        row = _get_db().execute(
+            "SELECT id, user_id, status, result, error, created_at, updated_at FROM jobs "
+            "WHERE id = ? AND updated_at >= ?",
+            (job_id, time.time() - TTL),
+        ).fetchone()
+    if row is None:
+        return None
+    keys = ("id", "user_id", "status", "result", "error", "created_at", "updated_at")
+    job = dict(zip(keys, row))
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+def _update(job, **fields):
+    job = dict(job, updated_at=time.time(), **fields)
+    _save(job)
+    return job
+
+async def _update_async(job, **fields):
+    # Called from gemini's loop; SQLite writes go to a worker thread so they
+    # never hold up the generations running there
+    if PERSIST_PATH:
+        return await asyncio.to_thread(_update, job, **fields)
+    return _update(job, **fields)
+
+
+def submit(user_id, ingredients, dietary_preferences, use_cache=True):
+    """Queue a generation and return its job id without waiting for it."""
+    global _pending
+    with _cond:
+        if _pending >= MAX_PENDING:
+            raise QueueFull("Too many recipe generations queued")
+        _pending += 1
+    now = time.time()
+    job = {"id": uuid.uuid4().hex, "user_id": user_id, "status": QUEUED, "result": None, "error": None,
+           "created_at": now, "updated_at": now}
+    try:
+        _save(job)
+        asyncio.run_coroutine_threadsafe(_run(job, ingredients, dietary_preferences, use_cache), gemini.get_loop())
+    except Exception:
+        _finish_pending()
+        raise
+    metrics.JOBS.labels(QUEUED).inc()
+    return job["id"]
+
+def _finish_pending():
+    global _pending
+    with _cond:
+        _pending -= 1
+
+def _get_slots():
+    global _slots, _slots_pid
+    if _slots_pid != os.getpid():
+        _slots = asyncio.Semaphore(WORKERS)
+        _slots_pid = os.getpid()
+    return _slots
+
+async def _run(job, ingredients, dietary_preferences, use_cache):
+    # Runs on gemini's loop; writes to the store are quick, local and rare
+    try:
+        async with _get_slots():
+            job = await _update_async(job, status=RUNNING)
+            recipes = await asyncio.wait_for(gemini.generate(ingredients, dietary_preferences, use_cache), TIMEOUT)
+        if isinstance(recipes, dict) and "error" in recipes:
+            job = await _update_async(job, status=FAILED, error=recipes["error"])
+        else:
+            job = await _update_async(job, status=DONE, result=recipes)
+    except asyncio.TimeoutError:
+        job = await _update_async(job, status=FAILED, error="Recipe generation timed out")
+    except Exception as e:
+        log.exception("Generation job failed", extra={"job_id": job["id"]})
+        job = await _update_async(job, status=FAILED, error=str(e) or type(e).__name__)
+    finally:
+        _finish_pending()
+    metrics.JOBS.labels(job["status"]).inc()
+
+def get(job_id):
+    return _load(job_id)
+
+def wait(job_id, timeout):
+    """Return the job once it has finished, or as it stands after `timeout` seconds."""
+    deadline = time.monotonic() + min(max(timeout, 0), MAX_WAIT)
+    job = _load(job_id)
+    while job is not None and job["status"] not in FINISHED:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        with _cond:
+            _cond.wait(min(remaining, POLL_INTERVAL))
+        job = _load(job_id)
+    return job
+
+def pending_count():
+    with _cond:
+        return _pending
+
+def clear():
+    with _cond:
+        _active.clear()
+        _jobs.clear()
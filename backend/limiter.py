@@ -0,0 +1,144 @@
+from cachetools import TTLCache
+import asyncio
+import os
+import random
+import threading
+import time
+
+# Server processes sharing the limits below; gunicorn.conf.py exports its
+# worker count, and anything else (python app.py, tests) is one process
+PROCESSES = max(1, int(os.getenv("WEB_WORKERS", 1)))
+
+def share(limit):
+    """This process's part of a server-wide limit, never less than one.
+
+    State is per process, so each enforces limit / PROCESSES and requests
+    spread over the workers add up to the configured limit.
+    """
+    return max(1, limit / PROCESSES)
+
+# Recipe generations a signed-in user may start across the server: RATE per
+# second, bursts of BURST
+USER_RATE = float(os.getenv("GENERATE_USER_RATE", 10 / 60))
+USER_BURST = int(os.getenv("GENERATE_USER_BURST", 5))
+# Guests share whatever address they come from, so they get a tighter bucket
+GUEST_RATE = float(os.getenv("GENERATE_GUEST_RATE", 3 / 60))
+GUEST_BURST = int(os.getenv("GENERATE_GUEST_BURST", 3))
+MAX_BUCKETS = int(os.getenv("GENERATE_MAX_BUCKETS", 10000))
+
+
+class TokenBucket:
+    """Classic token bucket; take() is called with the owning lock held."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self, now=None):
+        """Take one token. Returns 0 on success, else seconds until one is free."""
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+# A bucket that has been idle long enough to refill is the same as a new one,
+# so entries can expire instead of growing without bound
+_buckets = TTLCache(maxsize=MAX_BUCKETS, ttl=max(share(USER_BURST) / USER_RATE, share(GUEST_BURST) / GUEST_RATE) * PROCESSES)
+_lock = threading.Lock()
+
+def check(key, guest=False):
+    """Spend one generation for `key`. Returns 0 if allowed, else seconds to wait."""
+    with _lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            rate, burst = (GUEST_RATE, GUEST_BURST) if guest else (USER_RATE, USER_BURST)
+            bucket = TokenBucket(rate / PROCESSES, share(burst))
+        wait = bucket.take()
+        # Re-inserting refreshes the entry's TTL
+        _buckets[key] = bucket
+    return wait
+
+def reset():
+    with _lock:
+        _buckets.clear()
+
+
+class CircuitOpen(Exception):
+    """Raised without calling upstream while the breaker is open."""
+
+    def __init__(self, retry_after):
+        super().__init__("Upstream is unavailable")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures and stays open for
+    `cooldown` seconds. Then one trial call is let through: success closes
+    the breaker, failure opens it again.
+
+    Only used from the Gemini event loop, so it needs no locking.
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        state = self.state
+        if state == "open" or (state == "half-open" and self.probing):
+            raise CircuitOpen(self.retry_after())
+        if state == "half-open":
+            self.probing = True
+
+    def retry_after(self):
+        if self.opened_at is None:
+            return 0
+        return max(1.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+    def abandon(self):
+        """The call ended without telling us anything about upstream health."""
+        self.probing = False
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def failure(self):
+        self.failures += 1
+        if self.probing or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+        self.probing = False
+
+
+def backoff(attempt, base, cap):
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+async def retry(call, retryable, attempts, base, cap):
+    """Await call() up to `attempts` times, sleeping with backoff between
+    tries while retryable(error) says the failure is transient."""
+    for attempt in range(attempts):
+        try:
+            return await call()
+        except Exception as e:
+            if attempt == attempts - 1 or not retryable(e):
+                raise
+            await asyncio.sleep(backoff(attempt, base, cap))
@@ -0,0 +1,59 @@
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Share of DEBUG/INFO records that are written; warnings and errors always are
+SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 1.0))
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and any extra= fields."""
+
+    def format(self, record):
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SampleFilter(logging.Filter):
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+_configured = False
+
+def configure():
+    """Send all logging to stdout as sampled JSON lines. Safe to call twice."""
+    global _configured
+    if _configured:
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    handler.addFilter(SampleFilter(SAMPLE_RATE))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(LEVEL)
+    _configured = True
+
+def get_logger(name):
+    return logging.getLogger(name)
@@ -0,0 +1,94 @@
+"""Prometheus metrics for the backend, served on /metrics.
+
+Under gunicorn each worker keeps its own values; set PROMETHEUS_MULTIPROC_DIR
+(gunicorn.conf.py does) so /metrics reports the sum over all workers.
+"""
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+import functools
+import os
+import threading
+import time
+
+MULTIPROCESS_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+# Seconds between refreshes of the pool/cache gauges in each worker
+STATS_INTERVAL = float(os.getenv("METRICS_STATS_INTERVAL", 5))
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time to produce a response (streams: until headers)",
+    ["method", "route", "status"],
+)
+DB_LATENCY = Histogram(
+    "db_call_duration_seconds", "Time spent in each database.* function", ["function"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+GEMINI_LATENCY = Histogram(
+    "gemini_call_duration_seconds", "Gemini calls from request to last byte", ["call", "outcome"],
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 15, 30, 60),
+)
+GEMINI_TOKENS = Counter("gemini_tokens_total", "Tokens billed by Gemini", ["kind"])
+GEMINI_INFLIGHT = Gauge("gemini_inflight_calls", "Gemini calls holding a concurrency slot", multiprocess_mode="livesum")
+GEMINI_HEDGES = Counter("gemini_hedged_calls_total", "Duplicate calls sent to beat a slow one, and which finished first", ["result"])
+GEMINI_FALLBACKS = Counter("gemini_fallback_calls_total", "Calls retried on the fallback model after the main model failed")
+JOBS = Counter("generation_jobs_total", "Background generation jobs by state reached", ["status"])
+CACHE_LOOKUPS = Counter("recipe_cache_lookups_total", "Recipe cache lookups by result", ["result"])
+WARMER = Counter("recipe_warmer_generations_total", "Generations spent keeping popular keys warm", ["outcome"])
+CACHE_SIZE = Gauge("recipe_cache_entries", "Entries in the in-memory recipe cache", multiprocess_mode="livesum")
+DB_POOL = Gauge("db_pool_connections", "Database pool connections by state", ["state"], multiprocess_mode="livesum")
+
+
+def timed(histogram, *labels):
+    """Decorator recording how long each call takes in `histogram`."""
+    def decorator(fn):
+        child = histogram.labels(*labels)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+def timed_query(fn):
+    return timed(DB_LATENCY, fn.__name__)(fn)
+
+
+# Gauges are filled from stats() callbacks rather than on every change so
+# the hot paths stay untouched; each worker refreshes at most every
+# STATS_INTERVAL seconds and on every scrape it serves.
+_stats_sources = []
+_stats_lock = threading.Lock()
+_stats_refreshed = 0.0
+
+def add_stats_source(fn):
+    _stats_sources.append(fn)
+
+def refresh_stats(force=False):
+    global _stats_refreshed
+    now = time.monotonic()
+    if not force and now - _stats_refreshed < STATS_INTERVAL:
+        return
+    if not _stats_lock.acquire(blocking=False):
+        return
+    try:
+        _stats_refreshed = now
+        for source in _stats_sources:
+            source()
+    finally:
+        _stats_lock.release()
+
+def render():
+    """Returns (body, content type) for the /metrics endpoint."""
+    refresh_stats(force=True)
+    if MULTIPROCESS_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+def mark_process_dead(pid):
+    if MULTIPROCESS_DIR:
+        multiprocess.mark_process_dead(pid)
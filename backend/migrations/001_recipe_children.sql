@@ -0,0 +1,40 @@
+-- Moves the @-joined ingredients/instructions blobs into child tables and
+-- adds the indexes used by recipe lookups, deletes and ratings.
+--
+-- 1. Run this file against an existing database.
+-- 2. Deploy the matching backend (it only writes to the child tables).
+-- 3. Run `python migrations/backfill_recipe_children.py` to copy old rows,
+--    then again with --drop-columns once it reports nothing left to copy.
+USE mealmatcher;
+
+CREATE TABLE IF NOT EXISTS recipe_ingredients (
+    recipe_id BIGINT UNSIGNED NOT NULL,
+    position SMALLINT UNSIGNED NOT NULL,
+    ingredient TEXT NOT NULL,
+    PRIMARY KEY (recipe_id, position),
+    FOREIGN KEY (recipe_id) REFERENCES recipes(recipe_id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS recipe_steps (
+    recipe_id BIGINT UNSIGNED NOT NULL,
+    position SMALLINT UNSIGNED NOT NULL,
+    instruction TEXT NOT NULL,
+    PRIMARY KEY (recipe_id, position),
+    FOREIGN KEY (recipe_id) REFERENCES recipes(recipe_id) ON DELETE CASCADE
+);
+
+-- The blobs stay readable for the backfill but new rows no longer fill them
+ALTER TABLE recipes
+    MODIFY ingredients TEXT NULL,
+    MODIFY instructions TEXT NULL,
+    MODIFY difficulty VARCHAR(20) NOT NULL,
+    ADD INDEX idx_recipes_user_name (user_id, name);
+
+-- Keep only the newest rating per user and recipe before enforcing uniqueness
+DELETE older FROM ratings older
+JOIN ratings newer
+  ON older.user_id = newer.user_id
+ AND older.recipe_id = newer.recipe_id
+ AND older.rating_id < newer.rating_id;
+
+ALTER TABLE ratings ADD UNIQUE INDEX uq_ratings_user_recipe (user_id, recipe_id);
@@ -0,0 +1,4 @@
+-- Index for keyset paging of /get_recipes: WHERE user_id = ? ORDER BY created_at, recipe_id
+USE mealmatcher;
+
+ALTER TABLE recipes ADD INDEX idx_recipes_user_created (user_id, created_at, recipe_id);
@@ -0,0 +1,22 @@
+-- Pre-aggregated rating totals per recipe, maintained by database.submit_rating.
+-- Requires 001 (one rating per user and recipe). Stop writes to ratings while
+-- this runs so the backfilled totals match the table.
+USE mealmatcher;
+
+CREATE TABLE IF NOT EXISTS recipe_rating_stats (
+    recipe_id BIGINT UNSIGNED PRIMARY KEY,
+    rating_count INT UNSIGNED NOT NULL DEFAULT 0,
+    rating_sum INT UNSIGNED NOT NULL DEFAULT 0,
+    count_1 INT UNSIGNED NOT NULL DEFAULT 0,
+    count_2 INT UNSIGNED NOT NULL DEFAULT 0,
+    count_3 INT UNSIGNED NOT NULL DEFAULT 0,
+    count_4 INT UNSIGNED NOT NULL DEFAULT 0,
+    count_5 INT UNSIGNED NOT NULL DEFAULT 0,
+    FOREIGN KEY (recipe_id) REFERENCES recipes(recipe_id) ON DELETE CASCADE
+);
+
+REPLACE INTO recipe_rating_stats (recipe_id, rating_count, rating_sum, count_1, count_2, count_3, count_4, count_5)
+SELECT recipe_id, COUNT(*), SUM(rating),
+       SUM(rating = 1), SUM(rating = 2), SUM(rating = 3), SUM(rating = 4), SUM(rating = 5)
+FROM ratings
+GROUP BY recipe_id;
@@ -0,0 +1,7 @@
+-- Normalized ingredient names for local recipe matching (database.match_recipes).
+-- Existing rows get '' here; fill them with migrations/backfill_normalized_ingredients.py.
+USE mealmatcher;
+
+ALTER TABLE recipe_ingredients
+    ADD COLUMN normalized VARCHAR(100) NOT NULL DEFAULT '',
+    ADD INDEX idx_recipe_ingredients_normalized (normalized, recipe_id);
@@ -0,0 +1,9 @@
+-- Stored recipe vectors for database.similar_recipes. New recipes get theirs
+-- when saved; fill in older ones with migrations/backfill_recipe_embeddings.py.
+USE mealmatcher;
+
+CREATE TABLE IF NOT EXISTS recipe_embeddings (
+    recipe_id BIGINT UNSIGNED PRIMARY KEY,
+    vector VARBINARY(4096) NOT NULL,
+    FOREIGN KEY (recipe_id) REFERENCES recipes(recipe_id) ON DELETE CASCADE
+);
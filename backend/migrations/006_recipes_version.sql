@@ -0,0 +1,5 @@
+-- Per-user counter behind the /get_recipes ETag, bumped in the same
+-- transaction as every recipe or rating write (see database.py).
+USE mealmatcher;
+
+ALTER TABLE users ADD COLUMN recipes_version INT UNSIGNED NOT NULL DEFAULT 0;
@@ -0,0 +1,33 @@
+-- Tables behind stateless guest sessions (see /guest). Guest users created
+-- before this change keep working; they are ordinary users rows matching
+-- guest<n>@devweeny.ca and can be removed once their tokens have expired.
+USE mealmatcher;
+
+-- Guests from /guest have no users row; one appears here only once they
+-- save a recipe or rating, and database.purge_guests() drops it after expires_at
+CREATE TABLE IF NOT EXISTS guests (
+    guest_id CHAR(32) PRIMARY KEY,
+    expires_at DATETIME NOT NULL,
+    INDEX idx_guests_expires (expires_at)
+);
+
+-- A guest's saved recipes as validated /add_recipe bodies, copied into
+-- recipes when the guest registers
+CREATE TABLE IF NOT EXISTS guest_recipes (
+    guest_recipe_id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    guest_id CHAR(32) NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    recipe TEXT NOT NULL,
+    FOREIGN KEY (guest_id) REFERENCES guests(guest_id) ON DELETE CASCADE,
+    INDEX idx_guest_recipes_guest_name (guest_id, name)
+);
+
+-- Not counted in recipe_rating_stats until the guest registers
+CREATE TABLE IF NOT EXISTS guest_ratings (
+    guest_id CHAR(32) NOT NULL,
+    recipe_id BIGINT UNSIGNED NOT NULL,
+    rating INT NOT NULL,
+    PRIMARY KEY (guest_id, recipe_id),
+    FOREIGN KEY (guest_id) REFERENCES guests(guest_id) ON DELETE CASCADE,
+    FOREIGN KEY (recipe_id) REFERENCES recipes(recipe_id) ON DELETE CASCADE
+);
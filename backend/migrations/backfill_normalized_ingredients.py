@@ -0,0 +1,54 @@
+"""Fill recipe_ingredients.normalized for rows written before 004.
+
+Run from the backend directory after migrations/004_ingredient_index.sql:
+
+    python migrations/backfill_normalized_ingredients.py [--batch-size N]
+
+Safe to re-run: only rows with an empty normalized value are touched, and
+each batch is one transaction.
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import database
+import ingredients
+
+
+def backfill(batch_size):
+    updated = 0
+    last_key = (0, -1)
+    while True:
+        with database.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT recipe_id, position, ingredient FROM recipe_ingredients "
+                "WHERE normalized = '' AND (recipe_id, position) > (%s, %s) "
+                "ORDER BY recipe_id, position LIMIT %s",
+                (last_key[0], last_key[1], batch_size),
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                cursor.close()
+                return updated
+
+            cursor.executemany(
+                "UPDATE recipe_ingredients SET normalized = %s WHERE recipe_id = %s AND position = %s",
+                [(ingredients.normalize(ingredient), recipe_id, position) for recipe_id, position, ingredient in rows],
+            )
+            conn.commit()
+            cursor.close()
+
+        updated += len(rows)
+        last_key = rows[-1][:2]
+        print(f"Normalized {updated} ingredients (up to recipe_id {last_key[0]})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"Backfill finished: {backfill(args.batch_size)} ingredients normalized")
@@ -0,0 +1,89 @@
+"""Copy @-joined recipe blobs into recipe_ingredients / recipe_steps.
+
+Run from the backend directory after migrations/001_recipe_children.sql:
+
+    python migrations/backfill_recipe_children.py [--batch-size N] [--drop-columns]
+
+Safe to re-run: each batch is one transaction, already copied rows are
+skipped, and the blobs are cleared once their children are written.
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import database
+
+
+def backfill(batch_size):
+    copied = 0
+    last_id = 0
+    while True:
+        with database.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT recipe_id, ingredients, instructions FROM recipes "
+                "WHERE recipe_id > %s AND (ingredients IS NOT NULL OR instructions IS NOT NULL) "
+                "ORDER BY recipe_id LIMIT %s",
+                (last_id, batch_size),
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                cursor.close()
+                return copied
+
+            ingredient_rows = []
+            step_rows = []
+            for recipe_id, ingredients, instructions in rows:
+                for position, ingredient in enumerate((ingredients or "").split("@")):
+                    if ingredient:
+                        ingredient_rows.append((recipe_id, position, ingredient))
+                for position, instruction in enumerate((instructions or "").split("@")):
+                    if instruction:
+                        step_rows.append((recipe_id, position, instruction))
+
+            if ingredient_rows:
+                cursor.executemany(
+                    "INSERT IGNORE INTO recipe_ingredients (recipe_id, position, ingredient) VALUES (%s, %s, %s)",
+                    ingredient_rows,
+                )
+            if step_rows:
+                cursor.executemany(
+                    "INSERT IGNORE INTO recipe_steps (recipe_id, position, instruction) VALUES (%s, %s, %s)",
+                    step_rows,
+                )
+            cursor.executemany(
+                "UPDATE recipes SET ingredients = NULL, instructions = NULL WHERE recipe_id = %s",
+                [(row[0],) for row in rows],
+            )
+            conn.commit()
+            cursor.close()
+
+        copied += len(rows)
+        last_id = rows[-1][0]
+        print(f"Backfilled {copied} recipes (up to recipe_id {last_id})")
+
+
+def drop_columns():
+    with database.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM recipes WHERE ingredients IS NOT NULL OR instructions IS NOT NULL")
+        remaining = cursor.fetchone()[0]
+        if remaining:
+            cursor.close()
+            raise SystemExit(f"{remaining} recipes still have blob data; run the backfill first")
+        cursor.execute("ALTER TABLE recipes DROP COLUMN ingredients, DROP COLUMN instructions")
+        cursor.close()
+    print("Dropped recipes.ingredients and recipes.instructions")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--drop-columns", action="store_true", help="drop the old blob columns afterwards")
+    args = parser.parse_args()
+
+    print(f"Backfill finished: {backfill(args.batch_size)} recipes copied")
+    if args.drop_columns:
+        drop_columns()
@@ -0,0 +1,65 @@
+"""Compute recipe_embeddings rows for recipes that do not have one.
+
+Run from the backend directory after migrations/005_recipe_embeddings.sql:
+
+    python migrations/backfill_recipe_embeddings.py [--batch-size N] [--rebuild]
+
+--rebuild recomputes every vector, e.g. after changing EMBEDDING_DIM or
+the weights in embeddings.py. Safe to re-run; each batch is one transaction.
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import database
+import embeddings
+
+
+def backfill(batch_size, rebuild):
+    written = 0
+    last_id = 0
+    while True:
+        with database.connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(
+                "SELECT r.recipe_id, r.name FROM recipes r "
+                "LEFT JOIN recipe_embeddings e ON e.recipe_id = r.recipe_id "
+                "WHERE r.recipe_id > %s AND (%s OR e.recipe_id IS NULL) "
+                "ORDER BY r.recipe_id LIMIT %s",
+                (last_id, rebuild, batch_size),
+            )
+            recipes = cursor.fetchall()
+            if not recipes:
+                cursor.close()
+                return written
+
+            ingredients, _ = database._fetch_children(
+                cursor, [recipe["recipe_id"] for recipe in recipes], with_instructions=False
+            )
+            cursor.executemany(
+                "REPLACE INTO recipe_embeddings (recipe_id, vector) VALUES (%s, %s)",
+                [
+                    (
+                        recipe["recipe_id"],
+                        embeddings.to_bytes(embeddings.embed(recipe["name"], ingredients.get(recipe["recipe_id"], []))),
+                    )
+                    for recipe in recipes
+                ],
+            )
+            conn.commit()
+            cursor.close()
+
+        written += len(recipes)
+        last_id = recipes[-1]["recipe_id"]
+        print(f"Embedded {written} recipes (up to recipe_id {last_id})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--rebuild", action="store_true", help="recompute vectors that already exist")
+    args = parser.parse_args()
+
+    print(f"Backfill finished: {backfill(args.batch_size, args.rebuild)} recipes embedded")
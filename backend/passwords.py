@@ -0,0 +1,71 @@
+from concurrent.futures import ProcessPoolExecutor
+import bcrypt
+import multiprocessing
+import os
+import threading
+
+# bcrypt cost factor for new hashes; older hashes are upgraded on login
+ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+# Processes doing password work; 0 hashes inline on the request thread
+WORKERS = int(os.getenv("BCRYPT_WORKERS", os.cpu_count() or 1))
+# Hash/verify calls allowed in flight before new ones are turned away
+MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", max(WORKERS, 1) * 4))
+TIMEOUT = float(os.getenv("BCRYPT_TIMEOUT", 10))
+
+
+class PasswordPoolBusy(Exception):
+    """Raised instead of queueing when MAX_PENDING password jobs are in flight."""
+
+
+_executor = None
+_owner_pid = None
+_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(MAX_PENDING)
+
+def _get_executor():
+    global _executor, _owner_pid
+    if _owner_pid != os.getpid():
+        with _lock:
+            if _owner_pid != os.getpid():
+                # spawn, not fork: forking a multi-threaded server is unsafe
+                _executor = ProcessPoolExecutor(WORKERS, mp_context=multiprocessing.get_context("spawn"))
+                _owner_pid = os.getpid()
+    return _executor
+
+def shutdown():
+    global _executor, _owner_pid
+    with _lock:
+        if _executor is not None and _owner_pid == os.getpid():
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        _owner_pid = None
+
+def _submit(fn, *args):
+    if not _slots.acquire(blocking=False):
+        raise PasswordPoolBusy("Too many password operations in progress")
+    try:
+        if WORKERS == 0:
+            return fn(*args)
+        return _get_executor().submit(fn, *args).result(TIMEOUT)
+    finally:
+        _slots.release()
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+def _check(password, hashed):
+    return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+
+def hash_password(password):
+    return _submit(_hash, password, ROUNDS)
+
+def check_password(password, hashed):
+    return _submit(_check, password, hashed)
+
+def needs_rehash(hashed):
+    # bcrypt hashes look like $2b$12$<salt+hash>; the middle field is the cost
+    try:
+        return int(hashed.split("$")[2]) != ROUNDS
+    except (IndexError, ValueError):
+        return False
@@ -0,0 +1,130 @@
+"""Text generation backends behind gemini.py.
+
+A provider turns (model, prompt, max_output_tokens) into a Completion, or
+opens a stream of them. gemini.py adds everything else (caching, limits,
+retries, hedging, fallback), so a provider is only the upstream call.
+GEMINI_PROVIDER picks one: "gemini" (default) or "stub", which answers
+locally after GEMINI_STUB_LATENCY seconds for tests, demos and benchmarks.
+"""
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from google.genai import types
+import asyncio
+import json
+import os
+import re
+
+# Seconds the stub takes per completion
+STUB_LATENCY = float(os.getenv("GEMINI_STUB_LATENCY", 0))
+
+
+@dataclass
+class Completion:
+    text: str
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+
+
+class Provider(ABC):
+    """Interface every backend implements."""
+
+    name = None
+
+    @abstractmethod
+    async def generate(self, model, prompt, max_output_tokens):
+        """Return one Completion for the prompt."""
+
+    @abstractmethod
+    async def open_stream(self, model, prompt, max_output_tokens):
+        """Start a generation; returns an async iterator of Completion chunks.
+
+        Each chunk carries its own text and the running token totals so far.
+        Errors raised here happen before anything has been streamed, so
+        callers may retry them.
+        """
+
+
+class GeminiProvider(Provider):
+    name = "gemini"
+
+    def __init__(self, get_client):
+        # A function, so the per-process client can be replaced after fork()
+        self._get_client = get_client
+
+    @staticmethod
+    def _config(max_output_tokens):
+        return types.GenerateContentConfig(max_output_tokens=max_output_tokens)
+
+    @staticmethod
+    def _completion(response):
+        usage = response.usage_metadata
+        if usage is None:
+            return Completion(response.text or "")
+        return Completion(response.text or "", int(usage.prompt_token_count or 0), int(usage.candidates_token_count or 0))
+
+    async def generate(self, model, prompt, max_output_tokens):
+        response = await self._get_client().aio.models.generate_content(
+            model=model, contents=prompt, config=self._config(max_output_tokens),
+        )
+        return self._completion(response)
+
+    async def open_stream(self, model, prompt, max_output_tokens):
+        stream = await self._get_client().aio.models.generate_content_stream(
+            model=model, contents=prompt, config=self._config(max_output_tokens),
+        )
+
+        async def chunks():
+            async for chunk in stream:
+                yield self._completion(chunk)
+        return chunks()
+
+
+class StubProvider(Provider):
+    """Three plausible recipes from the prompt's own ingredients, no network."""
+
+    name = "stub"
+    _INGREDIENTS = re.compile(r"following ingredients: (.*?)\. ")
+
+    def _text(self, model, prompt):
+        match = self._INGREDIENTS.search(prompt)
+        ingredients = [item.strip() for item in match.group(1).split(",") if item.strip()] if match else []
+        ingredients = ingredients or ["water"]
+        return json.dumps([
+            {
+                "title": f"{ingredients[number % len(ingredients)].title()} Dish {number + 1}",
+                "instructions": ["Step 1: Prepare the ingredients", "Step 2: Cook until done"],
+                "ingredients": ingredients,
+                "source": f"stub:{model}",
+                "prepTime": "10 minutes",
+                "cookTime": "20 minutes",
+                "difficulty": "Easy",
+            }
+            for number in range(3)
+        ])
+
+    async def generate(self, model, prompt, max_output_tokens):
+        await asyncio.sleep(STUB_LATENCY)
+        text = self._text(model, prompt)
+        return Completion(text, len(prompt) // 4, len(text) // 4)
+
+    async def open_stream(self, model, prompt, max_output_tokens):
+        text = self._text(model, prompt)
+
+        async def chunks():
+            step = max(1, len(text) // 4)
+            for start in range(0, len(text), step):
+                await asyncio.sleep(STUB_LATENCY / 4)
+                yield Completion(text[start:start + step], len(prompt) // 4, (start + step) // 4)
+        return chunks()
+
+
+# name -> factory taking the client getter; backends without a client ignore it
+PROVIDERS = {
+    GeminiProvider.name: GeminiProvider,
+    StubProvider.name: lambda get_client: StubProvider(),
+}
+
+def create(name, get_client):
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown GEMINI_PROVIDER {name!r}; expected one of {', '.join(PROVIDERS)}")
+    return PROVIDERS[name](get_client)
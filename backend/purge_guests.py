@@ -0,0 +1,18 @@
+"""Delete guests whose GUEST_TTL has run out, with everything they saved.
+
+Run from the backend directory on a schedule (cron, a scheduled container):
+
+    python purge_guests.py [--batch-size N]
+
+Each batch is its own transaction, so it is safe to run while serving.
+"""
+import argparse
+import database
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=database.GUEST_PURGE_BATCH)
+    args = parser.parse_args()
+
+    print(f"Purged {database.purge_guests(args.batch_size)} expired guests")
@@ -0,0 +1,141 @@
+from cachetools import TTLCache
+import asyncio
+import hashlib
+import json
+import metrics
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_SIZE = int(os.getenv("RECIPE_CACHE_SIZE", 1024))
+CACHE_TTL = int(os.getenv("RECIPE_CACHE_TTL", 6 * 60 * 60))
+# Optional on-disk tier that survives restarts; disabled unless a path is set
+PERSIST_PATH = os.getenv("RECIPE_CACHE_PATH")
+PERSIST_TTL = int(os.getenv("RECIPE_CACHE_PERSIST_TTL", 7 * 24 * 60 * 60))
+# Seconds between sweeps of expired entries from the on-disk tier
+PURGE_INTERVAL = 60
+
+_memory = TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL)
+_lock = threading.Lock()
+_counters = {"hits": 0, "persistent_hits": 0, "misses": 0}
+
+_db = None
+_db_lock = threading.Lock()
+_purged_at = 0.0
+
+
+def normalize(items):
+    normalized = {" ".join(item.lower().split()) for item in items or []}
+    normalized.discard("")
+    return sorted(normalized)
+
+def make_key(ingredients, dietary_preferences):
+    payload = json.dumps([normalize(ingredients), normalize(dietary_preferences)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _get_db():
+    global _db
+    if _db is None:
+        _db = sqlite3.connect(PERSIST_PATH, check_same_thread=False)
+        _db.execute(
+            "CREATE TABLE IF NOT EXISTS recipe_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        _db.execute("CREATE INDEX IF NOT EXISTS recipe_cache_expires_at ON recipe_cache (expires_at)")
+        _db.commit()
+    return _db
+
+def _persistent_get(key):
+    with _db_lock:
+        row = _get_db().execute(
+            "SELECT value FROM recipe_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+    return json.loads(row[0]) if row else None
+
+def _persistent_put(key, value):
+    global _purged_at
+    now = time.time()
+    with _db_lock:
+        db = _get_db()
+        db.execute(
+            "INSERT OR REPLACE INTO recipe_cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), now + PERSIST_TTL),
+        )
+        # Expired rows are never read again; without this the file only grows
+        if now - _purged_at >= PURGE_INTERVAL:
+            db.execute("DELETE FROM recipe_cache WHERE expires_at <= ?", (now,))
+            _purged_at = now
+        db.commit()
+
+
+def _memory_get(key):
+    with _lock:
+        value = _memory.get(key)
+        if value is not None:
+            _counters["hits"] += 1
+            metrics.CACHE_LOOKUPS.labels("hit").inc()
+    return value
+
+def _persistent_lookup(key):
+    value = _persistent_get(key)
+    if value is not None:
+        with _lock:
+            _memory[key] = value
+            _counters["persistent_hits"] += 1
+        metrics.CACHE_LOOKUPS.labels("persistent_hit").inc()
+    return value
+
+def _miss():
+    with _lock:
+        _counters["misses"] += 1
+    metrics.CACHE_LOOKUPS.labels("miss").inc()
+
+def get(key):
+    value = _memory_get(key)
+    if value is None and PERSIST_PATH:
+        value = _persistent_lookup(key)
+    if value is None:
+        _miss()
+    return value
+
+async def get_async(key):
+    """get() for coroutines on gemini's loop. The SQLite tier is read on a
+    worker thread so a slow disk or a held _db_lock never stalls the loop."""
+    value = _memory_get(key)
+    if value is None and PERSIST_PATH:
+        value = await asyncio.to_thread(_persistent_lookup, key)
+    if value is None:
+        _miss()
+    return value
+
+def contains(key):
+    """Whether `key` is in the in-memory tier, without counting a lookup."""
+    with _lock:
+        return key in _memory
+
+def put(key, value):
+    with _lock:
+        _memory[key] = value
+    if PERSIST_PATH:
+        _persistent_put(key, value)
+
+async def put_async(key, value):
+    """put() for coroutines on gemini's loop; the SQLite write runs on a worker thread."""
+    with _lock:
+        _memory[key] = value
+    if PERSIST_PATH:
+        await asyncio.to_thread(_persistent_put, key, value)
+
+def clear():
+    with _lock:
+        _memory.clear()
+        for name in _counters:
+            _counters[name] = 0
+
+def stats():
+    with _lock:
+        return dict(_counters, size=len(_memory), max_size=_memory.maxsize)
+
+metrics.add_stats_source(lambda: metrics.CACHE_SIZE.set(len(_memory)))
@@ -19,13 +19,43 @@ CREATE TABLE recipes (
     recipe_id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
     user_id BIGINT UNSIGNED NOT NULL, -- Foreign key to associate recipes with users
     name VARCHAR(255) NOT NULL,
-    ingredients TEXT NOT NULL, -- Store ingredients as a JSON or comma-separated string
-    instructions TEXT NOT NULL,
     prep_time TEXT NOT NULL,
     cook_time TEXT NOT NULL,
-    difficulty TEXT NOT NULL,
+    difficulty VARCHAR(20) NOT NULL,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
+    INDEX idx_recipes_user_name (user_id, name), -- also serves the user_id foreign key
+    INDEX idx_recipes_user_created (user_id, created_at, recipe_id) -- keyset paging in /get_recipes
+);
+
+DROP TABLE IF EXISTS recipe_ingredients;
+-- One row per ingredient line, in the order they were generated
+CREATE TABLE recipe_ingredients (
+    recipe_id BIGINT UNSIGNED NOT NULL,
+    position SMALLINT UNSIGNED NOT NULL,
+    ingredient TEXT NOT NULL,
+    normalized VARCHAR(100) NOT NULL DEFAULT '', -- ingredients.normalize(ingredient)
+    PRIMARY KEY (recipe_id, position),
+    FOREIGN KEY (recipe_id) REFERENCES recipes(recipe_id) ON DELETE CASCADE,
+    INDEX idx_recipe_ingredients_normalized (normalized, recipe_id) -- inverted index for local matching
+);
+
+DROP TABLE IF EXISTS recipe_steps;
+-- One row per instruction step, in order
+CREATE TABLE recipe_steps (
+    recipe_id BIGINT UNSIGNED NOT NULL,
+    position SMALLINT UNSIGNED NOT NULL,
+    instruction TEXT NOT NULL,
+    PRIMARY KEY (recipe_id, position),
+    FOREIGN KEY (recipe_id) REFERENCES recipes(recipe_id) ON DELETE CASCADE
+);
+
+DROP TABLE IF EXISTS recipe_embeddings;
+-- embeddings.embed() of each recipe as EMBEDDING_DIM little-endian float32s
+CREATE TABLE recipe_embeddings (
+    recipe_id BIGINT UNSIGNED PRIMARY KEY,
+    vector VARBINARY(4096) NOT NULL,
+    FOREIGN KEY (recipe_id) REFERENCES recipes(recipe_id) ON DELETE CASCADE
 );
 
 DROP TABLE IF EXISTS ratings;
@@ -37,10 +67,60 @@ CREATE TABLE ratings (
     rating INT NOT NULL,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
+    FOREIGN KEY (recipe_id) REFERENCES recipes(recipe_id) ON DELETE CASCADE,
+    UNIQUE INDEX uq_ratings_user_recipe (user_id, recipe_id) -- one rating per user per recipe
+);
+
+DROP TABLE IF EXISTS recipe_rating_stats;
+-- Running totals per recipe, kept in step with ratings by database.submit_rating
+CREATE TABLE recipe_rating_stats (
+    recipe_id BIGINT UNSIGNED PRIMARY KEY,
+    rating_count INT UNSIGNED NOT NULL DEFAULT 0,
+    rating_sum INT UNSIGNED NOT NULL DEFAULT 0,
+    count_1 INT UNSIGNED NOT NULL DEFAULT 0,
+    count_2 INT UNSIGNED NOT NULL DEFAULT 0,
+    count_3 INT UNSIGNED NOT NULL DEFAULT 0,
+    count_4 INT UNSIGNED NOT NULL DEFAULT 0,
+    count_5 INT UNSIGNED NOT NULL DEFAULT 0,
+    FOREIGN KEY (recipe_id) REFERENCES recipes(recipe_id) ON DELETE CASCADE
+);
+
+DROP TABLE IF EXISTS guests;
+-- Guests from /guest have no users row; one appears here only once they
+-- save a recipe or rating, and database.purge_guests() drops it after expires_at
+CREATE TABLE guests (
+    guest_id CHAR(32) PRIMARY KEY,
+    expires_at DATETIME NOT NULL,
+    INDEX idx_guests_expires (expires_at)
+);
+
+DROP TABLE IF EXISTS guest_recipes;
+-- A guest's saved recipes as validated /add_recipe bodies, copied into
+-- recipes when the guest registers
+CREATE TABLE guest_recipes (
+    guest_recipe_id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    guest_id CHAR(32) NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    recipe TEXT NOT NULL,
+    FOREIGN KEY (guest_id) REFERENCES guests(guest_id) ON DELETE CASCADE,
+    INDEX idx_guest_recipes_guest_name (guest_id, name)
+);
+
+DROP TABLE IF EXISTS guest_ratings;
+-- Not counted in recipe_rating_stats until the guest registers
+CREATE TABLE guest_ratings (
+    guest_id CHAR(32) NOT NULL,
+    recipe_id BIGINT UNSIGNED NOT NULL,
+    rating INT NOT NULL,
+    PRIMARY KEY (guest_id, recipe_id),
+    FOREIGN KEY (guest_id) REFERENCES guests(guest_id) ON DELETE CASCADE,
     FOREIGN KEY (recipe_id) REFERENCES recipes(recipe_id) ON DELETE CASCADE
 );
 
 ALTER TABLE users ADD COLUMN dietary_preferences VARCHAR(255);
+-- Bumped with every change to the user's recipes; after dietary_preferences
+-- because login/profile read users rows by position
+ALTER TABLE users ADD COLUMN recipes_version INT UNSIGNED NOT NULL DEFAULT 0;
 
 CREATE USER IF NOT EXISTS 'mealmatcher'@'localhost' IDENTIFIED BY 'password';
 GRANT ALL PRIVILEGES ON mealmatcher.* TO 'mealmatcher'@'localhost';
@@ -0,0 +1,86 @@
+-- SQLite version of schema.sql for DB_ENGINE=sqlite; keep the two in step.
+-- Applied automatically by sqlite_backend when the database is empty.
+
+CREATE TABLE IF NOT EXISTS users (
+  user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  email VARCHAR(255) NOT NULL UNIQUE,
+  name VARCHAR(100) NOT NULL,
+  password VARCHAR(60) NOT NULL,
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  dietary_preferences VARCHAR(255),
+  recipes_version INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS recipes (
+    recipe_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    name VARCHAR(255) NOT NULL,
+    prep_time TEXT NOT NULL,
+    cook_time TEXT NOT NULL,
+    difficulty VARCHAR(20) NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_recipes_user_name ON recipes (user_id, name);
+CREATE INDEX IF NOT EXISTS idx_recipes_user_created ON recipes (user_id, created_at, recipe_id);
+
+CREATE TABLE IF NOT EXISTS recipe_ingredients (
+    recipe_id INTEGER NOT NULL REFERENCES recipes(recipe_id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    ingredient TEXT NOT NULL,
+    normalized VARCHAR(100) NOT NULL DEFAULT '',
+    PRIMARY KEY (recipe_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_recipe_ingredients_normalized ON recipe_ingredients (normalized, recipe_id);
+
+CREATE TABLE IF NOT EXISTS recipe_steps (
+    recipe_id INTEGER NOT NULL REFERENCES recipes(recipe_id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    instruction TEXT NOT NULL,
+    PRIMARY KEY (recipe_id, position)
+);
+
+CREATE TABLE IF NOT EXISTS recipe_embeddings (
+    recipe_id INTEGER PRIMARY KEY REFERENCES recipes(recipe_id) ON DELETE CASCADE,
+    vector BLOB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS ratings (
+    rating_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    recipe_id INTEGER NOT NULL REFERENCES recipes(recipe_id) ON DELETE CASCADE,
+    rating INTEGER NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_ratings_user_recipe ON ratings (user_id, recipe_id);
+
+CREATE TABLE IF NOT EXISTS recipe_rating_stats (
+    recipe_id INTEGER PRIMARY KEY REFERENCES recipes(recipe_id) ON DELETE CASCADE,
+    rating_count INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    count_1 INTEGER NOT NULL DEFAULT 0,
+    count_2 INTEGER NOT NULL DEFAULT 0,
+    count_3 INTEGER NOT NULL DEFAULT 0,
+    count_4 INTEGER NOT NULL DEFAULT 0,
+    count_5 INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS guests (
+    guest_id CHAR(32) PRIMARY KEY,
+    expires_at DATETIME NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_guests_expires ON guests (expires_at);
+
+CREATE TABLE IF NOT EXISTS guest_recipes (
+    guest_recipe_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    guest_id CHAR(32) NOT NULL REFERENCES guests(guest_id) ON DELETE CASCADE,
+    name VARCHAR(255) NOT NULL,
+    recipe TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_guest_recipes_guest_name ON guest_recipes (guest_id, name);
+
+CREATE TABLE IF NOT EXISTS guest_ratings (
+    guest_id CHAR(32) NOT NULL REFERENCES guests(guest_id) ON DELETE CASCADE,
+    recipe_id INTEGER NOT NULL REFERENCES recipes(recipe_id) ON DELETE CASCADE,
+    rating INTEGER NOT NULL,
+    PRIMARY KEY (guest_id, recipe_id)
+);
@@ -0,0 +1,173 @@
+"""Embedded SQLite storage for DB_ENGINE=sqlite.
+
+connect() returns a connection that behaves like the part of
+mysql.connector that database.py uses: %s placeholders,
+cursor(dictionary=True), lastrowid/rowcount, ping() and mysql.connector's
+error classes. The few MySQL-only constructs in database.py are rewritten
+per statement, and each rewrite is cached. The schema in schema_sqlite.sql
+is applied to an empty database.
+"""
+from functools import lru_cache
+from mysql.connector import errors
+import datetime
+import os
+import re
+import sqlite3
+import threading
+
+# DB_SQLITE_PATH value that keeps the database in memory (tests, demos)
+MEMORY = ":memory:"
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema_sqlite.sql")
+# Seconds a writer waits on another connection's write lock
+BUSY_TIMEOUT = float(os.getenv("DB_SQLITE_BUSY_TIMEOUT", 5))
+# Compiled statements kept per connection, so repeated queries skip parsing
+STATEMENT_CACHE = 256
+
+# Match MySQL, which hands DATETIME columns back as datetime objects
+sqlite3.register_converter("DATETIME", lambda value: datetime.datetime.fromisoformat(value.decode("utf-8")))
+sqlite3.register_adapter(datetime.datetime, lambda value: value.isoformat(" "))
+
+_REWRITES = [
+    (re.compile(r"\bINSERT IGNORE\b", re.IGNORECASE), "INSERT OR IGNORE"),
+    (re.compile(r"\bON DUPLICATE KEY UPDATE\b", re.IGNORECASE), "ON CONFLICT DO UPDATE SET"),
+    (re.compile(r"\s+FOR UPDATE\b", re.IGNORECASE), ""),
+    (re.compile(r"%s"), "?"),
+]
+_LOCKING_READ = re.compile(r"\bFOR UPDATE\b", re.IGNORECASE)
+
+@lru_cache(maxsize=1024)
+def translate(sql):
+    for pattern, replacement in _REWRITES:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+def _mysql_error(error):
+    if isinstance(error, sqlite3.IntegrityError):
+        return errors.IntegrityError(msg=str(error))
+    if isinstance(error, sqlite3.OperationalError):
+        return errors.OperationalError(msg=str(error))
+    if isinstance(error, sqlite3.ProgrammingError):
+        return errors.ProgrammingError(msg=str(error))
+    return errors.DatabaseError(msg=str(error))
+
+
+class SQLiteCursor:
+    def __init__(self, conn, dictionary=False):
+        self._conn = conn
+        self._cursor = conn.cursor()
+        self._dictionary = dictionary
+
+    def execute(self, sql, params=()):
+        try:
+            # SQLite has no row locks; a locking read takes the database
+            # write lock up front so the read-modify-write cannot interleave
+            if _LOCKING_READ.search(sql) and not self._conn.in_transaction:
+                self._cursor.execute("BEGIN IMMEDIATE")
+            self._cursor.execute(translate(sql), params)
+        except sqlite3.Error as e:
+            raise _mysql_error(e) from e
+
+    def executemany(self, sql, rows):
+        try:
+            self._cursor.executemany(translate(sql), rows)
+        except sqlite3.Error as e:
+            raise _mysql_error(e) from e
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip((column[0] for column in self._cursor.description), row))
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size):
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, dictionary=False):
+        return SQLiteCursor(self._conn, dictionary)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        try:
+            self._conn.rollback()
+        except sqlite3.Error as e:
+            raise _mysql_error(e) from e
+
+    def ping(self, reconnect=False):
+        try:
+            self._conn.execute("SELECT 1")
+        except sqlite3.Error as e:
+            raise _mysql_error(e) from e
+
+    def is_connected(self):
+        try:
+            self.ping()
+            return True
+        except errors.Error:
+            return False
+
+    def close(self):
+        self._conn.close()
+
+
+_schema_lock = threading.Lock()
+# An in-memory database lives as long as one connection to it is open
+_memory_keeper = None
+
+def _open(path):
+    if path == MEMORY:
+        target, uri = "file:mealmatcher?mode=memory&cache=shared", True
+    else:
+        target, uri = path, False
+    conn = sqlite3.connect(
+        target,
+        uri=uri,
+        timeout=BUSY_TIMEOUT,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        check_same_thread=False,  # pooled connections move between request threads
+        cached_statements=STATEMENT_CACHE,
+    )
+    conn.execute("PRAGMA foreign_keys = ON")
+    if path != MEMORY:
+        # Readers no longer block the writer; NORMAL is durable enough with WAL
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+def connect(path):
+    global _memory_keeper
+    conn = _open(path)
+    with _schema_lock:
+        if path == MEMORY and _memory_keeper is None:
+            _memory_keeper = _open(path)
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users'").fetchone() is None:
+            with open(SCHEMA_PATH) as f:
+                conn.executescript(f.read())
+    return SQLiteConnection(conn)
+
+def max_connections(path):
+    # Shared-cache memory databases lock whole tables and do not wait on a
+    # busy timeout, so concurrent writers would fail; use one connection
+    return 1 if path == MEMORY else None
@@ -0,0 +1,249 @@
+"""Latency/throughput benchmark for the Flask backend.
+
+Drives the app in-process through Flask's test client against the
+database configured by the usual DB_* variables (or --sqlite), with Gemini replaced by
+a stub whose latency can be set. Prints one JSON report:
+
+    python tests/benchmark.py --concurrency 16 --requests 200 --gemini-latency 800
+
+Each endpoint gets p50/p95/p99 latency (ms), throughput (req/s), status
+code counts and the average number of SQL statements per request.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+os.environ.setdefault("GEMINI_KEY", "benchmark")
+
+import database
+import gemini
+import limiter
+from app import app
+
+ENDPOINTS = ["login", "generate", "add_recipe", "get_recipes", "rating"]
+
+STUB_RECIPES = [
+    {
+        "title": f"Benchmark Recipe {n}",
+        "instructions": ["Step 1: prepare", "Step 2: cook", "Step 3: serve"],
+        "ingredients": ["1 cup rice", "200 g chicken", "1 tbsp soy sauce"],
+        "source": "benchmark",
+        "prepTime": "10 minutes",
+        "cookTime": "20 minutes",
+        "difficulty": "Easy",
+    }
+    for n in range(3)
+]
+
+
+class QueryCounter:
+    """Counts SQL statements issued by the current thread."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def reset(self):
+        self._local.count = 0
+
+    def add(self, n=1):
+        self._local.count = getattr(self._local, "count", 0) + n
+
+    @property
+    def count(self):
+        return getattr(self._local, "count", 0)
+
+
+class _CountingCursor:
+    def __init__(self, cursor, counter):
+        self._cursor = cursor
+        self._counter = counter
+
+    def execute(self, *args, **kwargs):
+        self._counter.add()
+        return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self._counter.add()
+        return self._cursor.executemany(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _CountingConnection:
+    def __init__(self, conn, counter):
+        self._conn = conn
+        self._counter = counter
+
+    def cursor(self, *args, **kwargs):
+        return _CountingCursor(self._conn.cursor(*args, **kwargs), self._counter)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def install_query_counter():
+    counter = QueryCounter()
+    get_connection = database.get_connection
+    database.get_connection = lambda: _CountingConnection(get_connection(), counter)
+    return counter
+
+
+def install_gemini_stub(latency_ms, jitter_ms):
+    async def stub(ingredients, dietary_preferences):
+        delay = max(0.0, latency_ms + random.uniform(-jitter_ms, jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+        return [dict(recipe) for recipe in STUB_RECIPES]
+
+    gemini._generate = stub
+
+
+def lift_limits(requests, concurrency):
+    """Raise the generation quotas and breaker so /generate measures generation, not 429s/503s."""
+    limiter.USER_BURST = limiter.GUEST_BURST = requests
+    limiter.reset()
+    gemini.MAX_CONCURRENCY = max(gemini.MAX_CONCURRENCY, concurrency)
+    gemini.BREAKER_THRESHOLD = requests + 1
+    gemini._breaker = limiter.CircuitBreaker(gemini.BREAKER_THRESHOLD, gemini.BREAKER_COOLDOWN)
+
+
+def setup_user(client, recipes_needed):
+    email = f"bench-{uuid.uuid4().hex[:12]}@example.com"
+    password = "benchmark-password"
+    response = client.post("/register", data={"email": email, "name": "Benchmark", "password": password})
+    assert response.status_code == 200, response.json
+    login = client.post("/login", data={"email": email, "password": password}).json
+    recipe_ids = [
+        database.add_recipe(login["id"], f"Seed {n}", STUB_RECIPES[0]["ingredients"], STUB_RECIPES[0]["instructions"],
+                            "benchmark", "10 minutes", "20 minutes", "Easy")
+        for n in range(recipes_needed)
+    ]
+    return {"email": email, "password": password, "token": login["token"], "recipe_ids": recipe_ids}
+
+
+def make_request(endpoint, client, user, n, use_cache):
+    auth = {"Authorization": f"Bearer {user['token']}"}
+    if endpoint == "login":
+        return client.post("/login", data={"email": user["email"], "password": user["password"]})
+    if endpoint == "generate":
+        headers = dict(auth) if use_cache else dict(auth, **{"Cache-Control": "no-cache"})
+        return client.post("/generate", data={"ingredients": "chicken, rice, soy sauce"}, headers=headers)
+    if endpoint == "add_recipe":
+        return client.post("/add_recipe", json=STUB_RECIPES[n % len(STUB_RECIPES)], headers=auth)
+    if endpoint == "get_recipes":
+        return client.get("/get_recipes", headers=auth)
+    if endpoint == "rating":
+        recipe_id = user["recipe_ids"][n % len(user["recipe_ids"])]
+        return client.post("/rating", json={"recipe_id": recipe_id, "rating": n % 5 + 1}, headers=auth)
+    raise ValueError(f"Unknown endpoint: {endpoint}")
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_endpoint(endpoint, user, counter, requests, concurrency, use_cache):
+    latencies = []
+    queries = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def one(n):
+        client = app.test_client()
+        counter.reset()
+        started = time.perf_counter()
+        response = make_request(endpoint, client, user, n, use_cache)
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            latencies.append(elapsed)
+            queries.append(counter.count)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "mean_ms": round(statistics.mean(latencies), 2),
+        "throughput_rps": round(requests / wall, 2),
+        "queries_per_request": round(statistics.mean(queries), 2),
+        "status_codes": statuses,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the MealMatcher backend in-process.")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="requests per endpoint")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma-separated subset of " + ", ".join(ENDPOINTS))
+    parser.add_argument("--gemini-latency", type=float, default=500, help="stub Gemini latency in ms")
+    parser.add_argument("--gemini-jitter", type=float, default=100, help="+/- ms added to the stub latency")
+    parser.add_argument("--use-cache", action="store_true", help="let /generate hit the recipe cache")
+    parser.add_argument("--keep-limits", action="store_true", help="keep the configured rate limits and breaker")
+    parser.add_argument("--sqlite", metavar="PATH", help="use the embedded SQLite engine at PATH (or :memory:) instead of DB_*")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    endpoints = [endpoint.strip() for endpoint in args.endpoints.split(",") if endpoint.strip()]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    if args.sqlite:
+        database.ENGINE = "sqlite"
+        database.SQLITE_PATH = args.sqlite
+        database.reset_pool()
+
+    app.config["TESTING"] = True
+    install_gemini_stub(args.gemini_latency, args.gemini_jitter)
+    if not args.keep_limits:
+        lift_limits(args.requests, args.concurrency)
+    counter = install_query_counter()
+    user = setup_user(app.test_client(), args.requests if "rating" in endpoints else 0)
+
+    report = {
+        "config": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "gemini_latency_ms": args.gemini_latency,
+            "gemini_jitter_ms": args.gemini_jitter,
+            "use_cache": args.use_cache,
+            "keep_limits": args.keep_limits,
+            "db_engine": database.ENGINE,
+            "db_host": database.SQLITE_PATH if database.ENGINE == "sqlite" else database.host,
+        },
+        "endpoints": {
+            endpoint: run_endpoint(endpoint, user, counter, args.requests, args.concurrency, args.use_cache)
+            for endpoint in endpoints
+        },
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,10 @@ import os
 import sys
 import pytest
 
-# Set environment variables for DB and Gemini
+# Set environment variables for DB and Gemini. Tests run against an
+# in-memory SQLite database unless DB_ENGINE=mysql is set explicitly.
+os.environ.setdefault("DB_ENGINE", "sqlite")
+os.environ.setdefault("DB_SQLITE_PATH", ":memory:")
 os.environ["DB_HOST"] = "127.0.0.1"
 os.environ["DB_USER"] = "mealmatcher"
 os.environ["DB_PASSWORD"] = "password"
@@ -10,6 +13,11 @@ os.environ["DB_DATABASE"] = "mealmatcher"
 os.environ["DB_PORT"] = "3306"
 os.environ["GEMINI_KEY"] = "dummy-key"
 os.environ["JWT_SECRET_KEY"] = "test-secret"
+# No background cache warming unless a test drives it directly
+os.environ["WARM_BUDGET"] = "0"
+# Hash inline at minimum cost so auth tests stay fast
+os.environ["BCRYPT_WORKERS"] = "0"
+os.environ["BCRYPT_ROUNDS"] = "4"
 
 # Add backend source directory to import app
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -25,8 +33,10 @@ def client():
 
 @pytest.fixture(autouse=True)
 def reset_database():
-    conn = database.get_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM users")
-    conn.commit()
-    cursor.close()
\ No newline at end of file
+    database.clear_identity_cache()
+    with database.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM users")
+        cursor.execute("DELETE FROM guests")
+        conn.commit()
+        cursor.close()
\ No newline at end of file
@@ -1,4 +1,5 @@
 # tests/test_app.py
+import json
 import pytest
 from unittest.mock import patch
 import sys
@@ -9,10 +10,13 @@ from flask_jwt_extended import create_access_token
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from app import app
+import gemini
+import limiter
 
 @pytest.fixture
 def client():
     app.testing = True
+    limiter.reset()
     return app.test_client()
 
 @pytest.fixture
@@ -91,9 +95,10 @@ def test_add_recipe(mock_add_recipe, mock_get_user_id, client, access_token):
     assert response.json == {"message": "Recipe added successfully"}
 
 # UT13 – View Saved Recipes in Favorites (FR14)
+@patch('database.get_recipes_version', return_value=None)
 @patch('database.get_user_id')
 @patch('database.get_recipes')
-def test_get_recipes(mock_get_recipes, mock_get_user_id, client, access_token):
+def test_get_recipes(mock_get_recipes, mock_get_user_id, mock_get_recipes_version, client, access_token):
     mock_get_user_id.return_value = 1
     mock_get_recipes.return_value = [
         {"id": 1, "title": "Recipe 1", "ingredients": ["ingredient1"], "instructions": ["Step 1"], "source": "Source 1"}
@@ -102,3 +107,152 @@ def test_get_recipes(mock_get_recipes, mock_get_user_id, client, access_token):
     response = client.get('/get_recipes', headers=headers)
     assert response.status_code == 200
     assert response.json == {"recipes": mock_get_recipes.return_value}
+
+# UT36 – Stream recipes as newline-delimited JSON
+@patch('database.get_user_id')
+@patch('database.get_dietary_preferences')
+@patch('gemini.generate_stream')
+def test_generate_stream(mock_generate_stream, mock_get_dietary_preferences, mock_get_user_id, client, access_token):
+    async def recipes(*args):
+        yield {"title": "Recipe 1"}
+        yield {"title": "Recipe 2"}
+    mock_get_user_id.return_value = 1
+    mock_get_dietary_preferences.return_value = []
+    mock_generate_stream.side_effect = recipes
+    headers = {"Authorization": f"Bearer {access_token}"}
+    response = client.post('/generate_stream', data={"ingredients": "egg, flour"}, headers=headers)
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert lines == [{"recipe": {"title": "Recipe 1"}}, {"recipe": {"title": "Recipe 2"}}, {"done": True, "count": 2}]
+
+# UT41 – Page through saved recipes with a limit and cursor
+@patch('database.get_recipes_version', return_value=None)
+@patch('database.get_user_id')
+@patch('database.get_recipes_page')
+def test_get_recipes_paged(mock_get_recipes_page, mock_get_user_id, mock_get_recipes_version, client, access_token):
+    mock_get_user_id.return_value = 1
+    mock_get_recipes_page.return_value = ([{"recipe_id": 1, "name": "Recipe 1"}], "abc")
+    headers = {"Authorization": f"Bearer {access_token}"}
+    response = client.get('/get_recipes?limit=1&after=xyz&fields=recipe_id,name', headers=headers)
+    assert response.status_code == 200
+    assert response.json == {"recipes": [{"recipe_id": 1, "name": "Recipe 1"}], "next": "abc"}
+    mock_get_recipes_page.assert_called_once_with(1, 1, after="xyz", fields=["recipe_id", "name"])
+
+# UT42 – Reject invalid paging parameters
+@patch('database.get_recipes_version', return_value=None)
+@patch('database.get_user_id')
+def test_get_recipes_invalid_params(mock_get_user_id, mock_get_recipes_version, client, access_token):
+    mock_get_user_id.return_value = 1
+    headers = {"Authorization": f"Bearer {access_token}"}
+    assert client.get('/get_recipes?limit=abc', headers=headers).status_code == 400
+    assert client.get('/get_recipes?limit=5&after=!!!', headers=headers).status_code == 400
+    assert client.get('/get_recipes?fields=password', headers=headers).status_code == 400
+
+# UT62 – mode=match answers from saved recipes without calling Gemini
+@patch('database.get_user_id')
+@patch('database.get_dietary_preferences')
+@patch('database.match_recipes')
+@patch('gemini.generate')
+def test_generate_match_mode(mock_generate, mock_match_recipes, mock_get_dietary_preferences, mock_get_user_id, client, access_token):
+    mock_get_user_id.return_value = 1
+    mock_get_dietary_preferences.return_value = []
+    mock_match_recipes.return_value = [{"title": "Omelette", "coverage": 0.5}]
+    headers = {"Authorization": f"Bearer {access_token}"}
+    response = client.post('/generate', data={"ingredients": "2 Eggs, Cheese", "mode": "match"}, headers=headers)
+    assert response.status_code == 200
+    assert response.json == {"recipe": [{"title": "Omelette", "coverage": 0.5, "origin": "saved"}]}
+    mock_match_recipes.assert_called_once_with(["cheese", "egg"], 10)
+    mock_generate.assert_not_called()
+
+# UT63 – mode=auto falls back to Gemini when too few saved recipes match well
+@patch('database.get_user_id')
+@patch('database.get_dietary_preferences')
+@patch('database.match_recipes')
+@patch('gemini.generate')
+def test_generate_auto_mode_fallback(mock_generate, mock_match_recipes, mock_get_dietary_preferences, mock_get_user_id, client, access_token):
+    mock_get_user_id.return_value = 1
+    mock_get_dietary_preferences.return_value = []
+    mock_match_recipes.return_value = [{"title": "Omelette", "coverage": 1.0}]
+    mock_generate.return_value = [{"title": "Generated Recipe"}]
+    headers = {"Authorization": f"Bearer {access_token}"}
+    response = client.post('/generate', data={"ingredients": "egg", "mode": "auto"}, headers=headers)
+    assert response.status_code == 200
+    assert response.json == {"recipe": [{"title": "Generated Recipe"}]}
+    assert client.post('/generate', data={"ingredients": "egg", "mode": "bogus"}, headers=headers).status_code == 400
+
+# UT67 – Generations beyond the per-user burst are refused with Retry-After
+@patch('database.get_user_id')
+@patch('database.get_dietary_preferences')
+@patch('gemini.generate')
+def test_generate_rate_limited(mock_generate, mock_get_dietary_preferences, mock_get_user_id, client, access_token):
+    mock_get_user_id.return_value = 1
+    mock_get_dietary_preferences.return_value = []
+    mock_generate.return_value = [{"title": "Generated Recipe"}]
+    headers = {"Authorization": f"Bearer {access_token}"}
+    statuses = [client.post('/generate', data={"ingredients": "egg"}, headers=headers).status_code for _ in range(limiter.USER_BURST + 1)]
+    assert statuses == [200] * limiter.USER_BURST + [429]
+    response = client.post('/generate', data={"ingredients": "egg"}, headers=headers)
+    assert int(response.headers["Retry-After"]) >= 1
+
+# UT68 – A shed generation is reported as 503 instead of a 500
+@patch('database.get_user_id')
+@patch('database.get_dietary_preferences')
+@patch('gemini.generate')
+def test_generate_gemini_unavailable(mock_generate, mock_get_dietary_preferences, mock_get_user_id, client, access_token):
+    mock_get_user_id.return_value = 1
+    mock_get_dietary_preferences.return_value = []
+    mock_generate.side_effect = gemini.GeminiUnavailable("Recipe generation is temporarily unavailable", 12.5)
+    headers = {"Authorization": f"Bearer {access_token}"}
+    response = client.post('/generate', data={"ingredients": "egg"}, headers=headers)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "13"
+
+# UT76 – POST /jobs answers 202 at once; the owner long-polls the job for the recipes
+@patch('database.get_user_id')
+@patch('database.get_dietary_preferences')
+@patch('gemini.generate')
+def test_generation_job(mock_generate, mock_get_dietary_preferences, mock_get_user_id, client, access_token):
+    mock_get_user_id.return_value = 1
+    mock_get_dietary_preferences.return_value = []
+    mock_generate.return_value = [{"title": "Generated Recipe"}]
+    headers = {"Authorization": f"Bearer {access_token}"}
+    response = client.post('/jobs', data={"ingredients": "egg"}, headers=headers)
+    assert response.status_code == 202
+    job_id = response.json["job_id"]
+    assert response.headers["Location"] == f"/jobs/{job_id}"
+
+    response = client.get(f'/jobs/{job_id}?wait=5', headers=headers)
+    assert response.json == {"job_id": job_id, "status": "done", "recipe": [{"title": "Generated Recipe"}]}
+
+    mock_get_user_id.return_value = 2
+    assert client.get(f'/jobs/{job_id}', headers=headers).status_code == 404
+
+# UT80 – /get_recipes answers 304 for a current ETag and serves repeat reads from the response cache
+@patch('database.get_recipes_version')
+@patch('database.get_user_id')
+@patch('database.get_recipes')
+def test_get_recipes_etag(mock_get_recipes, mock_get_user_id, mock_get_recipes_version, client, access_token):
+    mock_get_user_id.return_value = 1
+    mock_get_recipes_version.return_value = 7
+    mock_get_recipes.return_value = [{"recipe_id": 1, "name": "Recipe 1"}]
+    headers = {"Authorization": f"Bearer {access_token}"}
+    first = client.get('/get_recipes', headers=headers)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    assert client.get('/get_recipes', headers=headers).json == first.json
+    assert mock_get_recipes.call_count == 1
+    response = client.get('/get_recipes', headers=dict(headers, **{"If-None-Match": etag}))
+    assert response.status_code == 304
+    assert response.get_data() == b""
+    # A gzipped copy revalidates with the same weak tag
+    response = client.get('/get_recipes', headers=dict(headers, **{"If-None-Match": etag, "Accept-Encoding": "gzip"}))
+    assert response.status_code == 304
+
+    mock_get_recipes_version.return_value = 8
+    response = client.get('/get_recipes', headers=dict(headers, **{"If-None-Match": etag}))
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert mock_get_recipes.call_count == 2
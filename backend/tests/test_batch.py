@@ -0,0 +1,48 @@
+# tests/test_batch.py
+import pytest
+from unittest.mock import patch
+from flask_jwt_extended import create_access_token
+
+from app import app
+
+@pytest.fixture
+def client():
+    app.testing = True
+    return app.test_client()
+
+@pytest.fixture
+def access_token():
+    with app.app_context():
+        return create_access_token(identity="testuser@test.com")
+
+RECIPE = {"title": "Test Recipe", "ingredients": ["ingredient1"], "instructions": ["Step 1"], "source": "Test Source"}
+
+# UT52 – Save valid recipes in one call and report per-item errors
+@patch('database.get_user_id')
+@patch('database.add_recipes')
+def test_add_recipes_partial(mock_add_recipes, mock_get_user_id, client, access_token):
+    mock_get_user_id.return_value = 187
+    mock_add_recipes.return_value = [1, 2]
+    headers = {"Authorization": f"Bearer {access_token}"}
+    body = [RECIPE, {"title": "", "ingredients": ["x"], "instructions": ["y"]}, dict(RECIPE, title="Second")]
+
+    response = client.post('/add_recipes', json=body, headers=headers)
+
+    assert response.status_code == 200
+    assert response.json["ids"] == [1, 2]
+    assert response.json["errors"] == [{"index": 1, "message": "title must be a non-empty string of at most 255 characters"}]
+    saved = mock_add_recipes.call_args.args[1]
+    assert [recipe["title"] for recipe in saved] == ["Test Recipe", "Second"]
+    assert saved[0]["difficulty"] == "N/A"
+
+# UT53 – Reject non-array bodies and batches with no valid recipes
+@patch('database.get_user_id')
+@patch('database.add_recipes')
+def test_add_recipes_invalid(mock_add_recipes, mock_get_user_id, client, access_token):
+    mock_get_user_id.return_value = 187
+    headers = {"Authorization": f"Bearer {access_token}"}
+    assert client.post('/add_recipes', json=RECIPE, headers=headers).status_code == 400
+    response = client.post('/add_recipes', json=[{"title": "No ingredients"}], headers=headers)
+    assert response.status_code == 400
+    assert response.json["errors"][0]["index"] == 0
+    mock_add_recipes.assert_not_called()
@@ -0,0 +1,76 @@
+# tests/test_database_pool.py
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+from mysql.connector import errors
+
+import database
+
+@pytest.fixture
+def connect():
+    with patch('database.ENGINE', 'mysql'), patch('mysql.connector.connect') as mock_connect:
+        mock_connect.side_effect = lambda **kwargs: MagicMock()
+        yield mock_connect
+
+# UT20 – Connections are reused after being returned to the pool
+def test_pool_reuses_connections(connect):
+    pool = database.ConnectionPool(size=2, timeout=1)
+    conn = pool.acquire()
+    raw = conn._conn
+    conn.close()
+    again = pool.acquire()
+    assert again._conn is raw
+    assert connect.call_count == 1
+    assert pool.stats() == {"size": 2, "created": 1, "in_use": 1, "idle": 0, "waiting": 0}
+    again.close()
+    raw.rollback.assert_called()
+
+# UT21 – Checkout times out when the pool is exhausted
+def test_pool_timeout_when_exhausted(connect):
+    pool = database.ConnectionPool(size=1, timeout=0.05)
+    conn = pool.acquire()
+    with pytest.raises(errors.PoolError):
+        pool.acquire()
+    conn.close()
+    assert pool.stats()["in_use"] == 0
+
+# UT22 – A waiting thread gets the connection as soon as it is released
+def test_pool_waiter_is_woken(connect):
+    pool = database.ConnectionPool(size=1, timeout=2)
+    conn = pool.acquire()
+    result = {}
+
+    def worker():
+        result["conn"] = pool.acquire()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    while pool.stats()["waiting"] == 0:
+        time.sleep(0.001)
+    conn.close()
+    thread.join(timeout=2)
+    assert result["conn"] is not None
+    assert connect.call_count == 1
+
+# UT23 – Stale connections that fail the health check are replaced
+def test_pool_replaces_dead_connection(connect):
+    pool = database.ConnectionPool(size=1, timeout=1, ping_interval=0)
+    conn = pool.acquire()
+    dead = conn._conn
+    dead.ping.side_effect = errors.InterfaceError("gone")
+    conn.close()
+    fresh = pool.acquire()
+    assert fresh._conn is not dead
+    assert connect.call_count == 2
+    assert pool.stats()["created"] == 1
+
+# UT50 – Worker shutdown closes idle pooled connections
+def test_close_pool_closes_idle_connections(connect, monkeypatch):
+    monkeypatch.setattr(database, "_pool", database.ConnectionPool(size=2, timeout=1))
+    conn = database.get_connection()
+    raw = conn._conn
+    conn.close()
+    database.close_pool()
+    raw.close.assert_called_once()
+    assert database._pool is None
@@ -0,0 +1,60 @@
+# tests/test_embeddings.py
+import numpy as np
+from unittest.mock import patch
+
+import database
+import embeddings
+
+def _loader(recipes):
+    rows = [(recipe_id, embeddings.to_bytes(embeddings.embed(title, ingredients))) for recipe_id, title, ingredients in recipes]
+    return lambda after: [row for row in rows if row[0] > after]
+
+# UT77 – Embeddings are unit float32 vectors that are stable and reflect shared ingredients
+def test_embed():
+    omelette = embeddings.embed("Omelette", ["3 eggs", "1 cup shredded cheddar cheese", "salt"])
+    frittata = embeddings.embed("Frittata", ["6 Eggs", "cheddar cheese", "1 onion, diced"])
+    cake = embeddings.embed("Chocolate Cake", ["2 cups flour", "1 cup cocoa powder", "1 cup sugar"])
+    assert omelette.dtype == np.float32 and omelette.shape == (embeddings.DIM,)
+    assert np.isclose(np.linalg.norm(omelette), 1)
+    assert np.array_equal(embeddings.from_bytes(embeddings.to_bytes(omelette)), omelette)
+    assert float(omelette @ frittata) > float(omelette @ cake)
+
+# UT78 – The index ranks by cosine similarity and picks up recipes saved later
+def test_similarity_index_top_k():
+    recipes = [
+        (1, "Omelette", ["eggs", "cheese", "milk"]),
+        (2, "Cake", ["flour", "sugar", "cocoa"]),
+        (3, "Scrambled Eggs", ["eggs", "milk", "butter"]),
+    ]
+    index = embeddings.SimilarityIndex(_loader(recipes))
+    query = index.vector(1)
+    assert [recipe_id for recipe_id, _ in index.top_k(query, 2, exclude={1})] == [3, 2]
+
+    recipes.append((4, "Cheese Omelette", ["eggs", "cheese", "milk", "chive"]))
+    index._loader = _loader(recipes)
+    with patch('embeddings.REFRESH_INTERVAL', 0):
+        assert index.top_k(query, 1, exclude={1})[0][0] == 4
+    assert len(index) == 4
+
+# UT79 – similar_recipes returns distinct saved recipes with scores, not the recipe itself
+@patch('database.get_connection')
+def test_similar_recipes(mock_get_connection):
+    index = embeddings.SimilarityIndex(_loader([
+        (1, "Omelette", ["eggs", "cheese"]),
+        (2, "Omelette", ["eggs", "cheese"]),
+        (3, "Frittata", ["eggs", "cheese", "onion"]),
+    ]))
+    mock_cursor = mock_get_connection.return_value.cursor.return_value
+    mock_cursor.fetchone.return_value = {"name": "Omelette"}
+    mock_cursor.fetchall.side_effect = [
+        [
+            {"recipe_id": 2, "name": "Omelette", "prep_time": "5", "cook_time": "5", "difficulty": "Easy"},
+            {"recipe_id": 3, "name": "Frittata", "prep_time": "5", "cook_time": "20", "difficulty": "Easy"},
+        ],
+        [{"recipe_id": 3, "ingredient": "eggs"}],
+        [{"recipe_id": 3, "instruction": "Bake"}],
+    ]
+    with patch('database._similarity', index):
+        recipes = database.similar_recipes(1, limit=5)
+    assert [recipe["recipe_id"] for recipe in recipes] == [3]
+    assert 0 < recipes[0]["score"] < 1
@@ -0,0 +1,71 @@
+# tests/test_encoding.py
+import datetime
+import decimal
+import gzip
+import json
+import pytest
+from unittest.mock import patch
+from flask.json.provider import DefaultJSONProvider
+
+import database
+import encoding
+from app import app
+
+RECIPE = {
+    "title": "Long Stew",
+    "ingredients": [f"ingredient {n}" for n in range(20)],
+    "instructions": [f"Step {n}: stir the pot slowly for a while" for n in range(30)],
+    "prepTime": "10 min",
+    "cookTime": "2 h",
+    "difficulty": "Medium",
+}
+
+def _headers(client, **extra):
+    user_id = database.register("encoded@test.com", "Encoded", "123456")
+    token = client.post("/login", data={"email": "encoded@test.com", "password": "123456"}).json["token"]
+    return user_id, dict({"Authorization": f"Bearer {token}"}, **extra)
+
+# UT90 – The orjson provider produces the same JSON as Flask's default provider
+def test_orjson_matches_default_provider():
+    value = {
+        "b": [1, 2.5, None, True],
+        "a": "ünïcode",
+        "when": datetime.datetime(2025, 2, 24, 5, 35, 58),
+        "price": decimal.Decimal("4.50"),
+    }
+    with app.app_context():
+        fast = encoding.OrjsonProvider(app)
+        assert json.loads(fast.dumps(value)) == json.loads(DefaultJSONProvider(app).dumps(value))
+        assert fast.loads(fast.dumps(value))["when"] == "Mon, 24 Feb 2025 05:35:58 GMT"
+        assert fast.response(value).get_data(as_text=True).endswith("}\n")
+
+# UT91 – Large recipe lists are gzipped for clients that accept it; small bodies are not
+def test_get_recipes_gzip(client):
+    user_id, headers = _headers(client, **{"Accept-Encoding": "gzip"})
+    database.add_recipes(user_id, [dict(RECIPE, title=f"Stew {n}") for n in range(5)])
+
+    response = client.get("/get_recipes", headers=headers)
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    plain = client.get("/get_recipes", headers=dict(headers, **{"Accept-Encoding": "identity"}))
+    assert "Content-Encoding" not in plain.headers
+    assert json.loads(gzip.decompress(response.data)) == plain.json
+    assert len(response.data) < len(plain.data) / 3
+
+    small = client.get("/get_recipes?fields=name&limit=1", headers=headers)
+    assert "Content-Encoding" not in small.headers
+
+# UT92 – MessagePack is only used when asked for and installed, with its own ETag
+def test_msgpack_negotiation(client):
+    user_id, headers = _headers(client, Accept="application/msgpack")
+    database.add_recipe(user_id, "Toast", ["bread"], ["Toast it"], None, "1 min", "2 min", "Easy")
+    with patch('encoding.msgpack', None):
+        response = client.get("/get_recipes", headers=headers)
+        assert response.mimetype == "application/json"
+        json_etag = response.headers["ETag"]
+
+    msgpack = pytest.importorskip("msgpack")
+    response = client.get("/get_recipes", headers=headers)
+    assert response.mimetype == "application/msgpack"
+    assert response.headers["ETag"] != json_etag
+    assert msgpack.unpackb(response.data)["recipes"][0]["name"] == "Toast"
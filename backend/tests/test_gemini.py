@@ -0,0 +1,216 @@
+# tests/test_gemini.py
+import asyncio
+import concurrent.futures
+import time
+import httpx
+import pytest
+from collections import deque
+from google.genai import errors
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import gemini
+import limiter
+import providers
+
+def _server_error(code):
+    return errors.ServerError(code, httpx.Response(code, json={"error": {"code": code, "message": "busy", "status": "UNAVAILABLE"}}))
+
+# UT28 – Generations run on one long-lived event loop and client
+def test_run_reuses_loop_and_client():
+    async def current_loop():
+        return asyncio.get_running_loop()
+
+    first = gemini.run(current_loop())
+    second = gemini.run(current_loop())
+    assert first is second is gemini.get_loop()
+    assert gemini.get_client() is gemini.get_client()
+
+# UT29 – _generate uses the async API of the shared client
+@patch('gemini.get_client')
+def test_generate_uses_async_client(mock_get_client):
+    response = MagicMock(text='[{"title": "Omelette", "ingredients": ["2 eggs"], "instructions": "Beat eggs\\nCook"}]')
+    mock_get_client.return_value.aio.models.generate_content = AsyncMock(return_value=response)
+    recipes = gemini.run(gemini.generate(["egg"], [], use_cache=False))
+    assert recipes[0]["title"] == "Omelette"
+    assert recipes[0]["instructions"] == ["Beat eggs", "Cook"]
+
+# UT30 – A generation that outlives the timeout is cancelled
+def test_run_timeout():
+    with pytest.raises(concurrent.futures.TimeoutError):
+        gemini.run(asyncio.sleep(1), timeout=0.01)
+
+# UT31 – Concurrent identical requests share one upstream call
+@patch('gemini._generate', new_callable=AsyncMock)
+def test_concurrent_requests_are_coalesced(mock_generate):
+    async def slow(ingredients, dietary_preferences):
+        await asyncio.sleep(0.05)
+        return [{"title": "Fried Rice"}]
+    mock_generate.side_effect = slow
+
+    async def burst():
+        return await asyncio.gather(*[
+            gemini.generate(["rice", "egg"], [], use_cache=False) for _ in range(5)
+        ])
+
+    results = gemini.run(burst())
+    assert results == [[{"title": "Fried Rice"}]] * 5
+    assert mock_generate.await_count == 1
+    assert gemini.inflight_count() == 0
+
+# UT32 – Upstream errors propagate to every coalesced caller
+@patch('gemini._generate', new_callable=AsyncMock)
+def test_coalesced_errors_propagate(mock_generate):
+    async def failing(ingredients, dietary_preferences):
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+    mock_generate.side_effect = failing
+
+    async def burst():
+        return await asyncio.gather(*[
+            gemini.generate(["tofu"], [], use_cache=False) for _ in range(3)
+        ], return_exceptions=True)
+
+    results = gemini.run(burst())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert mock_generate.await_count == 1
+
+# UT33 – A waiter that times out does not cancel the shared call
+def test_coalesce_timeout_keeps_shared_call():
+    async def scenario():
+        started = asyncio.Event()
+
+        async def upstream():
+            started.set()
+            await asyncio.sleep(0.05)
+            return "done"
+
+        leader = asyncio.ensure_future(gemini._coalesce("key", upstream))
+        await started.wait()
+        with pytest.raises(asyncio.TimeoutError):
+            await gemini._coalesce("key", upstream, timeout=0.01)
+        return await leader
+
+    assert gemini.run(scenario()) == "done"
+
+# UT34 – The stream parser yields each recipe as soon as it is complete
+def test_stream_parser_yields_complete_objects():
+    parser = gemini.RecipeStreamParser()
+    body = '"ingredients": ["x"], "instructions": ["y"]'
+    text = '```json\n[{"title": "A [1]", "ingredients": ["x"], "instructions": "Mix\\nBake"}, {"title": "B \\"quoted\\" }", ' + body + '}, {"title": "C", ' + body + '}]\n```'
+    chunks = [text[i:i + 7] for i in range(0, len(text), 7)]
+    seen = []
+    for chunk in chunks:
+        seen.extend(parser.feed(chunk))
+    assert [recipe["title"] for recipe in seen] == ["A [1]", 'B "quoted" }', "C"]
+    assert seen[0]["instructions"] == ["Mix", "Bake"]
+    assert parser.finished
+
+# UT35 – Streamed recipes reach the caller one by one and are cached
+@patch('gemini.get_client')
+def test_generate_stream(mock_get_client):
+    async def chunks():
+        for text in ['[{"title": "Pan', 'cakes", "ingredients": ["flour"], "instructions": ["Fry"]}, {"ti', 'tle": "Waffles", "ingredients": ["flour"], "instructions": ["Press"]}]']:
+            yield MagicMock(text=text)
+    mock_get_client.return_value.aio.models.generate_content_stream = AsyncMock(return_value=chunks())
+
+    recipes = list(gemini.iterate(gemini.generate_stream(["flour", "milk"], [], use_cache=False)))
+    assert [recipe["title"] for recipe in recipes] == ["Pancakes", "Waffles"]
+    cached = list(gemini.iterate(gemini.generate_stream(["milk", "flour"], [])))
+    assert cached == recipes
+    mock_get_client.return_value.aio.models.generate_content_stream.assert_awaited_once()
+
+# UT57 – clean_json skips prose and fences and salvages recipes from truncated output
+def test_clean_json_salvages_truncated_output():
+    text = (
+        'Here are [3] recipes you asked for:\n```json\n['
+        '{"title": "Soup", "ingredients": [{"name": "Olive Oil", "quantity": "2 tablespoons"}], '
+        '"instructions": "Heat oil\\nAdd onion", "prepTime": 10, "cookTime": "20 minutes", "difficulty": "easy"}, '
+        '{"title": "Salad", "ingredients": ["lettuce"], "instructions": ["Toss"]}, '
+        '{"title": "Stew", "ingredients": ["beef"], "instructions": ["Brown the be'
+    )
+    recipes = gemini.clean_json(text)
+    assert [recipe["title"] for recipe in recipes] == ["Soup", "Salad"]
+    assert recipes[0] == {
+        "title": "Soup",
+        "ingredients": ["2 tablespoons Olive Oil"],
+        "instructions": ["Heat oil", "Add onion"],
+        "source": "",
+        "prepTime": "10 minutes",
+        "cookTime": "20 minutes",
+        "difficulty": "Easy",
+    }
+
+# UT58 – Objects that fail validation are dropped; nothing usable is an error
+def test_clean_json_validation():
+    text = '[{"title": "", "ingredients": ["x"], "instructions": ["y"]}, {"title": "Ok", "ingredients": ["x"], "instructions": ["y"]}, 42]'
+    assert [recipe["title"] for recipe in gemini.clean_json(text)] == ["Ok"]
+    assert gemini.clean_json("Sorry, I can't help with that.")["error"] == "No valid JSON array found"
+    assert "error" in gemini.clean_json('[{"title": "Missing fields"}]')
+
+class _ScriptedProvider(providers.StubProvider):
+    """Stub whose successive calls take the given delays, or raise the given errors."""
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.calls = []
+
+    async def generate(self, model, prompt, max_output_tokens):
+        self.calls.append(model)
+        step = self.script.pop(0)
+        if isinstance(step, Exception):
+            raise step
+        await asyncio.sleep(step)
+        return providers.Completion(self._text(model, prompt), 10, 20)
+
+# UT93 – The stub provider stands in for Gemini with recipes from the prompt's ingredients
+def test_stub_provider():
+    with patch('gemini._provider', providers.StubProvider()), patch('gemini._semaphore', None):
+        recipes = asyncio.run(gemini._generate(["egg", "rice"], []))
+    assert [recipe["title"] for recipe in recipes] == ["Egg Dish 1", "Rice Dish 2", "Egg Dish 3"]
+    assert recipes[0]["ingredients"] == ["egg", "rice"]
+
+# UT99 – Providers are built from the registry by name; the interface itself is abstract
+def test_create_provider():
+    client = MagicMock()
+    gemini_provider = providers.create("gemini", lambda: client)
+    assert isinstance(gemini_provider, providers.GeminiProvider) and gemini_provider._get_client() is client
+    assert isinstance(providers.create("stub", lambda: client), providers.StubProvider)
+    with pytest.raises(ValueError):
+        providers.create("nope", lambda: client)
+    with pytest.raises(TypeError):
+        providers.Provider()
+
+# UT94 – A call slower than the recent p95 is hedged; the first to finish wins
+def test_slow_call_is_hedged():
+    provider = _ScriptedProvider(1.0, 0.01)
+    breaker = limiter.CircuitBreaker(threshold=1, cooldown=30)
+    latencies = {gemini.MODEL: deque([0.05] * gemini.HEDGE_MIN_SAMPLES)}
+    with patch('gemini._provider', provider), patch('gemini._semaphore', None), patch('gemini._breaker', breaker), \
+            patch('gemini._latencies', latencies), patch('gemini._calls', 100), patch('gemini._hedges', 0):
+        started = time.perf_counter()
+        recipes = asyncio.run(gemini._generate(["egg"], []))
+        assert time.perf_counter() - started < 0.5
+        assert gemini._hedges == 1
+    assert recipes[0]["source"] == f"stub:{gemini.MODEL}"
+    assert provider.calls == [gemini.MODEL, gemini.MODEL]
+    # The cancelled loser does not count against upstream health
+    assert breaker.state == "closed" and breaker.failures == 0
+    # Both calls are timed, the loser for as long as it ran, so slow calls keep the quantile honest
+    assert len(latencies[gemini.MODEL]) == gemini.HEDGE_MIN_SAMPLES + 2
+    assert max(list(latencies[gemini.MODEL])[-2:]) >= 0.05
+
+# UT95 – Overload errors on the main model fall back to FALLBACK_MODEL; other errors do not
+@patch('limiter.backoff', return_value=0)
+def test_fallback_model(mock_backoff):
+    overloaded = [_server_error(503)] * gemini.RETRY_ATTEMPTS
+    provider = _ScriptedProvider(*overloaded, 0)
+    with patch('gemini._provider', provider), patch('gemini._semaphore', None), \
+            patch('gemini._breaker', limiter.CircuitBreaker(threshold=10, cooldown=30)), \
+            patch('gemini.FALLBACK_MODEL', "fallback-model"):
+        recipes = asyncio.run(gemini._generate(["egg"], []))
+        assert recipes[0]["source"] == "stub:fallback-model"
+        assert provider.calls == [gemini.MODEL] * gemini.RETRY_ATTEMPTS + ["fallback-model"]
+
+        provider.script = [ValueError("bad request")]
+        with pytest.raises(ValueError):
+            asyncio.run(gemini._generate(["egg"], []))
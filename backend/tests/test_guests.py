@@ -0,0 +1,105 @@
+# tests/test_guests.py
+import datetime
+from unittest.mock import AsyncMock, patch
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+import database
+from app import app
+
+RECIPE = {
+    "title": "Guest Omelette",
+    "ingredients": ["2 eggs", "salt"],
+    "instructions": ["Whisk", "Fry"],
+    "prepTime": "5 min",
+    "cookTime": "5 min",
+    "difficulty": "Easy",
+}
+
+def _guest(client):
+    response = client.get("/guest")
+    assert response.status_code == 200
+    return response.json, {"Authorization": f"Bearer {response.json['token']}"}
+
+def _count(table):
+    with database.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        count = cursor.fetchone()[0]
+        cursor.close()
+    return count
+
+# UT87 – /guest writes nothing; the guest token can generate but not edit a profile
+@patch('gemini.generate', new_callable=AsyncMock)
+def test_stateless_guest(mock_generate, client):
+    mock_generate.return_value = [{"title": "Omelette"}]
+    guest, headers = _guest(client)
+    assert set(guest) == {"id", "email", "name", "token"}
+    assert _count("users") == 0 and _count("guests") == 0
+
+    response = client.post("/generate", data={"ingredients": "egg"}, headers=headers)
+    assert response.status_code == 200
+    assert response.json == {"recipe": [{"title": "Omelette"}]}
+    mock_generate.assert_awaited_once_with(["egg"], [], True)
+    assert client.put("/profile", json={"name": "Guest"}, headers=headers).status_code == 403
+    assert client.get("/get_recipes", headers=headers).json == {"recipes": []}
+
+# UT88 – A guest's favourites and ratings move to the account they register
+def test_guest_promoted_on_register(client):
+    owner = database.register("owner@test.com", "Owner", "123456")
+    recipe_id = database.add_recipe(owner, "Pancakes", ["flour"], ["Mix"], None, "5 min", "10 min", "Easy")
+    _, headers = _guest(client)
+
+    assert client.post("/add_recipe", json=RECIPE, headers=headers).status_code == 200
+    assert client.post("/add_recipe", json={"title": "No ingredients"}, headers=headers).status_code == 400
+    assert client.post("/rating", json={"recipe_id": recipe_id, "rating": 4}, headers=headers).status_code == 200
+    saved = client.get("/get_recipes?fields=name,ingredients", headers=headers).json["recipes"]
+    assert saved == [{"name": "Guest Omelette", "ingredients": ["2 eggs", "salt"]}]
+    # Guest ratings do not count until the guest has an account
+    assert database.get_rating_stats(recipe_id)["count"] == 0
+
+    response = client.post("/register", data={"email": "promoted@test.com", "name": "Promoted", "password": "123456"}, headers=headers)
+    assert response.status_code == 200
+    user_id = database.get_user_id("promoted@test.com")
+    recipes = database.get_recipes(user_id)
+    assert [(recipe["name"], recipe["ingredients"], recipe["instructions"]) for recipe in recipes] == [
+        ("Guest Omelette", ["2 eggs", "salt"], ["Whisk", "Fry"])
+    ]
+    assert database.get_rating_stats(recipe_id)["count"] == 1
+    assert _count("guests") == 0 and _count("guest_recipes") == 0 and _count("guest_ratings") == 0
+
+# UT89 – Expired guests are purged in batches along with what they saved
+def test_purge_expired_guests():
+    for guest_id in ("a" * 32, "b" * 32, "c" * 32):
+        database.add_guest_recipes(guest_id, [RECIPE])
+    later = datetime.datetime.utcnow() + datetime.timedelta(seconds=database.GUEST_TTL + 60)
+    with patch('database._now', return_value=later):
+        assert database.get_guest_recipes("a" * 32) == []
+        assert database.purge_guests(batch=2) == 3
+    assert _count("guests") == 0 and _count("guest_recipes") == 0
+
+# UT100 – Guests are limited by the forwarded address only when PROXY_FIX_HOPS trusts a proxy
+@patch('limiter.check', return_value=0)
+@patch('gemini.generate', new_callable=AsyncMock)
+def test_guest_limited_by_forwarded_address(mock_generate, mock_check, client):
+    mock_generate.return_value = [{"title": "Omelette"}]
+    _, headers = _guest(client)
+    headers["X-Forwarded-For"] = "203.0.113.7"
+    environ = {"REMOTE_ADDR": "10.0.0.2"}
+
+    # By default the header is ignored, so clients cannot pick their own bucket
+    assert client.post("/generate", data={"ingredients": "egg"}, headers=headers, environ_base=environ).status_code == 200
+    mock_check.assert_called_once_with("ip:10.0.0.2", guest=True)
+
+    mock_check.reset_mock()
+    with patch.object(app, "wsgi_app", ProxyFix(app.wsgi_app, x_for=1)):
+        assert client.post("/generate", data={"ingredients": "egg"}, headers=headers, environ_base=environ).status_code == 200
+    mock_check.assert_called_once_with("ip:203.0.113.7", guest=True)
+
+# UT103 – A failed guest promotion is logged; the new account still registers
+@patch('database.promote_guest', side_effect=RuntimeError("deadlock"))
+def test_register_survives_failed_promotion(mock_promote_guest, client):
+    _, headers = _guest(client)
+    response = client.post("/register", data={"email": "kept@test.com", "name": "Kept", "password": "123456"}, headers=headers)
+    assert response.status_code == 200
+    mock_promote_guest.assert_called_once()
+    assert database.get_user_id("kept@test.com") is not None
@@ -0,0 +1,56 @@
+# tests/test_identity.py
+import pytest
+from unittest.mock import patch
+from flask_jwt_extended import create_access_token
+
+import database
+from app import app
+
+@pytest.fixture
+def client():
+    app.testing = True
+    return app.test_client()
+
+@pytest.fixture(autouse=True)
+def empty_identity_cache():
+    database.clear_identity_cache()
+    yield
+    database.clear_identity_cache()
+
+# UT43 – user_id is looked up once and then cached; dietary preferences are always read fresh
+@patch('database.get_connection')
+def test_identity_lookups_are_cached(mock_get_connection):
+    mock_cursor = mock_get_connection.return_value.cursor.return_value
+    mock_cursor.fetchone.side_effect = [(187,), ("Vegan@Halal",), ("Vegan",)]
+
+    assert database.get_user_id("cached@test.com") == 187
+    assert database.get_user_id("cached@test.com") == 187
+    assert database.get_dietary_preferences(187) == ["Vegan", "Halal"]
+    # Changed by /profile on another worker, which cannot invalidate this one
+    assert database.get_dietary_preferences(187) == ["Vegan"]
+    assert mock_cursor.execute.call_count == 3
+
+# UT44 – Updating a user invalidates their cached identity
+@patch('database.get_connection')
+def test_update_user_invalidates_cache(mock_get_connection):
+    mock_cursor = mock_get_connection.return_value.cursor.return_value
+    mock_cursor.fetchone.side_effect = [(187,), ("Vegan",), (187, "new@test.com", "New", "hash", None, "Keto"), (187,), ("Keto",)]
+
+    database.get_user_id("old@test.com")
+    database.get_dietary_preferences(187)
+    database.update_user(187, "New", "new@test.com", "Keto", "")
+    assert database.get_user_id("old@test.com") == 187
+    assert database.get_dietary_preferences(187) == ["Keto"]
+
+# UT45 – Tokens carrying the user_id claim skip the email lookup
+@patch('database.get_recipes_version', return_value=None)
+@patch('database.get_user_id')
+@patch('database.get_recipes')
+def test_user_id_claim_skips_lookup(mock_get_recipes, mock_get_user_id, mock_get_recipes_version, client):
+    mock_get_recipes.return_value = []
+    with app.app_context():
+        token = create_access_token(identity="claims@test.com", additional_claims={"user_id": 55})
+    response = client.get('/get_recipes', headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    mock_get_user_id.assert_not_called()
+    mock_get_recipes.assert_called_once_with(55, fields=None)
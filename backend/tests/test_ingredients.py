@@ -1,4 +1,5 @@
 # tests/test_ingredients.py
+import ingredients
 
 # UT09 – Manual Ingredient Input (FR7)
 def test_manual_ingredient_input(client):
@@ -13,3 +14,18 @@ def test_manual_ingredient_input(client):
 # UT10 – Voice Input (mocked or fallback to manual if not supported) (FR8)
 def test_voice_input_simulated(client):
     assert True
+
+# UT59 – Ingredient lines are reduced to the ingredient name
+def test_normalize_ingredient_lines():
+    assert ingredients.normalize("1 cup all-purpose Flour") == "all purpose flour"
+    assert ingredients.normalize("2 Tomatoes, diced") == "tomato"
+    assert ingredients.normalize("200g chicken breasts") == "chicken breast"
+    assert ingredients.normalize("Garlic (3 cloves, minced)") == "garlic"
+    assert ingredients.normalize("3 large eggs") == "egg"
+    assert ingredients.normalize("1 cup berries") == "berry"
+    assert ingredients.normalize("asparagus") == "asparagus"
+    assert ingredients.normalize("1/2 tsp") == ""
+
+# UT60 – User input is normalized, deduplicated and sorted
+def test_normalize_all():
+    assert ingredients.normalize_all(["Eggs", " egg ", "2 cups rice", "", "pinch"]) == ["egg", "rice"]
@@ -0,0 +1,60 @@
+# tests/test_jobs.py
+import pytest
+from cachetools import TTLCache
+from unittest.mock import AsyncMock, patch
+
+import jobs
+
+# UT72 – A submitted job runs in the background and long-polling returns its recipes
+@patch('gemini.generate', new_callable=AsyncMock)
+def test_job_completes(mock_generate):
+    mock_generate.return_value = [{"title": "Omelette"}]
+    job_id = jobs.submit(1, ["egg"], [])
+    job = jobs.wait(job_id, 5)
+    assert job["status"] == jobs.DONE
+    assert job["result"] == [{"title": "Omelette"}]
+    assert job["user_id"] == 1
+    mock_generate.assert_awaited_once_with(["egg"], [], True)
+
+# UT73 – Errors and error dicts from Gemini mark the job failed
+@patch('gemini.generate', new_callable=AsyncMock)
+def test_job_fails(mock_generate):
+    mock_generate.side_effect = RuntimeError("upstream exploded")
+    assert jobs.wait(jobs.submit(1, ["egg"], []), 5)["error"] == "upstream exploded"
+    mock_generate.side_effect = None
+    mock_generate.return_value = {"error": "No valid recipes found in response"}
+    job = jobs.wait(jobs.submit(1, ["egg"], []), 5)
+    assert job["status"] == jobs.FAILED
+    assert job["error"] == "No valid recipes found in response"
+
+# UT74 – Submissions beyond MAX_PENDING are refused instead of queued
+@patch('jobs.MAX_PENDING', 0)
+def test_job_queue_full():
+    with pytest.raises(jobs.QueueFull):
+        jobs.submit(1, ["egg"], [])
+
+# UT75 – With JOBS_PATH set, job state is shared through SQLite
+@patch('gemini.generate', new_callable=AsyncMock)
+def test_job_sqlite_store(mock_generate, tmp_path):
+    mock_generate.return_value = [{"title": "Omelette"}]
+    with patch('jobs.PERSIST_PATH', str(tmp_path / "jobs.db")), patch('jobs._db', None):
+        job_id = jobs.submit(1, ["egg"], [])
+        assert jobs.wait(job_id, 5)["result"] == [{"title": "Omelette"}]
+        jobs.clear()
+        assert jobs.get(job_id)["status"] == jobs.DONE
+        assert jobs.get("missing") is None
+
+# UT97 – Queued and running jobs are never evicted by finished ones
+def test_unfinished_jobs_not_evicted():
+    def job(job_id, status):
+        return {"id": job_id, "user_id": 1, "status": status, "result": None, "error": None,
+                "created_at": 0, "updated_at": 0}
+    with patch('jobs._jobs', TTLCache(maxsize=1, ttl=60)):
+        jobs._save(job("running", jobs.RUNNING))
+        jobs._save(job("first", jobs.DONE))
+        jobs._save(job("second", jobs.FAILED))
+        assert jobs.get("running")["status"] == jobs.RUNNING
+        assert jobs.get("first") is None
+        jobs._save(job("running", jobs.DONE))
+        assert jobs.get("running")["status"] == jobs.DONE
+    jobs.clear()
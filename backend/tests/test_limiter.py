@@ -0,0 +1,68 @@
+# tests/test_limiter.py
+import asyncio
+import httpx
+import pytest
+from google.genai import errors
+from unittest.mock import AsyncMock, patch
+
+import gemini
+import limiter
+
+def _server_error(code):
+    return errors.ServerError(code, httpx.Response(code, json={"error": {"code": code, "message": "busy", "status": "UNAVAILABLE"}}))
+
+# UT64 – A token bucket allows a burst, then refills at its rate
+def test_token_bucket():
+    bucket = limiter.TokenBucket(rate=1, burst=2)
+    now = bucket.updated
+    assert bucket.take(now) == 0
+    assert bucket.take(now) == 0
+    assert bucket.take(now) == pytest.approx(1)
+    assert bucket.take(now + 0.5) == pytest.approx(0.5)
+    assert bucket.take(now + 1) == 0
+
+# UT65 – The breaker opens after repeated failures and lets one probe through after the cooldown
+def test_circuit_breaker():
+    breaker = limiter.CircuitBreaker(threshold=2, cooldown=30)
+    breaker.failure()
+    breaker.before_call()
+    breaker.failure()
+    assert breaker.state == "open"
+    with pytest.raises(limiter.CircuitOpen):
+        breaker.before_call()
+
+    breaker.opened_at -= 30
+    breaker.before_call()
+    with pytest.raises(limiter.CircuitOpen):
+        breaker.before_call()
+    breaker.success()
+    assert breaker.state == "closed"
+
+# UT66 – Overloaded responses are retried with backoff; the breaker then sheds calls
+@patch('limiter.backoff', return_value=0)
+@patch('gemini.get_client')
+def test_generate_retries_then_sheds(mock_get_client, mock_backoff):
+    generate_content = mock_get_client.return_value.aio.models.generate_content = AsyncMock()
+    generate_content.side_effect = [_server_error(503), AsyncMock(text='[{"title": "R", "ingredients": ["a"], "instructions": ["b"]}]')]
+    with patch('gemini._breaker', limiter.CircuitBreaker(threshold=1, cooldown=30)), patch('gemini._semaphore', None):
+        recipes = asyncio.run(gemini._generate(["egg"], []))
+        assert [recipe["title"] for recipe in recipes] == ["R"]
+        assert generate_content.await_count == 2
+
+        generate_content.side_effect = _server_error(503)
+        with pytest.raises(errors.ServerError):
+            asyncio.run(gemini._generate(["egg"], []))
+        with pytest.raises(gemini.GeminiUnavailable):
+            asyncio.run(gemini._generate(["egg"], []))
+    assert generate_content.await_count == 2 + gemini.RETRY_ATTEMPTS
+
+# UT102 – Server-wide limits are split between worker processes
+def test_limits_shared_between_workers():
+    limiter.reset()
+    with patch('limiter.PROCESSES', 4), patch('limiter.USER_RATE', 1.0), patch('limiter.USER_BURST', 8):
+        assert limiter.share(8) == 2 and limiter.share(2) == 1
+        assert limiter.check("user:1") == 0
+        assert limiter.check("user:1") == 0
+        # Two of the eight go to this process; the next refills at a quarter of the rate
+        assert limiter.check("user:1") == pytest.approx(4, abs=0.01)
+    limiter.reset()
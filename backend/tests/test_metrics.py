@@ -0,0 +1,68 @@
+# tests/test_metrics.py
+import json
+import logging
+import time
+from prometheus_client import REGISTRY
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import database
+import gemini
+import logs
+import passwords
+from app import app
+
+# UT69 – /metrics reports per-route latency and database call timings
+@patch('database.get_connection')
+def test_metrics_endpoint(mock_get_connection):
+    mock_get_connection.return_value.cursor.return_value.fetchone.return_value = None
+    client = app.test_client()
+    client.post('/ingredients', json={"ingredients": ["egg"]})
+    database.get_rating_stats(1)
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    body = response.get_data(as_text=True)
+    assert 'http_request_duration_seconds_count{method="POST",route="/ingredients",status="200"}' in body
+    assert 'db_call_duration_seconds_count{function="get_rating_stats"}' in body
+    assert 'db_pool_connections{state="in_use"}' in body
+
+# UT70 – Gemini latency and token usage are recorded per call
+@patch('gemini.get_client')
+def test_gemini_metrics(mock_get_client):
+    response = MagicMock(text='[{"title": "R", "ingredients": ["a"], "instructions": ["b"]}]')
+    response.usage_metadata.prompt_token_count = 120
+    response.usage_metadata.candidates_token_count = 300
+    mock_get_client.return_value.aio.models.generate_content = AsyncMock(return_value=response)
+    before = REGISTRY.get_sample_value("gemini_tokens_total", {"kind": "output"}) or 0
+    gemini.run(gemini._generate(["egg"], []))
+    assert REGISTRY.get_sample_value("gemini_tokens_total", {"kind": "output"}) == before + 300
+    assert REGISTRY.get_sample_value("gemini_call_duration_seconds_count", {"call": "generate", "outcome": "ok"}) >= 1
+
+# UT71 – Log records are single JSON lines with their extra fields; low levels are sampled
+def test_json_logging():
+    record = logging.LogRecord("app", logging.INFO, __file__, 1, "Rating submitted", None, None)
+    record.recipe_id = 7
+    entry = json.loads(logs.JsonFormatter().format(record))
+    assert entry["level"] == "info"
+    assert entry["message"] == "Rating submitted"
+    assert entry["recipe_id"] == 7
+
+    drop_all = logs.SampleFilter(0)
+    assert not drop_all.filter(record)
+    record.levelno = logging.ERROR
+    assert drop_all.filter(record)
+
+# UT101 – Login timings cover its queries, not the bcrypt check between them
+def test_login_timing_excludes_hashing():
+    user_id = database.register("timed@test.com", "Timed", "secret1")
+    labels = {"function": "login"}
+    before = REGISTRY.get_sample_value("db_call_duration_seconds_sum", labels) or 0
+    check = passwords._check
+
+    def slow_check(password, hashed):
+        time.sleep(0.2)
+        return check(password, hashed)
+
+    with patch('passwords._check', slow_check):
+        assert database.login("timed@test.com", "secret1")[0] == user_id
+    assert REGISTRY.get_sample_value("db_call_duration_seconds_sum", labels) - before < 0.2
@@ -0,0 +1,57 @@
+# tests/test_passwords.py
+import threading
+import pytest
+from unittest.mock import patch
+
+import database
+import passwords
+from app import app
+
+@pytest.fixture
+def client():
+    app.testing = True
+    return app.test_client()
+
+@pytest.fixture
+def inline_hashing(monkeypatch):
+    monkeypatch.setattr(passwords, "WORKERS", 0)
+    monkeypatch.setattr(passwords, "ROUNDS", 4)
+
+# UT46 – Hash and verify round trip
+def test_hash_and_check(inline_hashing):
+    hashed = passwords.hash_password("secret1")
+    assert hashed.startswith("$2b$04$")
+    assert passwords.check_password("secret1", hashed)
+    assert not passwords.check_password("wrong", hashed)
+
+# UT47 – Hashing runs in the process pool when workers are configured
+def test_hash_in_process_pool(monkeypatch):
+    monkeypatch.setattr(passwords, "WORKERS", 1)
+    monkeypatch.setattr(passwords, "ROUNDS", 4)
+    try:
+        assert passwords.check_password("secret1", passwords.hash_password("secret1"))
+    finally:
+        passwords.shutdown()
+
+# UT48 – Login transparently upgrades hashes made with an old cost factor
+@patch('database._set_password')
+@patch('database.get_connection')
+def test_login_rehashes_old_cost(mock_get_connection, mock_set_password, inline_hashing, monkeypatch):
+    monkeypatch.setattr(passwords, "ROUNDS", 5)
+    old_hash = passwords._hash("secret1", 4)
+    mock_get_connection.return_value.cursor.return_value.fetchone.return_value = (3, "a@b.com", "A", old_hash, None, None)
+
+    assert database.login("a@b.com", "secret1")
+    user_id, new_hash = mock_set_password.call_args.args
+    assert user_id == 3
+    assert new_hash.startswith("$2b$05$")
+
+# UT49 – A saturated password pool answers 429 instead of queueing
+@patch('database.get_connection')
+def test_login_returns_429_when_saturated(mock_get_connection, client, monkeypatch):
+    mock_get_connection.return_value.cursor.return_value.fetchone.return_value = (3, "a@b.com", "A", "$2b$04$" + "x" * 53, None, None)
+    monkeypatch.setattr(passwords, "_slots", threading.BoundedSemaphore(1))
+    passwords._slots.acquire()
+    response = client.post('/login', data={"email": "a@b.com", "password": "secret1"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
@@ -71,3 +71,58 @@ def test_submit_rating_failure(mock_submit_rating, mock_get_user_id, client, acc
     assert response.status_code == 500
     assert response.json == {"message": "Failed to submit rating"}
     mock_submit_rating.assert_called_once_with(187, 1, 4)
+
+# UT54 – A first rating creates the recipe's stats row
+def test_first_rating_updates_stats():
+    import database
+    owner = database.register("owner@test.com", "Owner", "123456")
+    rater = database.register("rater@test.com", "Rater", "123456")
+    recipe_id = database.add_recipe(owner, "Pancakes", ["flour"], ["Mix"], None, "5 min", "10 min", "Easy")
+
+    assert database.submit_rating(rater, recipe_id, 4)
+    assert database.submit_rating(owner, recipe_id, 2)
+
+    assert database.get_rating_stats(recipe_id) == {
+        "recipe_id": recipe_id, "count": 2, "average": 3.0,
+        "histogram": {"1": 0, "2": 1, "3": 0, "4": 1, "5": 0},
+    }
+
+# UT55 – Re-rating moves the vote between histogram buckets instead of adding one
+def test_rerating_adjusts_stats():
+    import database
+    owner = database.register("owner@test.com", "Owner", "123456")
+    recipe_id = database.add_recipe(owner, "Pancakes", ["flour"], ["Mix"], None, "5 min", "10 min", "Easy")
+    assert database.submit_rating(owner, recipe_id, 2)
+
+    assert database.submit_rating(owner, recipe_id, 5)
+
+    assert database.get_rating_stats(recipe_id) == {
+        "recipe_id": recipe_id, "count": 1, "average": 5.0,
+        "histogram": {"1": 0, "2": 0, "3": 0, "4": 0, "5": 1},
+    }
+
+# UT56 – Rating stats are served from the pre-aggregated row
+@patch('database.get_user_id')
+@patch('database.get_connection')
+def test_get_rating_stats(mock_get_connection, mock_get_user_id, client, access_token):
+    mock_get_user_id.return_value = 187
+    mock_cursor = mock_get_connection.return_value.cursor.return_value
+    mock_cursor.fetchone.return_value = {"rating_count": 4, "rating_sum": 15, "count_1": 0, "count_2": 0, "count_3": 1, "count_4": 3, "count_5": 0}
+
+    response = client.get('/rating/1', headers={"Authorization": f"Bearer {access_token}"})
+
+    assert response.status_code == 200
+    assert response.json == {"recipe_id": 1, "count": 4, "average": 3.75, "histogram": {"1": 0, "2": 0, "3": 1, "4": 3, "5": 0}}
+
+# UT98 – Ratings that are not whole numbers are rejected before reaching the database
+@patch('database.get_user_id')
+@patch('database.submit_rating')
+def test_submit_rating_not_integer(mock_submit_rating, mock_get_user_id, client, access_token):
+    mock_get_user_id.return_value = 187
+    headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
+
+    for rating in (4.5, True, "4"):
+        response = client.post('/rating', json={"recipe_id": 1, "rating": rating}, headers=headers)
+        assert response.status_code == 400
+        assert response.json == {"message": "Rating must be a whole number"}
+    mock_submit_rating.assert_not_called()
@@ -0,0 +1,81 @@
+# tests/test_recipe_cache.py
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+
+import gemini
+import recipe_cache
+
+RECIPES = [{"title": "Chicken Rice", "instructions": ["Step 1"], "ingredients": ["chicken", "rice"]}]
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    recipe_cache.clear()
+    yield
+    recipe_cache.clear()
+
+# UT24 – Cache key ignores ingredient order, case and whitespace
+def test_cache_key_normalization():
+    assert recipe_cache.make_key(["Chicken", " rice "], []) == recipe_cache.make_key(["rice", "chicken", ""], [])
+    assert recipe_cache.make_key(["chicken"], ["Vegan"]) != recipe_cache.make_key(["chicken"], [])
+
+# UT25 – Repeated generation is served from the cache
+@patch('gemini._generate', new_callable=AsyncMock)
+def test_generate_uses_cache(mock_generate):
+    mock_generate.return_value = RECIPES
+    first = asyncio.run(gemini.generate(["chicken", "rice"], []))
+    second = asyncio.run(gemini.generate(["rice", "Chicken"], []))
+    assert first == second == RECIPES
+    mock_generate.assert_awaited_once()
+    assert recipe_cache.stats()["hits"] == 1
+    assert recipe_cache.stats()["misses"] == 1
+
+# UT26 – Bypass flag and failed generations skip the cache
+@patch('gemini._generate', new_callable=AsyncMock)
+def test_generate_cache_bypass_and_errors(mock_generate):
+    mock_generate.return_value = {"error": "No valid JSON array found", "raw_response": ""}
+    asyncio.run(gemini.generate(["egg"], []))
+    mock_generate.return_value = RECIPES
+    asyncio.run(gemini.generate(["egg"], []))
+    asyncio.run(gemini.generate(["egg"], [], use_cache=False))
+    assert mock_generate.await_count == 3
+
+# UT27 – Entries survive in the persistent tier after the memory tier is cleared
+def test_persistent_tier(tmp_path, monkeypatch):
+    monkeypatch.setattr(recipe_cache, "PERSIST_PATH", str(tmp_path / "cache.db"))
+    monkeypatch.setattr(recipe_cache, "_db", None)
+    key = recipe_cache.make_key(["tofu"], ["Vegan"])
+    recipe_cache.put(key, RECIPES)
+    recipe_cache.clear()
+    assert recipe_cache.get(key) == RECIPES
+    assert recipe_cache.stats()["persistent_hits"] == 1
+    assert recipe_cache.get(key) == RECIPES
+    assert recipe_cache.stats()["hits"] == 1
+
+# UT96 – Coroutines reach the persistent tier through a worker thread, not the event loop
+@patch('gemini._generate', new_callable=AsyncMock)
+def test_persistent_tier_off_loop(mock_generate, tmp_path, monkeypatch):
+    monkeypatch.setattr(recipe_cache, "PERSIST_PATH", str(tmp_path / "cache.db"))
+    monkeypatch.setattr(recipe_cache, "_db", None)
+    mock_generate.return_value = RECIPES
+    with patch('asyncio.to_thread', wraps=asyncio.to_thread) as to_thread:
+        asyncio.run(gemini.generate(["tofu"], []))
+        recipe_cache.clear()
+        assert asyncio.run(gemini.generate(["tofu"], [])) == RECIPES
+    mock_generate.assert_awaited_once()
+    assert [call.args[0] for call in to_thread.call_args_list] == [
+        recipe_cache._persistent_lookup, recipe_cache._persistent_put, recipe_cache._persistent_lookup,
+    ]
+    assert recipe_cache.stats()["persistent_hits"] == 1
+
+# UT104 – Writes sweep expired entries out of the persistent tier
+def test_persistent_tier_purges_expired(tmp_path, monkeypatch):
+    monkeypatch.setattr(recipe_cache, "PERSIST_PATH", str(tmp_path / "cache.db"))
+    monkeypatch.setattr(recipe_cache, "_db", None)
+    monkeypatch.setattr(recipe_cache, "_purged_at", 0.0)
+    stale = recipe_cache.make_key(["tofu"], [])
+    with patch('time.time', return_value=1000.0):
+        recipe_cache.put(stale, RECIPES)
+    recipe_cache.put(recipe_cache.make_key(["egg"], []), RECIPES)
+    keys = [row[0] for row in recipe_cache._get_db().execute("SELECT key FROM recipe_cache")]
+    assert keys == [recipe_cache.make_key(["egg"], [])]
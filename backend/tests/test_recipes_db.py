@@ -0,0 +1,126 @@
+# tests/test_recipes_db.py
+from unittest.mock import patch
+
+import database
+
+# UT37 – Saving a recipe writes its ingredients and steps as child rows in one commit
+@patch('database.get_connection')
+def test_add_recipe_writes_child_rows(mock_get_connection):
+    mock_conn = mock_get_connection.return_value
+    mock_cursor = mock_conn.cursor.return_value
+    mock_cursor.lastrowid = 42
+
+    recipe_id = database.add_recipe(7, "Omelette", ["2 eggs", "salt"], ["Beat", "Cook"], "Test", "5 minutes", "5 minutes", "Easy")
+
+    assert recipe_id == 42
+    mock_cursor.execute.assert_any_call(
+        "INSERT INTO recipes (user_id, name, prep_time, cook_time, difficulty) VALUES (%s, %s, %s, %s, %s)",
+        (7, "Omelette", "5 minutes", "5 minutes", "Easy"),
+    )
+    mock_cursor.execute.assert_called_with(
+        "UPDATE users SET recipes_version = recipes_version + 1 WHERE user_id = %s", (7,)
+    )
+    ingredient_rows = mock_cursor.executemany.call_args_list[0].args[1]
+    step_rows = mock_cursor.executemany.call_args_list[1].args[1]
+    assert ingredient_rows == [(42, 0, "2 eggs", "egg"), (42, 1, "salt", "salt")]
+    assert step_rows == [(42, 0, "Beat"), (42, 1, "Cook")]
+    embedding_rows = mock_cursor.executemany.call_args_list[2].args[1]
+    assert [row[0] for row in embedding_rows] == [42]
+    mock_conn.commit.assert_called_once()
+    mock_conn.close.assert_called_once()
+
+# UT38 – Reading recipes assembles child rows in order without string splitting
+@patch('database.get_connection')
+def test_get_recipes_assembles_children(mock_get_connection):
+    mock_cursor = mock_get_connection.return_value.cursor.return_value
+    mock_cursor.fetchall.side_effect = [
+        [{"recipe_id": 1, "user_id": 7, "name": "Omelette", "prep_time": "5 minutes", "cook_time": "5 minutes", "difficulty": "Easy", "created_at": None},
+         {"recipe_id": 2, "user_id": 7, "name": "Toast", "prep_time": "1 minute", "cook_time": "2 minutes", "difficulty": "Easy", "created_at": None}],
+        [{"recipe_id": 1, "ingredient": "2 eggs"}, {"recipe_id": 1, "ingredient": "salt"}, {"recipe_id": 2, "ingredient": "bread"}],
+        [{"recipe_id": 1, "instruction": "Beat"}, {"recipe_id": 1, "instruction": "Cook"}],
+    ]
+
+    recipes = database.get_recipes(7)
+
+    assert recipes[0]["ingredients"] == ["2 eggs", "salt"]
+    assert recipes[0]["instructions"] == ["Beat", "Cook"]
+    assert recipes[0]["difficulty"] == "Easy"
+    assert recipes[0]["prepTime"] == "5 minutes"
+    assert recipes[1]["ingredients"] == ["bread"]
+    assert recipes[1]["instructions"] == []
+    assert mock_cursor.execute.call_count == 3
+
+# UT39 – Paged reads use a keyset cursor and only fetch the requested fields
+@patch('database.get_connection')
+def test_get_recipes_page_keyset_and_projection(mock_get_connection):
+    mock_cursor = mock_get_connection.return_value.cursor.return_value
+    mock_cursor.fetchmany.return_value = [
+        {"recipe_id": 3, "created_at": "2025-03-01 10:00:00", "name": "Soup"},
+        {"recipe_id": 4, "created_at": "2025-03-01 10:00:00", "name": "Salad"},
+        {"recipe_id": 5, "created_at": "2025-03-02 09:00:00", "name": "Stew"},
+    ]
+    after = database.encode_cursor("2025-02-28 08:00:00", 2)
+
+    recipes, next_cursor = database.get_recipes_page(7, 2, after=after, fields=["recipe_id", "name"])
+
+    assert recipes == [{"recipe_id": 3, "name": "Soup"}, {"recipe_id": 4, "name": "Salad"}]
+    assert database.decode_cursor(next_cursor) == ("2025-03-01 10:00:00", 4)
+    query, params = mock_cursor.execute.call_args.args
+    assert query.startswith("SELECT recipe_id, created_at, name FROM recipes")
+    assert "LIMIT %s" in query
+    assert params == [7, "2025-02-28 08:00:00", "2025-02-28 08:00:00", 2, 3]
+    mock_cursor.fetchmany.assert_called_once_with(3)
+    # Neither ingredients nor instructions were requested, so no child queries ran
+    assert mock_cursor.execute.call_count == 1
+
+# UT40 – The last page has no next cursor
+@patch('database.get_connection')
+def test_get_recipes_last_page(mock_get_connection):
+    mock_cursor = mock_get_connection.return_value.cursor.return_value
+    mock_cursor.fetchmany.return_value = [{"recipe_id": 3, "created_at": "2025-03-01 10:00:00", "name": "Soup"}]
+    recipes, next_cursor = database.get_recipes_page(7, 2, fields=["name"])
+    assert recipes == [{"name": "Soup"}]
+    assert next_cursor is None
+
+# UT51 – A batch of recipes is saved with one commit and batched child inserts
+@patch('database.get_connection')
+def test_add_recipes_single_transaction(mock_get_connection):
+    mock_conn = mock_get_connection.return_value
+    mock_cursor = mock_conn.cursor.return_value
+    ids = iter([10, 11])
+    mock_cursor.execute.side_effect = lambda sql, *args: sql.startswith("INSERT") and setattr(mock_cursor, "lastrowid", next(ids))
+    recipes = [
+        {"title": "A", "ingredients": ["2 eggs", "rice"], "instructions": ["s1"], "prepTime": "1", "cookTime": "2", "difficulty": "Easy"},
+        {"title": "B", "ingredients": ["Flour"], "instructions": ["s1", "s2"], "prepTime": "1", "cookTime": "2", "difficulty": "Hard"},
+    ]
+
+    assert database.add_recipes(7, recipes) == [10, 11]
+    assert mock_cursor.executemany.call_count == 3
+    assert mock_cursor.executemany.call_args_list[0].args[1] == [(10, 0, "2 eggs", "egg"), (10, 1, "rice", "rice"), (11, 0, "Flour", "flour")]
+    assert mock_cursor.executemany.call_args_list[1].args[1] == [(10, 0, "s1"), (11, 0, "s1"), (11, 1, "s2")]
+    mock_conn.commit.assert_called_once()
+
+# UT61 – Saved recipes are ranked by ingredient coverage, one per title
+@patch('database.get_connection')
+def test_match_recipes_ranks_by_coverage(mock_get_connection):
+    mock_cursor = mock_get_connection.return_value.cursor.return_value
+    mock_cursor.fetchall.side_effect = [
+        [
+            {"recipe_id": 1, "total": 4, "matched": 2},
+            {"recipe_id": 2, "total": 2, "matched": 2},
+            {"recipe_id": 3, "total": 3, "matched": 3},
+        ],
+        [
+            {"recipe_id": 1, "name": "Fried Rice", "prep_time": "5", "cook_time": "10", "difficulty": "Easy"},
+            {"recipe_id": 2, "name": "Omelette", "prep_time": "5", "cook_time": "5", "difficulty": "Easy"},
+            {"recipe_id": 3, "name": "omelette", "prep_time": "5", "cook_time": "5", "difficulty": "Easy"},
+        ],
+        [{"recipe_id": 3, "position": 0, "ingredient": "2 eggs"}],
+        [{"recipe_id": 3, "position": 0, "instruction": "Cook"}],
+    ]
+
+    recipes = database.match_recipes(["egg", "rice"], limit=5)
+
+    assert [(recipe["recipe_id"], recipe["coverage"]) for recipe in recipes] == [(3, 1.0), (1, 0.5)]
+    assert recipes[0]["ingredients"] == ["2 eggs"]
+    assert recipes[0]["instructions"] == ["Cook"]
@@ -0,0 +1,58 @@
+# tests/test_sqlite_backend.py
+import pytest
+from mysql.connector import errors
+
+import database
+import sqlite_backend
+
+pytestmark = pytest.mark.skipif(database.ENGINE != "sqlite", reason="runs against the SQLite engine")
+
+# UT81 – MySQL-only SQL is rewritten for SQLite
+def test_translate():
+    assert sqlite_backend.translate("SELECT * FROM users WHERE email = %s") == "SELECT * FROM users WHERE email = ?"
+    assert sqlite_backend.translate("SELECT rating FROM ratings WHERE user_id = %s FOR UPDATE") == "SELECT rating FROM ratings WHERE user_id = ?"
+    assert sqlite_backend.translate("INSERT IGNORE INTO t (a) VALUES (%s)") == "INSERT OR IGNORE INTO t (a) VALUES (?)"
+    assert "ON CONFLICT DO UPDATE SET n = n + 1" in sqlite_backend.translate("INSERT INTO t (a) VALUES (%s) ON DUPLICATE KEY UPDATE n = n + 1")
+
+# UT82 – The database.* functions behave the same on SQLite, including cascades and upserts
+def test_recipe_round_trip():
+    assert database.register("cook@example.com", "Cook", "secret1")
+    assert not database.register("cook@example.com", "Cook", "secret1")
+    user_id = database.get_user_id("cook@example.com")
+    assert database.login("cook@example.com", "secret1")[0] == user_id
+
+    recipe_id = database.add_recipe(user_id, "Omelette", ["2 eggs", "cheese"], ["Beat", "Cook"], "", "5 minutes", "5 minutes", "Easy")
+    database.add_recipes(user_id, [{"title": "Frittata", "ingredients": ["6 eggs", "onion"], "instructions": ["Bake"],
+                                    "prepTime": "5 minutes", "cookTime": "20 minutes", "difficulty": "Easy"}])
+    assert database.get_recipes_version(user_id) == 2
+    recipes = database.get_recipes(user_id)
+    assert [recipe["name"] for recipe in recipes] == ["Omelette", "Frittata"]
+    assert recipes[0]["ingredients"] == ["2 eggs", "cheese"]
+    page, next_cursor = database.get_recipes_page(user_id, 1)
+    assert [recipe["name"] for recipe in page] == ["Omelette"]
+    assert [recipe["name"] for recipe in database.get_recipes_page(user_id, 1, after=next_cursor)[0]] == ["Frittata"]
+    assert database.match_recipes(["egg", "cheese"])[0]["title"] == "Omelette"
+
+    assert database.submit_rating(user_id, recipe_id, 4)
+    assert database.submit_rating(user_id, recipe_id, 2)
+    assert database.get_rating_stats(recipe_id)["histogram"] == {"1": 0, "2": 1, "3": 0, "4": 0, "5": 0}
+
+    database.remove_recipe(user_id, "Omelette")
+    assert [recipe["name"] for recipe in database.get_recipes(user_id)] == ["Frittata"]
+    assert database.get_rating_stats(recipe_id)["count"] == 0
+    with database.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM recipe_ingredients WHERE recipe_id = %s", (recipe_id,))
+        assert cursor.fetchone()[0] == 0
+        cursor.close()
+
+# UT83 – A file database uses WAL and reports constraint errors as mysql.connector errors
+def test_sqlite_file_database(tmp_path):
+    conn = sqlite_backend.connect(str(tmp_path / "mealmatcher.db"))
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("PRAGMA journal_mode")
+    assert cursor.fetchone() == {"journal_mode": "wal"}
+    cursor.execute("INSERT INTO users (email, name, password) VALUES (%s, %s, %s)", ("a@example.com", "A", "!"))
+    with pytest.raises(errors.IntegrityError):
+        cursor.execute("INSERT INTO users (email, name, password) VALUES (%s, %s, %s)", ("a@example.com", "A", "!"))
+    conn.close()
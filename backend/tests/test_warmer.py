@@ -0,0 +1,57 @@
+# tests/test_warmer.py
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+
+import gemini
+import limiter
+import recipe_cache
+import warmer
+
+RECIPES = [{"title": "Chicken Rice", "instructions": ["Step 1"], "ingredients": ["chicken", "rice"]}]
+
+@pytest.fixture(autouse=True)
+def empty_warmer():
+    recipe_cache.clear()
+    warmer.clear()
+    yield
+    recipe_cache.clear()
+    warmer.clear()
+
+# UT84 – Only keys requested often enough are pooled, most popular first
+def test_popular_keys():
+    for _ in range(3):
+        warmer.record(["Chicken", "rice"], [])
+    for _ in range(2):
+        warmer.record(["egg"], ["Vegetarian"])
+    warmer.record(["tofu"], [])
+    pooled = warmer.popular()
+    assert [entry[2] for entry in pooled] == [["chicken", "rice"], ["egg"]]
+    assert pooled[1][3] == ["vegetarian"]
+    assert pooled[0][0] == recipe_cache.make_key(["rice", "chicken"], [])
+
+# UT85 – A warming pass fills the cache so the next request is served without Gemini
+@patch('gemini._generate', new_callable=AsyncMock)
+def test_warm_once_fills_cache(mock_generate):
+    mock_generate.return_value = RECIPES
+    warmer.record(["chicken", "rice"], [])
+    warmer.record(["rice", "chicken"], [])
+    assert asyncio.run(warmer.warm_once()) == 1
+    # Already warm, so the next pass spends nothing
+    assert asyncio.run(warmer.warm_once()) == 0
+    assert asyncio.run(gemini.generate(["Chicken", "Rice"], [])) == RECIPES
+    mock_generate.assert_awaited_once()
+
+# UT86 – Warming stops when the budget is spent or the breaker is open
+@patch('gemini._generate', new_callable=AsyncMock)
+def test_warm_once_respects_budget(mock_generate):
+    mock_generate.return_value = RECIPES
+    for ingredients in (["chicken"], ["egg"], ["tofu"]):
+        warmer.record(ingredients, [])
+        warmer.record(ingredients, [])
+    with patch('warmer._bucket', limiter.TokenBucket(1 / 3600, 2)):
+        assert asyncio.run(warmer.warm_once()) == 2
+    recipe_cache.clear()
+    with patch('gemini.breaker_state', return_value="open"):
+        assert asyncio.run(warmer.warm_once()) == 0
+    assert mock_generate.await_count == 2
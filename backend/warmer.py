@@ -0,0 +1,144 @@
+"""Keeps the recipe cache warm for the most requested ingredient lists.
+
+Every /generate records its (ingredients, dietary preferences) key here
+with a popularity score that halves every HALF_LIFE seconds. A background
+task on gemini's event loop regenerates the top POOL_SIZE keys before their
+cache entries lapse, so the next request for one of them (typically a new
+guest trying the sample ingredients) is a cache hit instead of a full
+Gemini call. Warming spends at most BUDGET generations per hour per process,
+one at a time, and pauses while the Gemini breaker is not closed.
+"""
+import asyncio
+import os
+import threading
+import time
+import gemini
+import limiter
+import logs
+import metrics
+import recipe_cache
+
+# Generations per hour the warmer may spend in each process; 0 disables it
+BUDGET = float(os.getenv("WARM_BUDGET", 30))
+# How many of the most popular keys are kept warm
+POOL_SIZE = int(os.getenv("WARM_POOL_SIZE", 20))
+# Decayed request count a key needs to be warmed; 1.5 means asked for at
+# least twice within about a HALF_LIFE, so one-off lists are never warmed
+MIN_SCORE = float(os.getenv("WARM_MIN_SCORE", 1.5))
+# Seconds for a key's popularity to halve when nobody asks for it
+HALF_LIFE = float(os.getenv("WARM_HALF_LIFE", 60 * 60))
+# Seconds between warming passes
+INTERVAL = float(os.getenv("WARM_INTERVAL", 60))
+# Entries are regenerated once this old, ahead of RECIPE_CACHE_TTL
+REFRESH_AGE = float(os.getenv("WARM_REFRESH_AGE", recipe_cache.CACHE_TTL * 0.8))
+# Keys tracked at once; the least popular are dropped beyond this
+MAX_TRACKED = int(os.getenv("WARM_MAX_TRACKED", 2000))
+
+log = logs.get_logger(__name__)
+
+# key -> [score, scored_at, ingredients, dietary_preferences]
+_popular = {}
+# key -> time.monotonic() the warmer last generated it
+_warmed = {}
+_lock = threading.Lock()
+
+_bucket = None
+_started_pid = None
+
+
+def _decayed(score, scored_at, now):
+    return score * 0.5 ** ((now - scored_at) / HALF_LIFE)
+
+def record(ingredients, dietary_preferences):
+    """Count one request for this key and make sure the warmer is running."""
+    key = recipe_cache.make_key(ingredients, dietary_preferences)
+    now = time.monotonic()
+    with _lock:
+        entry = _popular.get(key)
+        if entry is None:
+            _popular[key] = [1.0, now, recipe_cache.normalize(ingredients), recipe_cache.normalize(dietary_preferences)]
+            if len(_popular) > MAX_TRACKED:
+                _prune(now)
+        else:
+            entry[0] = _decayed(entry[0], entry[1], now) + 1
+            entry[1] = now
+    _ensure_started()
+
+def _prune(now):
+    # Called with _lock held; drops the least popular half in one go
+    ranked = sorted(_popular, key=lambda key: _decayed(_popular[key][0], _popular[key][1], now))
+    for key in ranked[:len(ranked) // 2]:
+        del _popular[key]
+        _warmed.pop(key, None)
+
+def popular(limit=None):
+    """(key, score, ingredients, dietary_preferences) for keys worth warming, most popular first."""
+    now = time.monotonic()
+    with _lock:
+        ranked = [
+            (key, _decayed(score, scored_at, now), ingredients, dietary_preferences)
+            for key, (score, scored_at, ingredients, dietary_preferences) in _popular.items()
+        ]
+    ranked = [entry for entry in ranked if entry[1] >= MIN_SCORE]
+    ranked.sort(key=lambda entry: entry[1], reverse=True)
+    return ranked[:POOL_SIZE if limit is None else limit]
+
+
+def _ensure_started():
+    global _bucket, _started_pid
+    # Like gemini's loop, the task does not survive fork(); each worker starts its own
+    if BUDGET <= 0 or _started_pid == os.getpid():
+        return
+    with _lock:
+        if _started_pid == os.getpid():
+            return
+        _bucket = limiter.TokenBucket(BUDGET / 3600, max(1, int(BUDGET)))
+        _started_pid = os.getpid()
+    asyncio.run_coroutine_threadsafe(_run(), gemini.get_loop())
+
+async def _run():
+    while True:
+        await asyncio.sleep(INTERVAL)
+        try:
+            await warm_once()
+        except Exception:
+            log.exception("Recipe warming pass failed")
+
+async def warm_once():
+    """Regenerate popular keys that are missing or due; returns how many were warmed."""
+    warmed = 0
+    for key, _, ingredients, dietary_preferences in popular():
+        last = _warmed.get(key)
+        due = last is not None and time.monotonic() - last >= REFRESH_AGE
+        if recipe_cache.contains(key) and not due:
+            # Fresh, either from the warmer or from a user's own request
+            continue
+        if gemini.breaker_state() != "closed":
+            break
+        with _lock:
+            if _bucket is not None and _bucket.take():
+                break
+        # A key that merely fell out of memory may still be in the persistent
+        # tier; only an ageing entry forces a new generation
+        try:
+            recipes = await gemini.generate(ingredients, dietary_preferences, use_cache=not due)
+        except Exception as e:
+            metrics.WARMER.labels("error").inc()
+            log.warning("Could not warm recipes", extra={"error": str(e) or type(e).__name__})
+            continue
+        if not isinstance(recipes, list):
+            metrics.WARMER.labels("error").inc()
+            continue
+        with _lock:
+            _warmed[key] = time.monotonic()
+        metrics.WARMER.labels("warmed").inc()
+        warmed += 1
+    return warmed
+
+def clear():
+    global _bucket
+    with _lock:
+        _popular.clear()
+        _warmed.clear()
+        if _bucket is not None:
+            _bucket = limiter.TokenBucket(BUDGET / 3600, max(1, int(BUDGET)))